@@ -0,0 +1 @@
+"""Processing components for the Video Speed-Up Tool"""
@@ -0,0 +1,371 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from speedup.engine import (LAYOUTS, build_ffmpeg_command, build_variants_command,
+                            expand_variants, expected_output_duration, make_video)
+from speedup.probe import probe_file
+from speedup.progress import io_bytes, peak_rss_mb, run_ffmpeg
+from speedup import speedmap
+from speedup.staging import IOWaitMonitor, bulk_copy
+
+TONE_AUDIO = "sine=frequency=440:sample_rate=48000"
+# A tone for 6 seconds out of every 10, standing in for speech with pauses
+GATED_AUDIO = r"aevalsrc=0.5*sin(440*2*PI*t)*lt(mod(t\,10)\,6):s=48000"
+
+
+def synthetic_source(path, duration=120, size='1280x720', rate=30, ffmpeg='ffmpeg',
+                     audio=TONE_AUDIO):
+    """Generate a deterministic test clip from ffmpeg's lavfi sources"""
+    path = Path(path)
+    if path.exists():
+        return path
+    cmd = [ffmpeg, '-v', 'error', '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate={rate}",
+           '-f', 'lavfi', '-i', audio,
+           '-t', str(duration), '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(rate * 2),
+           '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-b:a', '128k', '-y', str(path)]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return path
+
+
+def timed(func, *args, **kwargs):
+    """Run a function and return (wall seconds, result)"""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def child_cpu_seconds():
+    """User plus system CPU time of finished child processes (0 on Windows)"""
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def bench_chunked(input_path, chunk_counts, settings=None, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+    """Compare single-process encoding against chunked parallel encoding"""
+    from speedup.chunked import encode_chunked
+
+    video = make_video(input_path, settings)
+    video['probe'] = probe_file(input_path, ffprobe)
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        output = Path(work_dir) / "single.mp4"
+        cmd = build_ffmpeg_command(input_path, output, video, ffmpeg=ffmpeg)
+        wall, _ = timed(run_ffmpeg, cmd)
+        baseline = wall
+        rows.append({'mode': 'single', 'wall': round(wall, 3), 'speedup': 1.0})
+
+        for chunks in chunk_counts:
+            output = Path(work_dir) / f"chunks_{chunks}.mp4"
+            wall, result = timed(encode_chunked, input_path, output, video, chunks,
+                                 ffmpeg=ffmpeg, ffprobe=ffprobe)
+            rows.append({'mode': f"chunks={result['chunks']}", 'wall': round(wall, 3),
+                         'speedup': round(baseline / wall, 2)})
+    return rows
+
+
+def bench_frame_selection(input_path, speeds, modes, settings=None, ffmpeg='ffmpeg',
+                          ffprobe='ffprobe'):
+    """Measure encode throughput of each frame selection mode per speed multiplier"""
+    probe = probe_file(input_path, ffprobe)
+    source_frames = (probe['duration'] or 0) * ((probe.get('video') or {}).get('fps') or 0)
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for speed in speeds:
+            exact_wall = None
+            for mode in modes:
+                video = make_video(input_path, dict(settings or {}, speed=speed,
+                                                    frame_selection=mode))
+                video['probe'] = probe
+                output = Path(work_dir) / f"{speed}x_{mode}.mp4"
+                cmd = build_ffmpeg_command(input_path, output, video, ffmpeg=ffmpeg)
+                wall, _ = timed(run_ffmpeg, cmd)
+                if mode == 'exact':
+                    exact_wall = wall
+                rows.append({
+                    'speed': speed,
+                    'mode': mode,
+                    'wall': round(wall, 3),
+                    'source_fps': round(source_frames / wall, 1) if wall else None,
+                    'vs_exact': round(exact_wall / wall, 2) if exact_wall else None,
+                })
+    return rows
+
+
+def bench_audio(input_path, speeds, modes, settings=None, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+    """Measure the cost of each audio mode with audio-only encodes"""
+    probe = probe_file(input_path, ffprobe)
+    if not probe.get('audio'):
+        raise ValueError(f"{input_path} has no audio stream")
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for speed in speeds:
+            pitch_cpu = None
+            for mode in modes:
+                video = make_video(input_path, dict(settings or {}, speed=speed, audio=mode))
+                video['probe'] = probe
+                output = Path(work_dir) / f"{speed}x_{mode}.m4a"
+                cmd = build_ffmpeg_command(input_path, output, video, ffmpeg=ffmpeg, streams='a')
+                cpu_before = child_cpu_seconds()
+                wall, _ = timed(run_ffmpeg, cmd)
+                cpu = child_cpu_seconds() - cpu_before
+                if mode == 'pitch':
+                    pitch_cpu = cpu
+                rows.append({
+                    'speed': speed,
+                    'mode': mode,
+                    'wall': round(wall, 3),
+                    'cpu': round(cpu, 3),
+                    'vs_pitch': round(pitch_cpu / cpu, 2) if pitch_cpu and cpu else None,
+                })
+    return rows
+
+
+def bench_variants(input_path, variants, settings=None, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+    """Compare rendering variants one after another against a single shared decode"""
+    video = make_video(input_path, dict(settings or {}, variants=variants))
+    video['probe'] = probe_file(input_path, ffprobe)
+    targets = expand_variants(video)
+    with tempfile.TemporaryDirectory() as work_dir:
+        serial = 0.0
+        for index, target in enumerate(targets):
+            output = Path(work_dir) / f"serial_{index}.mp4"
+            wall, _ = timed(run_ffmpeg, build_ffmpeg_command(input_path, output, target,
+                                                             ffmpeg=ffmpeg))
+            serial += wall
+        outputs = [(target, Path(work_dir) / f"shared_{index}.mp4")
+                   for index, target in enumerate(targets)]
+        shared, _ = timed(run_ffmpeg, build_variants_command(input_path, outputs, ffmpeg=ffmpeg))
+    return [
+        {'mode': 'serial', 'outputs': len(targets), 'wall': round(serial, 3), 'speedup': 1.0},
+        {'mode': 'single-decode', 'outputs': len(targets), 'wall': round(shared, 3),
+         'speedup': round(serial / shared, 2) if shared else None},
+    ]
+
+
+def bench_silence(input_path, silent_speed=8.0, settings=None, ffmpeg='ffmpeg',
+                  ffprobe='ffprobe'):
+    """Time the loudness analysis and the single-pass variable-speed encode"""
+    video = make_video(input_path, dict(settings or {}, silent_speed=silent_speed))
+    video['probe'] = probe_file(input_path, ffprobe)
+    duration = video['probe'].get('duration')
+    analysis, levels = timed(speedmap.analyze_loudness, input_path, ffmpeg)
+    video['speed_map'] = speedmap.build_speed_map(levels, video['speed'], silent_speed)
+    with tempfile.TemporaryDirectory() as work_dir:
+        cmd = build_ffmpeg_command(input_path, Path(work_dir) / "variable.mp4", video,
+                                   ffmpeg=ffmpeg)
+        encode, _ = timed(run_ffmpeg, cmd)
+    output = expected_output_duration(video)
+    return [
+        {'stage': 'analysis', 'wall': round(analysis, 3),
+         'realtime': round(duration / analysis, 1) if duration and analysis else None,
+         'numpy': speedmap.numpy is not None, 'segments': len(video['speed_map'])},
+        {'stage': 'encode', 'wall': round(encode, 3),
+         'realtime': round(duration / encode, 1) if duration and encode else None,
+         'input_seconds': duration, 'output_seconds': round(output, 1) if output else None},
+    ]
+
+
+def bench_layouts(input_path, layouts=LAYOUTS, settings=None, directory=None, ffmpeg='ffmpeg',
+                  ffprobe='ffprobe'):
+    """Measure wall time and bytes written and read for each output layout
+
+    Outputs go to ``directory`` (default: a temporary directory), so the
+    destination volume can be measured. The bytes come from the ffmpeg
+    process's rusage and are only available on Linux.
+    """
+    probe = probe_file(input_path, ffprobe)
+    rows = []
+    with tempfile.TemporaryDirectory(dir=directory) as work_dir:
+        baseline = None
+        for layout in layouts:
+            video = make_video(input_path, dict(settings or {}, layout=layout))
+            video['probe'] = probe
+            output = Path(work_dir) / f"{layout}.mp4"
+            wall, reader = timed(run_ffmpeg, build_ffmpeg_command(input_path, output, video,
+                                                                  ffmpeg=ffmpeg))
+            if baseline is None:
+                baseline = wall
+            size = output.stat().st_size
+            io = io_bytes(reader.rusage) or {}
+            rows.append({
+                'layout': layout,
+                'wall': round(wall, 3),
+                'vs_first': round(baseline / wall, 2) if wall else None,
+                'output_mb': round(size / 1e6, 1),
+                'written_mb': round(io['written'] / 1e6, 1) if io else None,
+                'read_mb': round(io['read'] / 1e6, 1) if io else None,
+                'write_amplification': round(io['written'] / size, 2) if io and size else None,
+            })
+    return rows
+
+
+def drop_cached(path):
+    """Ask the OS to forget a file's cached pages so the next read goes to storage"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def bench_staging(input_path, settings=None, scratch=None, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+    """Compare encoding straight from the input's volume against copying it to scratch first
+
+    Point ``input_path`` at a network mount to measure staging. Each run
+    starts with the input dropped from the page cache, where the OS allows
+    it. I/O wait is the encode time ffmpeg spent blocked on I/O (Linux).
+    In a batch the copy overlaps the previous encode.
+    """
+    video = make_video(input_path, settings)
+    video['probe'] = probe_file(input_path, ffprobe)
+    rows = []
+    with tempfile.TemporaryDirectory(dir=scratch) as work_dir:
+        staged = Path(work_dir) / f"staged{Path(input_path).suffix}"
+        for mode in ('direct', 'staged'):
+            drop_cached(input_path)
+            copy = None
+            source = input_path
+            if mode == 'staged':
+                copy, _ = timed(bulk_copy, input_path, staged)
+                source = staged
+            monitor = IOWaitMonitor()
+            cmd = build_ffmpeg_command(source, Path(work_dir) / f"{mode}.mp4", video,
+                                       ffmpeg=ffmpeg)
+            encode, _ = timed(run_ffmpeg, cmd, on_spawn=monitor.watch)
+            monitor.stop()
+            io_wait = monitor.seconds
+            rows.append({
+                'mode': mode,
+                'copy': round(copy, 3) if copy is not None else None,
+                'encode': round(encode, 3),
+                'io_wait': io_wait,
+                'io_wait_pct': round(io_wait / encode * 100, 1) if io_wait is not None else None,
+            })
+    return rows
+
+
+# Columns identifying one benchmark case, used to match rows against a baseline
+MATRIX_KEY = ('source', 'encoder', 'quality', 'threads', 'speed')
+
+
+def bench_matrix(sources, encoders, qualities, threads, speeds, repeat=1, ffmpeg='ffmpeg',
+                 ffprobe='ffprobe', on_row=None):
+    """Run every encoder x quality x threads x speed case on each source
+
+    Commands come from build_ffmpeg_command, so changes to the builder show
+    up in the results. Each case runs ``repeat`` times and the run with the
+    median wall time is reported.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for source in sources:
+            probe = probe_file(source, ffprobe)
+            for encoder, quality, thread_count, speed in itertools.product(
+                    encoders, qualities, threads, speeds):
+                video = make_video(source, {'speed': speed, 'quality': quality,
+                                            'encoder': encoder, 'threads': thread_count})
+                video['probe'] = probe
+                output = Path(work_dir) / "out.mp4"
+                cmd = build_ffmpeg_command(source, output, video, ffmpeg=ffmpeg)
+                runs = []
+                for _ in range(repeat):
+                    wall, reader = timed(run_ffmpeg, cmd)
+                    runs.append((wall, reader, output.stat().st_size))
+                wall, reader, size = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+                usage = reader.rusage
+                cpu = usage.ru_utime + usage.ru_stime if usage else None
+                frames = reader.snapshot()['frame']
+                row = {
+                    'source': Path(source).stem,
+                    'encoder': encoder,
+                    'quality': quality,
+                    'threads': str(thread_count),
+                    'speed': speed,
+                    'wall': round(wall, 3),
+                    'wall_stdev': round(statistics.pstdev(run[0] for run in runs), 3),
+                    'encode_fps': round(frames / wall, 1) if frames and wall else None,
+                    'cpu': round(cpu, 3) if cpu is not None else None,
+                    'cores_used': round(cpu / wall, 2) if cpu is not None and wall else None,
+                    'peak_rss_mb': peak_rss_mb(usage),
+                    'output_bytes': size,
+                    # Identifies the exact arguments so builder changes are visible
+                    'command': hashlib.sha1(json.dumps(cmd[1:-1]).encode()).hexdigest()[:12],
+                }
+                rows.append(row)
+                if on_row:
+                    on_row(row)
+    return rows
+
+
+def matrix_sources(sizes, durations, directory, ffmpeg='ffmpeg'):
+    """Create (or reuse) one synthetic clip per resolution and duration"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return [synthetic_source(directory / f"synthetic_{size}_{duration}s.mp4", duration, size,
+                             ffmpeg=ffmpeg)
+            for size in sizes for duration in durations]
+
+
+def compare_baseline(rows, baseline, tolerance=0.10):
+    """Annotate rows with their change against baseline rows of the same case
+
+    Returns the rows whose wall time grew by more than ``tolerance``.
+    """
+    previous = {tuple(str(row[key]) for key in MATRIX_KEY): row for row in baseline}
+    regressions = []
+    for row in rows:
+        base = previous.get(tuple(str(row[key]) for key in MATRIX_KEY))
+        if not base or not base.get('wall'):
+            row['vs_baseline'] = None
+            continue
+        ratio = row['wall'] / float(base['wall'])
+        row['vs_baseline'] = round(ratio, 3)
+        row['command_changed'] = base.get('command') != row['command']
+        if ratio > 1 + tolerance:
+            regressions.append(row)
+    return regressions
+
+
+def load_rows(path):
+    """Read rows saved by write_rows (JSON or CSV, by extension)"""
+    with open(path, encoding='utf-8', newline='') as f:
+        if str(path).endswith('.csv'):
+            return list(csv.DictReader(f))
+        return json.load(f)
+
+
+def write_rows(rows, path):
+    """Save rows as JSON or CSV, chosen by the file extension"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if str(path).endswith('.csv'):
+            columns = list(dict.fromkeys(key for row in rows for key in row))
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(rows, f, indent=1)
+
+
+def print_rows(rows, as_json=False):
+    """Print benchmark rows as an aligned table or JSON lines"""
+    if as_json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = {col: max(len(col), *(len(str(row.get(col, ''))) for row in rows)) for col in columns}
+    print("  ".join(col.ljust(widths[col]) for col in columns))
+    for row in rows:
+        print("  ".join(str(row.get(col, '')).ljust(widths[col]) for col in columns))
@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from speedup.paths import cache_dir
+
+CACHE_VERSION = 1
+
+# Listings parsed from the ffmpeg binary. ffmpeg exits after the first
+# listing option, so each one needs its own invocation; they run in parallel.
+LISTINGS = ('encoders', 'decoders', 'hwaccels', 'filters')
+
+# Encoder that identifies each hardware backend, in order of preference
+HW_ENCODERS = [
+    ('nvenc', 'h264_nvenc'),
+    ('amf', 'h264_amf'),
+    ('qsv', 'h264_qsv'),
+    ('videotoolbox', 'h264_videotoolbox'),
+    ('vaapi', 'h264_vaapi'),
+]
+
+# Lines look like " V....D libx264    libx264 H.264 ..." for codecs and
+# " ... setpts    V->V    Set PTS ..." for filters
+CODEC_LINE_RE = re.compile(r"^\s*[VAS][A-Z.]{5}\s+(\S+)")
+FILTER_LINE_RE = re.compile(r"^\s*[T.][S.][C.]?\s+(\S+)\s+\S+->\S+")
+
+
+def find_ffmpeg():
+    """Return the full path of the ffmpeg binary, or None"""
+    return shutil.which('ffmpeg')
+
+
+def binary_key(path):
+    """Identify a binary build by path, size and mtime"""
+    st = os.stat(path)
+    return [str(path), st.st_size, st.st_mtime_ns]
+
+
+def parse_listing(kind, text):
+    """Extract names from the output of ffmpeg -encoders/-decoders/-hwaccels/-filters"""
+    names = []
+    if kind == 'hwaccels':
+        lines = text.splitlines()
+        for line in lines[1:] if lines and ':' in lines[0] else lines:
+            if line.strip():
+                names.append(line.strip())
+        return names
+
+    pattern = FILTER_LINE_RE if kind == 'filters' else CODEC_LINE_RE
+    in_body = False
+    for line in text.splitlines():
+        # Skip the legend that precedes the separator line
+        if line.strip().startswith('---'):
+            in_body = True
+            continue
+        if not in_body and kind != 'filters':
+            continue
+        match = pattern.match(line)
+        if match and match.group(1) != '=':
+            names.append(match.group(1))
+    return names
+
+
+def _run_listing(ffmpeg, kind):
+    result = subprocess.run([ffmpeg, '-hide_banner', f'-{kind}'], capture_output=True,
+                            text=True, check=True)
+    return parse_listing(kind, result.stdout)
+
+
+def probe_capabilities(ffmpeg):
+    """Query ffmpeg for its encoders, decoders, hwaccels and filters"""
+    with ThreadPoolExecutor(max_workers=len(LISTINGS)) as pool:
+        futures = {kind: pool.submit(_run_listing, ffmpeg, kind) for kind in LISTINGS}
+        listings = {kind: future.result() for kind, future in futures.items()}
+
+    encoders = set(listings['encoders'])
+    return {
+        'version': CACHE_VERSION,
+        'key': binary_key(ffmpeg),
+        'ffmpeg': str(ffmpeg),
+        'available': True,
+        'hw': [backend for backend, encoder in HW_ENCODERS if encoder in encoders],
+        **listings,
+    }
+
+
+def unavailable():
+    """Capabilities for a machine without a usable ffmpeg"""
+    return {'available': False, 'ffmpeg': None, 'hw': [],
+            **{kind: [] for kind in LISTINGS}}
+
+
+class CapabilityCache:
+    """JSON cache of capabilities for the ffmpeg binaries seen on this machine"""
+
+    def __init__(self, path=None):
+        self.path = path or cache_dir() / 'capabilities.json'
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, ffmpeg):
+        """Return cached capabilities if the binary has not changed"""
+        entry = self._load().get(str(ffmpeg))
+        try:
+            if entry and entry.get('version') == CACHE_VERSION and entry['key'] == binary_key(ffmpeg):
+                return entry
+        except OSError:
+            pass
+        return None
+
+    def put(self, caps):
+        entries = self._load()
+        entries[caps['ffmpeg']] = caps
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def cached_capabilities(ffmpeg=None, cache=None):
+    """Return capabilities without spawning anything, or None on a cache miss"""
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        return unavailable()
+    try:
+        return (cache or CapabilityCache()).get(ffmpeg)
+    except OSError:
+        return None
+
+
+def detect_capabilities(ffmpeg=None, cache=None):
+    """Return capabilities, probing ffmpeg and updating the cache on a miss"""
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        return unavailable()
+    try:
+        cache = cache or CapabilityCache()
+    except OSError:
+        cache = None
+    caps = cache.get(ffmpeg) if cache else None
+    if caps:
+        return caps
+    try:
+        caps = probe_capabilities(ffmpeg)
+    except (subprocess.CalledProcessError, OSError):
+        return unavailable()
+    if cache:
+        try:
+            cache.put(caps)
+        except OSError:
+            pass
+    return caps
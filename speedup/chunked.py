@@ -0,0 +1,154 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from speedup.engine import build_ffmpeg_command, has_audio_stream, muxer_args
+from speedup.progress import PROGRESS_ARGS, run_ffmpeg
+
+# Inputs shorter than this per chunk are not worth splitting
+MIN_CHUNK_SECONDS = 60
+
+
+def find_keyframes(input_path, ffprobe='ffprobe'):
+    """Return keyframe timestamps of the first video stream, relative to its start
+
+    Reads packet flags only, so nothing is decoded.
+    """
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', str(input_path)],
+        capture_output=True, text=True, check=True)
+    first = None
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        try:
+            pts = float(pts_time)
+        except ValueError:
+            continue
+        if first is None or pts < first:
+            first = pts
+        if 'K' in flags:
+            keyframes.append(pts)
+    if first is None:
+        return []
+    return sorted(pts - first for pts in keyframes)
+
+
+def plan_chunks(keyframes, duration, chunks):
+    """Choose up to ``chunks`` (start, length) segments split at keyframes
+
+    The last segment has length None and runs to the end of the input.
+    """
+    if chunks < 2 or not keyframes or not duration:
+        return [(0.0, None)]
+
+    boundaries = []
+    for i in range(1, chunks):
+        target = duration * i / chunks
+        nearest = min(keyframes, key=lambda pts: abs(pts - target))
+        # Keep boundaries strictly increasing and away from the ends
+        if 0 < nearest < duration and (not boundaries or nearest > boundaries[-1]):
+            boundaries.append(nearest)
+
+    starts = [0.0] + boundaries
+    segments = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else None
+        segments.append((start, end - start if end is not None else None))
+    return segments
+
+
+def chunk_count(setting, duration, max_workers=None):
+    """Resolve a chunks setting ('auto', 'off' or a number) for an input"""
+    if not duration or setting in (None, '', 'off', 0, 1, '1', '0'):
+        return 1
+    limit = max(1, int(duration // MIN_CHUNK_SECONDS))
+    if setting == 'auto':
+        wanted = max_workers or os.cpu_count() or 1
+    else:
+        wanted = int(setting)
+    return max(1, min(wanted, limit))
+
+
+def encode_chunked(input_path, output_path, video, chunks, hw_accel='cpu', threads='auto',
+                   ffmpeg='ffmpeg', ffprobe='ffprobe', on_progress=None, max_workers=None,
+                   on_spawn=None, cancel=None, preexec=None):
+    """Encode one input as parallel keyframe-aligned segments and join them
+
+    Each video segment gets the same setpts retiming and encoder settings as
+    a normal encode. Audio is retimed once in a single pass so there are no
+    encoder priming gaps at chunk boundaries, then the segments are joined
+    with the concat demuxer and muxed with the audio without re-encoding.
+    Cancelling ``cancel`` stops every segment encode; ``preexec`` is
+    passed to each run_ffmpeg.
+    """
+    probe = video.get('probe') or {}
+    duration = probe.get('duration') or 0.0
+    speed = float(video['speed'])
+    has_audio = has_audio_stream(video)
+
+    segments = plan_chunks(find_keyframes(input_path, ffprobe), duration, chunks)
+
+    output_path = Path(output_path)
+    # Keep scratch files on the destination volume
+    work_dir = Path(tempfile.mkdtemp(prefix=f".{output_path.stem}.chunks-", dir=output_path.parent))
+    try:
+        tasks = []
+        for index, (start, length) in enumerate(segments):
+            segment_path = work_dir / f"segment_{index:04d}.mp4"
+            cmd = build_ffmpeg_command(input_path, segment_path, video, hw_accel, threads,
+                                       ffmpeg=ffmpeg, start=start, duration=length, streams='v')
+            seconds = (length if length is not None else max(0.0, duration - start)) / speed
+            tasks.append((cmd, seconds, segment_path))
+
+        audio_path = None
+        if has_audio:
+            # Matroska holds whichever audio codec the final container needs
+            audio_path = work_dir / "audio.mka"
+            cmd = build_ffmpeg_command(input_path, audio_path, video, hw_accel, threads,
+                                       ffmpeg=ffmpeg, streams='a', container=output_path.suffix)
+            tasks.append((cmd, duration / speed, audio_path))
+
+        total = sum(seconds for _, seconds, _ in tasks) or 1.0
+        fractions = {}
+        lock = threading.Lock()
+
+        def run_task(index, cmd, seconds):
+            def report(update):
+                if update['fraction'] is None:
+                    return
+                with lock:
+                    fractions[index] = update['fraction'] * seconds
+                    done = sum(fractions.values()) / total
+                if on_progress:
+                    on_progress({**update, 'fraction': done, 'eta': None})
+            run_ffmpeg(cmd, report, expected_duration=seconds, speed=speed, on_spawn=on_spawn,
+                       cancel=cancel, preexec=preexec)
+
+        workers = max_workers or len(tasks)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_task, i, cmd, seconds)
+                       for i, (cmd, seconds, _) in enumerate(tasks)]
+            for future in futures:
+                future.result()
+
+        # Join the video segments and mux the audio without re-encoding
+        list_path = work_dir / "segments.txt"
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for _, _, segment_path in tasks[:len(segments)]:
+                f.write(f"file '{segment_path.as_posix()}'\n")
+
+        cmd = [ffmpeg] + PROGRESS_ARGS + ['-f', 'concat', '-safe', '0', '-i', str(list_path)]
+        if audio_path:
+            cmd.extend(['-i', str(audio_path), '-map', '0:v:0', '-map', '1:a:0'])
+        cmd.extend(['-c', 'copy'] + muxer_args(output_path.suffix, video.get('layout')))
+        cmd.extend(['-y', str(output_path)])
+        run_ffmpeg(cmd, on_spawn=on_spawn, cancel=cancel, preexec=preexec)
+        return {'output': str(output_path), 'chunks': len(segments)}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
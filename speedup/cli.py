@@ -0,0 +1,747 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from speedup.costmodel import ORDER_POLICIES, CostModel, cost_model_path
+from speedup.engine import (AUDIO_MODES, ENCODERS, FPS_CHOICES, FRAME_SELECTION_MODES, LAYOUTS,
+                            QUALITY_LEVELS, BatchEngine, copied_streams, make_video)
+from speedup.governor import PROFILES, ResourceGovernor
+from speedup.manifest import JOB_KEYS, ManifestError, load_manifest
+from speedup.staging import DEFAULT_BUDGET_MB, DEFAULT_DEPTH, STAGE_MODES
+
+
+def emit(record, lock=threading.Lock()):
+    """Write one JSON result line to stdout"""
+    with lock:
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+
+def probe_videos(videos, ffprobe='ffprobe'):
+    """Attach cached ffprobe metadata to each video"""
+    from speedup.probe import MediaProber, ProbeCache
+    try:
+        cache = ProbeCache()
+    except Exception:
+        cache = None
+    results = MediaProber(cache, ffprobe=ffprobe).probe_many([video['path'] for video in videos])
+    for video in videos:
+        video['probe'] = results.get(video['path'])
+
+
+def engine_options(args, output_folder, dry_run=False):
+    """BatchEngine keyword arguments shared by the batch and watch commands
+
+    A ``dry_run`` opens no caches, metrics or scratch space, so planning
+    writes nothing.
+    """
+    governor = make_governor(args)
+    tuner = None
+    if args.threads == 'tune':
+        from speedup.tuning import AutoTuner, load_calibration
+        # A thread budget bounds the cores the tuner plans for
+        cores = governor.thread_budget if governor else None
+        tuner = AutoTuner(cores=cores, calibration=load_calibration(args.ffmpeg, cores))
+    return {
+        'hw_accel': args.encoder,
+        'threads': 'auto' if tuner else args.threads,
+        'max_workers': args.jobs,
+        'ffmpeg': args.ffmpeg,
+        'ffprobe': args.ffprobe,
+        # Settings that apply to jobs not setting them
+        'defaults': {'frame_selection': args.frame_selection, 'audio': args.audio,
+                     'layout': args.layout, 'stream_copy': args.stream_copy,
+                     **{key: value for key, value in (('silent_speed', args.silent_speed),
+                                                      ('silence_threshold', args.silence_threshold))
+                        if value is not None}},
+        'result_cache': None if dry_run else open_result_cache(args),
+        'journal': not dry_run,
+        'tuner': tuner,
+        'governor': governor,
+        'metrics': None if dry_run else make_metrics(args, output_folder),
+        'cost_model': CostModel(),
+        'order': args.order,
+        'stager': None if dry_run else make_stager(args),
+    }
+
+
+def make_metrics(args, output_folder):
+    """Per-job metrics recorder; JSON lines go to the output folder unless disabled"""
+    from speedup.metrics import MetricsRecorder, load_hook, metrics_path
+    path = None
+    if args.metrics_log:
+        path = args.metrics if args.metrics else metrics_path(output_folder)
+    hooks = [load_hook(spec) for spec in args.metrics_hook]
+    if not path and not args.prometheus and not hooks:
+        return None
+    return MetricsRecorder(path, args.prometheus, hooks)
+
+
+def make_stager(args):
+    """The scratch stager for --stage, or None if inputs are read in place"""
+    if args.stage == 'off':
+        return None
+    from speedup.staging import ScratchStager
+    return ScratchStager(args.scratch, args.scratch_budget, args.prefetch, args.stage)
+
+
+def make_governor(args):
+    """The resource governor for the chosen profile and limits, or None if unrestricted"""
+    governor = ResourceGovernor.from_profile(
+        args.profile, thread_budget=args.thread_budget, nice=args.nice, ionice=args.ionice,
+        memory_limit_mb=args.memory_limit, load_threshold=args.load_threshold,
+        on_decision=lambda message: print(f"governor: {message}", file=sys.stderr))
+    return governor if governor.active else None
+
+
+def print_tuning(summary):
+    """Report the auto-tuned configuration and its measured throughput"""
+    tuning = summary.get('tuning')
+    if not tuning:
+        return
+    print(f"auto-tune: {tuning['initial']['jobs']} job(s) x {tuning['initial']['threads']} "
+          f"thread(s) on {tuning['cores']} cores"
+          f"{' (calibrated)' if tuning['calibrated'] else ''}, ended at {tuning['jobs']} job(s), "
+          f"{tuning['aggregate_fps'] or '?'} frames/s overall", file=sys.stderr)
+
+
+def print_cost_model(summary):
+    """Report how well the cost model predicted the batch's encode times"""
+    accuracy = summary.get('cost_model')
+    if not accuracy:
+        return
+    print(f"cost model: {accuracy['jobs']} job(s) predicted at {accuracy['predicted_seconds']}s, "
+          f"took {accuracy['actual_seconds']}s; mean error {accuracy['mean_error_pct']}%, "
+          f"worst {accuracy['worst_error_pct']}%", file=sys.stderr)
+
+
+def print_staging(summary):
+    """Report how many inputs were prefetched in time and the staging throughput"""
+    staging = summary.get('staging')
+    if not staging:
+        return
+    print(f"staging: {staging['hits']} input(s) read from scratch ({staging['waits']} waited for "
+          f"the copy), {staging['misses']} read in place; prefetched "
+          f"{staging['prefetched_bytes'] / 1e6:.0f} MB at {staging['prefetch_mb_per_second'] or '?'}"
+          f" MB/s, uploaded {staging['uploaded_bytes'] / 1e6:.0f} MB at "
+          f"{staging['upload_mb_per_second'] or '?'} MB/s", file=sys.stderr)
+    if staging['upload_failures']:
+        print(f"staging: {staging['upload_failures']} upload(s) failed", file=sys.stderr)
+
+
+def open_result_cache(args):
+    """The shared result cache, unless disabled or unavailable"""
+    if not args.cache:
+        return None
+    from speedup.results import ResultCache
+    try:
+        return ResultCache()
+    except Exception:
+        return None
+
+
+def job_outputs(job, record):
+    """Add the output path, and every variant's path if there are several"""
+    outputs = [target['output'] for target in job.payload['targets']]
+    record['output'] = outputs[0]
+    if len(outputs) > 1:
+        record['outputs'] = outputs
+    return record
+
+
+def job_record(job):
+    """Describe a finished job as a JSON-serialisable dict"""
+    video = job.payload['video']
+    record = job_outputs(job, {'job': job.job_id, 'input': video['path']})
+    record['status'] = job.status
+    record['elapsed'] = round(job.elapsed, 3)
+    copied = copied_streams(job)
+    if copied:
+        record['stream_copy'] = copied
+    if job.error:
+        record['error'] = job.error
+    return record
+
+
+def run_batch(args):
+    """Run the batch command"""
+    try:
+        videos, options = load_manifest(args.manifest)
+    except ManifestError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    output_folder = args.output or options.get('output_folder')
+    if not output_folder:
+        print("error: no output folder given in the manifest or with --output", file=sys.stderr)
+        return 2
+
+    engine = BatchEngine(output_folder, chunks=args.chunks,
+                         on_job_done=lambda job: emit(job_record(job)),
+                         **engine_options(args, output_folder, dry_run=args.dry_run))
+    if args.probe:
+        with engine.batch_span('probe'):
+            probe_videos(videos, args.ffprobe)
+    if not args.dry_run:
+        Path(output_folder).mkdir(parents=True, exist_ok=True)
+    # A dry run leaves the journal alone and decodes no audio for variable speed
+    jobs = engine.plan(videos, resume=args.resume, analyse=not args.dry_run)
+
+    if args.dry_run:
+        for job in jobs:
+            record = job_outputs(job, {'job': job.job_id, 'input': job.payload['video']['path']})
+            record['status'] = 'skipped' if job.status == 'skipped' else 'planned'
+            record['command'] = job.payload['cmd']
+            if job.payload.get('predicted') is not None:
+                record['predicted'] = round(job.payload['predicted'], 1)
+            record['plan'] = [target['plan'] for target in job.payload['targets']]
+            sources = [target['source'] for target in job.payload['targets'] if target['source']]
+            if sources:
+                record['reuse'] = sources
+            emit(record)
+        return 0
+
+    for job in jobs:
+        if job.status == 'skipped':
+            emit(job_record(job))
+    try:
+        summary = engine.run(jobs)
+    except KeyboardInterrupt:
+        # Running encodes are stopped and their partial outputs removed before exiting
+        engine.stop()
+        engine.finish_queue()
+        return 130
+
+    print(f"{summary['succeeded']}/{summary['total']} succeeded, {summary['failed']} failed, "
+          f"{summary['cancelled']} cancelled, {summary['skipped']} already complete, "
+          f"{summary['reused']} reused from the result cache",
+          file=sys.stderr)
+    if summary['copied']:
+        print(f"{summary['copied']} job(s) copied unchanged streams instead of re-encoding "
+              f"them at the chosen quality", file=sys.stderr)
+    print_tuning(summary)
+    print_cost_model(summary)
+    print_staging(summary)
+    return 0 if summary['succeeded'] + summary['skipped'] == summary['total'] else 1
+
+
+def load_watch_config(path):
+    """Read {"output_folder": ..., "folders": [{"path": ..., "defaults": {...}}]}"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    base = Path(path).parent
+    folders = {}
+    for entry in data.get('folders', []):
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        defaults = entry.get('defaults', {})
+        unknown = set(defaults) - JOB_KEYS
+        if unknown:
+            raise ManifestError(f"Unknown default setting(s): {', '.join(sorted(unknown))}")
+        folders[str(base / entry['path'])] = defaults
+    output_folder = str(base / data['output_folder']) if data.get('output_folder') else None
+    return folders, output_folder
+
+
+def run_watch(args):
+    """Run the watch command"""
+    from speedup.fingerprint import input_fingerprint
+    from speedup.watch import FolderWatcher
+
+    defaults = {key: value for key, value in
+                (('speed', args.speed), ('fps', args.fps), ('quality', args.quality))
+                if value is not None}
+    folders = {folder: dict(defaults) for folder in args.folders}
+    output_folder = args.output
+    if args.config:
+        try:
+            config_folders, config_output = load_watch_config(args.config)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"error: cannot read watch config: {e}", file=sys.stderr)
+            return 2
+        for folder, settings in config_folders.items():
+            folders[folder] = {**defaults, **settings}
+        output_folder = output_folder or config_output
+    if not folders or not output_folder:
+        print("error: give at least one folder and an output folder", file=sys.stderr)
+        return 2
+
+    # Outputs written where they are watched would be picked up as new inputs
+    output_root = os.path.abspath(output_folder)
+    for folder in folders:
+        folder = os.path.abspath(folder)
+        if output_root == folder or folder.startswith(output_root + os.sep):
+            print(f"error: the output folder must not be or contain the watched folder {folder}",
+                  file=sys.stderr)
+            return 2
+
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    engine = BatchEngine(output_folder, on_job_done=lambda job: emit(job_record(job)),
+                         **engine_options(args, output_folder))
+    engine.start_queue()
+    # Inputs finished in earlier runs are recognised through the journal
+    done = engine.journal.completed_fingerprints() if engine.journal else set()
+
+    def is_done(path):
+        try:
+            return input_fingerprint(path) in done
+        except OSError:
+            return True
+
+    def on_ready(path, settings):
+        try:
+            video = make_video(path, settings)
+        except ValueError as e:
+            emit({'input': path, 'status': 'rejected', 'error': str(e)})
+            return
+        if args.probe:
+            with engine.batch_span('probe'):
+                probe_videos([video], args.ffprobe)
+        engine.enqueue([video])
+
+    watcher = FolderWatcher(folders, on_ready, settle=args.settle,
+                            poll_interval=args.poll_interval, polling=args.poll, is_done=is_done,
+                            exclude=[output_root])
+    print(f"Watching {len(folders)} folder(s); press Ctrl+C to stop", file=sys.stderr)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+        engine.stop()
+    summary = engine.finish_queue()
+    print(f"{summary['succeeded']}/{summary['total']} succeeded, {summary['failed']} failed",
+          file=sys.stderr)
+    print_staging(summary)
+    return 0
+
+
+def run_cache(args):
+    """Run the cache command"""
+    from speedup.results import ResultCache
+    cache = ResultCache()
+    if args.action == 'clear':
+        cache.clear()
+    stats = cache.stats()
+    cache.close()
+    print(json.dumps(stats))
+    return 0
+
+
+def run_farm_serve(args):
+    """Run a manifest on remote workers pulling commands from this coordinator"""
+    import subprocess
+    from speedup.farm import DEFAULT_PORT, FarmCoordinator
+
+    try:
+        videos, options = load_manifest(args.manifest)
+    except ManifestError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    output_folder = args.output or options.get('output_folder')
+    if not output_folder:
+        print("error: no output folder given in the manifest or with --output", file=sys.stderr)
+        return 2
+    host, _, port = args.bind.rpartition(':')
+    log = lambda message: print(f"farm: {message}", file=sys.stderr)
+    try:
+        coordinator = FarmCoordinator(host or '127.0.0.1', int(port or DEFAULT_PORT),
+                                      token=args.token, lease_timeout=args.lease_timeout,
+                                      on_event=log if args.verbose else None)
+    except (OSError, ValueError) as e:
+        print(f"error: cannot listen on {args.bind}: {e}", file=sys.stderr)
+        return 2
+
+    # Threads and priorities are the workers' business, not the coordinator's;
+    # farm throughput is learned apart from local encodes
+    engine_kwargs = dict(engine_options(args, output_folder), tuner=None, governor=None,
+                         stager=None,
+                         max_workers=args.jobs or args.local_workers or 32,
+                         cost_model=CostModel(cost_model_path().with_name('cost_model-farm.json')))
+    engine = BatchEngine(output_folder, runner=coordinator.run,
+                         on_job_done=lambda job: emit(job_record(job)), **engine_kwargs)
+    if args.probe:
+        with engine.batch_span('probe'):
+            probe_videos(videos, args.ffprobe)
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    jobs = engine.plan(videos, resume=args.resume)
+    for job in jobs:
+        if job.status == 'skipped':
+            emit(job_record(job))
+
+    coordinator.start()
+    log(f"serving {len(jobs)} job(s) at {coordinator.url}")
+    local = []
+    script = Path(__file__).resolve().parent.parent / 'ishowspeed.py'
+    for index in range(args.local_workers):
+        cmd = [sys.executable, str(script), 'farm', 'worker', coordinator.url,
+               '--name', f"local-{index}", '--ffmpeg', args.ffmpeg]
+        if args.token:
+            cmd.extend(['--token', args.token])
+        local.append(subprocess.Popen(cmd))
+    try:
+        summary = engine.run(jobs)
+    except KeyboardInterrupt:
+        engine.stop()
+        engine.finish_queue()
+        return 130
+    finally:
+        coordinator.close()
+        for process in local:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print(f"{summary['succeeded']}/{summary['total']} succeeded, {summary['failed']} failed, "
+          f"{summary['skipped']} already complete, {summary['reused']} reused from the result cache",
+          file=sys.stderr)
+    print_cost_model(summary)
+    return 0 if summary['succeeded'] + summary['skipped'] == summary['total'] else 1
+
+
+def run_farm_worker(args):
+    """Pull and run commands from a farm coordinator"""
+    from speedup.farm import FarmWorker
+
+    path_map = []
+    for entry in args.path_map:
+        source, sep, destination = entry.partition('=')
+        if not sep:
+            print(f"error: --path-map {entry!r} must look like SERVER_PATH=LOCAL_PATH",
+                  file=sys.stderr)
+            return 2
+        path_map.append((source, destination))
+    worker = FarmWorker(args.server, name=args.name, slots=args.slots, ffmpeg=args.ffmpeg,
+                        path_map=path_map, token=args.token, persist=args.persist,
+                        on_event=lambda message: print(f"worker: {message}", file=sys.stderr))
+    try:
+        completed = worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+        return 130
+    print(f"worker {worker.name}: {completed} task(s) run", file=sys.stderr)
+    return 0
+
+
+def run_bench_matrix(args):
+    """Run the benchmark matrix, save it and compare it with a baseline"""
+    from speedup import bench
+    from speedup.paths import cache_dir
+
+    if args.save_baseline and not args.baseline:
+        print("error: --save-baseline needs --baseline FILE", file=sys.stderr)
+        return 2
+    sources = args.input or bench.matrix_sources(args.sizes, args.durations,
+                                                 args.source_dir or cache_dir() / 'bench',
+                                                 ffmpeg=args.ffmpeg)
+    rows = bench.bench_matrix(sources, args.encoders, args.qualities, args.threads, args.speeds,
+                              args.repeat, ffmpeg=args.ffmpeg, ffprobe=args.ffprobe,
+                              on_row=(lambda row: emit(row)) if args.json else None)
+    regressions = []
+    if args.baseline and Path(args.baseline).exists():
+        regressions = bench.compare_baseline(rows, bench.load_rows(args.baseline),
+                                             args.tolerance)
+    if args.out:
+        bench.write_rows(rows, args.out)
+    if args.save_baseline:
+        bench.write_rows(rows, args.baseline)
+    if not args.json:
+        bench.print_rows(rows)
+    for row in regressions:
+        print(f"regression: {', '.join(f'{key}={row[key]}' for key in bench.MATRIX_KEY)} "
+              f"is {row['vs_baseline']:.2f}x the baseline wall time", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def run_bench(args):
+    """Run one of the benchmark commands"""
+    from speedup import bench
+
+    input_path = args.input
+    with tempfile.TemporaryDirectory() as work_dir:
+        if not input_path:
+            # Variable speed needs pauses in the audio to find
+            audio = bench.GATED_AUDIO if args.bench == 'silence' else bench.TONE_AUDIO
+            input_path = bench.synthetic_source(Path(work_dir) / "source.mp4", args.duration,
+                                                args.size, ffmpeg=args.ffmpeg, audio=audio)
+        settings = {'speed': args.speed, 'quality': args.quality}
+        if args.bench == 'chunked':
+            rows = bench.bench_chunked(input_path, args.chunks, settings,
+                                       ffmpeg=args.ffmpeg, ffprobe=args.ffprobe)
+        elif args.bench == 'decode':
+            rows = bench.bench_frame_selection(input_path, args.speeds, args.modes, settings,
+                                               ffmpeg=args.ffmpeg, ffprobe=args.ffprobe)
+        elif args.bench == 'calibrate':
+            from speedup.tuning import calibrate
+            rows = []
+            calibration = calibrate(input_path, args.ffmpeg, args.ffprobe, quality=args.quality,
+                                    on_step=lambda threads, fps: rows.append(
+                                        {'threads': threads, 'fps': fps}))
+            for row in rows:
+                row['aggregate_fps'] = round((calibration['cores'] // row['threads']) * row['fps'], 1)
+        elif args.bench == 'audio':
+            rows = bench.bench_audio(input_path, args.speeds, args.audio_modes, settings,
+                                     ffmpeg=args.ffmpeg, ffprobe=args.ffprobe)
+        elif args.bench == 'variants':
+            variants = [{'speed': speed} for speed in args.speeds]
+            variants += [{'quality': quality} for quality in args.qualities]
+            rows = bench.bench_variants(input_path, variants, settings,
+                                        ffmpeg=args.ffmpeg, ffprobe=args.ffprobe)
+        elif args.bench == 'silence':
+            rows = bench.bench_silence(input_path, args.silent_speed, settings,
+                                       ffmpeg=args.ffmpeg, ffprobe=args.ffprobe)
+        elif args.bench == 'staging':
+            rows = bench.bench_staging(input_path, settings, args.scratch,
+                                       ffmpeg=args.ffmpeg, ffprobe=args.ffprobe)
+        elif args.bench == 'layout':
+            rows = bench.bench_layouts(input_path, args.layouts, settings, args.dir,
+                                       ffmpeg=args.ffmpeg, ffprobe=args.ffprobe)
+    bench.print_rows(rows, args.json)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ishowspeed.py',
+                                     description="Video Speed-Up Tool (headless mode)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    batch = commands.add_parser('batch', help="process a JSON job manifest")
+    batch.add_argument('manifest', help="path to the job manifest")
+    batch.add_argument('--output', '-o', help="output folder (overrides the manifest)")
+    batch.add_argument('--dry-run', action='store_true',
+                       help="print the planned ffmpeg commands without running them")
+    batch.add_argument('--resume', action='store_true',
+                       help="skip jobs the output folder's journal records as complete")
+    batch.add_argument('--chunks', default='off',
+                       help="split long inputs into N keyframe-aligned chunks ('auto', 'off' or N)")
+    add_engine_args(batch)
+    batch.set_defaults(func=run_batch)
+
+    watch = commands.add_parser('watch', help="process new videos as they appear in folders")
+    watch.add_argument('folders', nargs='*', help="input folders to watch")
+    watch.add_argument('--config', help="JSON file with per-folder default settings")
+    watch.add_argument('--output', '-o', help="output folder")
+    watch.add_argument('--speed', type=float, help="default speed multiplier")
+    watch.add_argument('--fps', choices=FPS_CHOICES, help="default frame rate")
+    watch.add_argument('--quality', choices=QUALITY_LEVELS, help="default quality")
+    watch.add_argument('--settle', type=float, default=5.0,
+                       help="seconds a file's size and mtime must stay unchanged")
+    watch.add_argument('--poll', action='store_true',
+                       help="poll instead of using inotify (needed for network shares)")
+    watch.add_argument('--poll-interval', type=float, default=2.0,
+                       help="seconds between checks")
+    add_engine_args(watch)
+    watch.set_defaults(func=run_watch)
+
+    cache = commands.add_parser('cache', help="show or reset the encoded output cache")
+    cache.add_argument('action', choices=['stats', 'clear'], nargs='?', default='stats')
+    cache.set_defaults(func=run_cache)
+
+    farm = commands.add_parser('farm', help="spread a batch over worker processes or hosts")
+    farm_commands = farm.add_subparsers(dest='farm', required=True)
+
+    serve = farm_commands.add_parser('serve', help="coordinate a manifest's jobs for workers")
+    serve.add_argument('manifest', help="path to the job manifest")
+    serve.add_argument('--output', '-o', help="output folder (overrides the manifest)")
+    serve.add_argument('--bind', default='127.0.0.1:8765',
+                       help="address to listen on; use 0.0.0.0:PORT for other hosts")
+    serve.add_argument('--token', help="shared secret workers must present")
+    serve.add_argument('--resume', action='store_true',
+                       help="skip jobs the output folder's journal records as complete")
+    serve.add_argument('--local-workers', type=int, default=0,
+                       help="also start this many worker processes on this machine")
+    serve.add_argument('--lease-timeout', type=float, default=15.0,
+                       help="seconds without a heartbeat before a job is given to another worker")
+    serve.add_argument('--verbose', '-v', action='store_true', help="log leases and results")
+    add_engine_args(serve)
+    serve.set_defaults(func=run_farm_serve)
+
+    worker = farm_commands.add_parser('worker', help="run commands from a coordinator")
+    worker.add_argument('server', help="coordinator URL, e.g. http://host:8765")
+    worker.add_argument('--name', help="worker name (default: host:pid)")
+    worker.add_argument('--slots', type=int, default=1, help="commands run at once")
+    worker.add_argument('--token', help="shared secret of the coordinator")
+    worker.add_argument('--path-map', action='append', default=[], metavar='SERVER=LOCAL',
+                        help="where a coordinator path prefix is mounted here (repeatable)")
+    worker.add_argument('--persist', action='store_true',
+                        help="keep polling after the batch ends or the coordinator goes away")
+    worker.add_argument('--ffmpeg', default='ffmpeg', help="ffmpeg binary to use")
+    worker.set_defaults(func=run_farm_worker)
+
+    bench = commands.add_parser('bench', help="run performance benchmarks")
+    bench_commands = bench.add_subparsers(dest='bench', required=True)
+
+    chunked = bench_commands.add_parser('chunked', help="single-process vs chunked encoding")
+    chunked.add_argument('--chunks', type=int, nargs='+', default=[2, 4],
+                         help="chunk counts to compare")
+    add_bench_args(chunked)
+
+    decode = bench_commands.add_parser('decode', help="decode savings of frame selection modes")
+    decode.add_argument('--speeds', type=float, nargs='+', default=[2, 4, 8, 16, 32],
+                        help="speed multipliers to measure")
+    decode.add_argument('--modes', nargs='+', choices=FRAME_SELECTION_MODES,
+                        default=FRAME_SELECTION_MODES, help="frame selection modes to compare")
+    add_bench_args(decode)
+
+    calibrate = bench_commands.add_parser('calibrate',
+                                          help="measure threads scaling to seed --threads tune")
+    add_bench_args(calibrate)
+    calibrate.set_defaults(duration=10)
+
+    audio = bench_commands.add_parser('audio', help="CPU cost of each audio mode")
+    audio.add_argument('--speeds', type=float, nargs='+', default=[2, 4, 8],
+                       help="speed multipliers to measure")
+    audio.add_argument('--audio-modes', nargs='+', choices=AUDIO_MODES[:2],
+                       default=AUDIO_MODES[:2], help="audio modes to compare")
+    add_bench_args(audio)
+
+    matrix = bench_commands.add_parser('matrix', help="encoder/quality/threads/speed matrix "
+                                                      "on synthetic sources")
+    matrix.add_argument('--input', nargs='+', help="source videos (default: synthetic clips)")
+    matrix.add_argument('--sizes', nargs='+', default=['640x360', '1280x720', '1920x1080'],
+                        help="resolutions of the synthetic clips")
+    matrix.add_argument('--durations', type=int, nargs='+', default=[30],
+                        help="lengths of the synthetic clips in seconds")
+    matrix.add_argument('--source-dir', help="where synthetic clips are kept between runs")
+    matrix.add_argument('--encoders', nargs='+', choices=sorted(ENCODERS), default=['cpu'])
+    matrix.add_argument('--qualities', nargs='+', choices=QUALITY_LEVELS,
+                        default=QUALITY_LEVELS)
+    matrix.add_argument('--threads', nargs='+', default=['auto', '4', '8'],
+                        help="ffmpeg -threads values")
+    matrix.add_argument('--speeds', type=float, nargs='+', default=[2, 4])
+    matrix.add_argument('--repeat', type=int, default=1, help="runs per case (median reported)")
+    matrix.add_argument('--out', help="write results to a .json or .csv file")
+    matrix.add_argument('--baseline', help="results file to compare against")
+    matrix.add_argument('--save-baseline', action='store_true',
+                        help="store these results as the new baseline")
+    matrix.add_argument('--tolerance', type=float, default=0.10,
+                        help="wall-time increase over the baseline reported as a regression")
+    matrix.add_argument('--json', action='store_true', help="print results as JSON lines")
+    add_binary_args(matrix)
+    matrix.set_defaults(func=run_bench_matrix)
+
+    variants = bench_commands.add_parser('variants',
+                                         help="serial variants vs one shared decode")
+    variants.add_argument('--speeds', type=float, nargs='*', default=[1.5, 2, 4],
+                          help="speed variants to render")
+    variants.add_argument('--qualities', nargs='*', choices=QUALITY_LEVELS, default=[],
+                          help="extra quality variants at --speed")
+    add_bench_args(variants)
+
+    silence = bench_commands.add_parser('silence',
+                                        help="loudness analysis and variable-speed encode")
+    silence.add_argument('--silent-speed', type=float, default=8.0,
+                         help="speed of silent stretches (--speed applies to speech)")
+    add_bench_args(silence)
+    silence.set_defaults(speed=1.5)
+
+    layout = bench_commands.add_parser('layout',
+                                       help="wall time and I/O of each MP4 output layout")
+    layout.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=LAYOUTS,
+                        help="output layouts to compare")
+    layout.add_argument('--dir', help="write the outputs here, e.g. on the destination volume")
+    add_bench_args(layout)
+
+    staging = bench_commands.add_parser('staging',
+                                        help="encode from the input's volume vs a local copy")
+    staging.add_argument('--scratch', metavar='DIR', help="local directory for the copy")
+    add_bench_args(staging)
+    return parser
+
+
+def add_engine_args(parser):
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help="number of concurrent ffmpeg jobs (default: based on CPU count)")
+    parser.add_argument('--encoder', choices=sorted(ENCODERS), default='cpu',
+                        help="default encoder backend for jobs without one")
+    parser.add_argument('--threads', default='auto',
+                        help="ffmpeg -threads value per job, or 'tune' to choose jobs and "
+                             "threads automatically and adapt them to the system load")
+    parser.add_argument('--no-probe', dest='probe', action='store_false',
+                        help="skip ffprobe metadata lookup")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="always encode, even when an identical output already exists")
+    parser.add_argument('--order', choices=ORDER_POLICIES, default='longest',
+                        help="start the jobs with the longest (default) or shortest predicted "
+                             "encode time first, or keep the input order")
+    parser.add_argument('--frame-selection', choices=FRAME_SELECTION_MODES, default='exact',
+                        help="frame selection at high speeds: exact, or skip decoding "
+                             "non-reference frames / everything but keyframes")
+    parser.add_argument('--audio', choices=AUDIO_MODES, default='pitch',
+                        help="audio retiming: keep pitch (atempo), resample (faster, "
+                             "pitch shifts) or drop the audio")
+    parser.add_argument('--stream-copy', action='store_true',
+                        help="copy streams that need no change (1x speed, same frame rate) "
+                             "instead of re-encoding them at the chosen quality")
+    parser.add_argument('--layout', choices=LAYOUTS, default='faststart',
+                        help="MP4 layout: index at the front (a second pass over the file), "
+                             "fragmented and streamable in one pass, or index at the end")
+    parser.add_argument('--silent-speed', type=float, default=None,
+                        help="variable speed: play silent stretches at this speed and the "
+                             "rest at the job's speed")
+    parser.add_argument('--silence-threshold', type=float, default=None, metavar='DB',
+                        help="level below which audio counts as silence (default: -35 dBFS)")
+    parser.add_argument('--stage', choices=STAGE_MODES, default='off',
+                        help="copy the next queued inputs to local scratch while encoding and "
+                             "upload outputs in the background: for inputs and output folders "
+                             "on network mounts (auto), or always")
+    parser.add_argument('--scratch', metavar='DIR',
+                        help="local scratch directory for staging (default: in the user cache)")
+    parser.add_argument('--scratch-budget', type=int, default=DEFAULT_BUDGET_MB, metavar='MB',
+                        help="scratch space for staged inputs and outputs awaiting upload")
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_DEPTH, metavar='N',
+                        help="number of queued inputs staged ahead of the encodes")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='normal',
+                        help="resource profile; 'background' lowers CPU and I/O priority, "
+                             "uses half the cores and backs off when the system is busy")
+    parser.add_argument('--thread-budget', type=int, default=None,
+                        help="total encoder threads shared by all running jobs")
+    parser.add_argument('--nice', type=int, default=None,
+                        help="niceness of the ffmpeg processes (0-19)")
+    parser.add_argument('--ionice', choices=['best-effort', 'idle'], default=None,
+                        help="I/O scheduling class of the ffmpeg processes (Linux)")
+    parser.add_argument('--memory-limit', type=int, default=None, metavar='MB',
+                        help="address space limit of each ffmpeg process")
+    parser.add_argument('--load-threshold', type=float, default=None,
+                        help="run one job at a time while the load average is above this "
+                             "fraction of the cores")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="per-job metrics JSON lines file (default: "
+                             ".speedup-metrics.jsonl in the output folder)")
+    parser.add_argument('--no-metrics', dest='metrics_log', action='store_false',
+                        help="do not write the metrics JSON lines file")
+    parser.add_argument('--prometheus', metavar='PATH',
+                        help="keep a Prometheus text file with batch totals up to date, "
+                             "e.g. for node_exporter's textfile collector")
+    parser.add_argument('--metrics-hook', action='append', default=[], metavar='MODULE:FACTORY',
+                        help="profiler hook receiving span and job events (repeatable)")
+    add_binary_args(parser)
+
+
+def add_binary_args(parser):
+    parser.add_argument('--ffmpeg', default='ffmpeg', help="ffmpeg binary to use")
+    parser.add_argument('--ffprobe', default='ffprobe', help="ffprobe binary to use")
+
+
+def add_bench_args(parser):
+    parser.add_argument('--input', help="source video (default: a synthetic test clip)")
+    parser.add_argument('--duration', type=int, default=120,
+                        help="length of the synthetic clip in seconds")
+    parser.add_argument('--size', default='1280x720', help="resolution of the synthetic clip")
+    parser.add_argument('--speed', type=float, default=2.0, help="speed multiplier")
+    parser.add_argument('--quality', default='High', help="quality preset")
+    parser.add_argument('--json', action='store_true', help="print results as JSON lines")
+    add_binary_args(parser)
+    parser.set_defaults(func=run_bench)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # SIGTERM stops a batch the same way as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    return args.func(args)
@@ -0,0 +1,198 @@
+import heapq
+import json
+import os
+import statistics
+import threading
+import time
+from pathlib import Path
+
+from speedup.paths import cache_dir
+from speedup.tuning import PRESET_COST
+
+# Work is counted in megapixel-frames: a 1920x1080 frame encoded at the
+# "High" preset is about 2 units. Starting throughput of one job per
+# backend, in units per second, until finished jobs have been measured.
+DEFAULT_RATES = {
+    'cpu': 120.0,
+    'nvenc': 600.0,
+    'amf': 400.0,
+    'qsv': 400.0,
+    'vaapi': 400.0,
+    'videotoolbox': 300.0,
+}
+# Decoding a frame costs this fraction of encoding it
+DECODE_WEIGHT = 0.15
+# Remuxing a copied frame costs this fraction of encoding it
+COPY_WEIGHT = 0.01
+# Audio retiming and AAC encoding, in units per second of output
+AUDIO_WORK = 1.0
+# Weight of the newest measurement in a rate's running average
+SMOOTHING = 0.3
+# Frame size and rate assumed when the probe has none
+DEFAULT_PIXELS = 1280 * 720
+DEFAULT_FPS = 30.0
+
+ORDER_POLICIES = ['longest', 'shortest', 'fifo']
+
+
+def cost_model_path():
+    return cache_dir() / 'cost_model.json'
+
+
+def job_work(targets):
+    """Work of encoding a job's outputs in megapixel-frames, or None without a probed duration
+
+    ``targets`` are the outputs planned by BatchEngine; outputs sharing a
+    decode (variants) pay for decoding the input once.
+    """
+    from speedup.engine import output_frame_rate
+    probe = targets[0]['video'].get('probe') or {}
+    duration = probe.get('duration')
+    if not duration:
+        return None
+    source = probe.get('video') or {}
+    pixels = DEFAULT_PIXELS
+    if source.get('width') and source.get('height'):
+        pixels = source['width'] * source['height']
+    megapixels = pixels / 1e6
+    source_fps = source.get('fps') or DEFAULT_FPS
+
+    work = 0.0
+    decoded = False
+    for target in targets:
+        settings, plan = target['video'], target['plan']
+        output = target['expected_duration'] or duration / float(settings['speed'])
+        if plan['video']['action'] == 'encode':
+            fps = output_frame_rate(settings) or source_fps
+            work += output * fps * megapixels * PRESET_COST.get(settings['quality'], 1.0)
+            decoded = True
+        elif plan['video']['action'] == 'copy':
+            work += duration * source_fps * megapixels * COPY_WEIGHT
+        if plan['audio']['action'] == 'encode':
+            work += output * AUDIO_WORK
+    if decoded:
+        work += duration * source_fps * megapixels * DECODE_WEIGHT
+    return work
+
+
+def order_key(policy):
+    """Queue ordering for a policy: longest or shortest predicted job first, or None to keep FIFO
+
+    Jobs without a prediction count as long, so an unprobed file is not
+    left to run alone at the end of the batch.
+    """
+    if policy == 'longest':
+        return lambda job: -job.payload.get('predicted', float('inf'))
+    if policy == 'shortest':
+        return lambda job: job.payload.get('predicted', float('inf'))
+    if policy == 'fifo':
+        return None
+    raise ValueError(f"Unknown job order {policy!r}")
+
+
+def makespan(running, queued, slots):
+    """Seconds until the last job ends when queued jobs take the first free slot in order
+
+    ``running`` holds the remaining seconds of the jobs already running.
+    """
+    ends = list(running) + [0.0] * max(0, slots - len(running))
+    if not ends:
+        return None
+    heapq.heapify(ends)
+    for seconds in queued:
+        heapq.heappush(ends, heapq.heappop(ends) + seconds)
+    return max(ends)
+
+
+class CostModel:
+    """Predict encode times from probe data and learn throughput from finished jobs
+
+    A job's work (job_work) divided by the measured rate of its encoder
+    backend and quality gives its predicted seconds. Rates start from
+    DEFAULT_RATES, follow the throughput of finished jobs as a running
+    average and are saved in the cache directory, so predictions improve
+    from batch to batch. The predictions and outcomes of the current batch
+    are kept for ``report``.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else cost_model_path()
+        self.rates = self._load()
+        self.outcomes = []
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f).get('rates', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    @staticmethod
+    def rate_key(backend, quality):
+        return f"{backend}/{quality}"
+
+    def rate(self, backend, quality):
+        """Work units per second of one job on ``backend`` at ``quality``"""
+        with self._lock:
+            entry = self.rates.get(self.rate_key(backend, quality))
+        if entry:
+            return entry['rate']
+        return DEFAULT_RATES.get(backend, DEFAULT_RATES['cpu'])
+
+    def predict(self, backend, quality, work):
+        """Predicted seconds for ``work`` units, or None if the work is unknown"""
+        if work is None:
+            return None
+        return work / self.rate(backend, quality)
+
+    def observe(self, backend, quality, work, predicted, seconds):
+        """Fold a finished job's measured throughput into the rate it was predicted with"""
+        if not work or not seconds or seconds <= 0:
+            return
+        measured = work / seconds
+        key = self.rate_key(backend, quality)
+        with self._lock:
+            entry = self.rates.get(key)
+            if entry:
+                entry['rate'] += SMOOTHING * (measured - entry['rate'])
+                entry['samples'] += 1
+            else:
+                self.rates[key] = {'rate': measured, 'samples': 1}
+            self.rates[key]['updated'] = time.time()
+            if predicted:
+                self.outcomes.append((predicted, seconds))
+
+    def correction(self):
+        """How much longer than predicted this batch's finished jobs took"""
+        with self._lock:
+            predicted = sum(p for p, _ in self.outcomes)
+            actual = sum(a for _, a in self.outcomes)
+        return actual / predicted if predicted else 1.0
+
+    def report(self):
+        """Prediction accuracy over the jobs finished in this batch"""
+        with self._lock:
+            outcomes = list(self.outcomes)
+        if not outcomes:
+            return None
+        errors = [abs(actual - predicted) / actual for predicted, actual in outcomes]
+        return {
+            'jobs': len(outcomes),
+            'predicted_seconds': round(sum(p for p, _ in outcomes), 1),
+            'actual_seconds': round(sum(a for _, a in outcomes), 1),
+            'mean_error_pct': round(statistics.mean(errors) * 100, 1),
+            'worst_error_pct': round(max(errors) * 100, 1),
+        }
+
+    def save(self):
+        """Write the learned rates; a failure only loses this batch's learning"""
+        with self._lock:
+            rates = json.loads(json.dumps(self.rates))
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'rates': rates}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
@@ -0,0 +1,1234 @@
+import contextlib
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from pathlib import Path
+
+from speedup.costmodel import job_work, makespan, order_key
+from speedup.fingerprint import content_fingerprint, input_fingerprint
+from speedup.journal import JobJournal, output_is_complete, partial_path
+from speedup.progress import PROGRESS_ARGS, STOP_GRACE, Cancelled, FFmpegError, run_ffmpeg
+from speedup.results import result_key, reuse_output
+from speedup.scheduler import Job, JobScheduler, default_worker_count
+from speedup.speedmap import attach_speed_maps, clip_speed_map, mapped_duration
+from speedup.staging import IOWaitMonitor
+
+SUPPORTED_FORMATS = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v'}
+
+QUALITY_LEVELS = ["Low", "Medium", "High", "Very High"]
+FPS_CHOICES = ["30", "60", "Keep Original"]
+
+DEFAULT_SETTINGS = {'speed': 2.0, 'fps': '30', 'quality': 'High'}
+
+# Video encoder for each backend
+ENCODERS = {
+    'cpu': 'libx264',
+    'nvenc': 'h264_nvenc',
+    'amf': 'h264_amf',
+    'qsv': 'h264_qsv',
+    'videotoolbox': 'h264_videotoolbox',
+    'vaapi': 'h264_vaapi',
+}
+
+# Hardware decoding arguments for each backend
+HWACCEL_ARGS = {
+    'nvenc': ['-hwaccel', 'cuda'],
+    'qsv': ['-hwaccel', 'qsv'],
+    'vaapi': ['-hwaccel', 'vaapi', '-vaapi_device', '/dev/dri/renderD128'],
+    'videotoolbox': ['-hwaccel', 'videotoolbox'],
+}
+
+# Surface format that keeps decoded frames in GPU memory up to the encoder.
+# setpts and fps only touch timestamps, so they run on surfaces unchanged;
+# scaling needs the backend's own scaler.
+HW_FRAME_FORMATS = {'nvenc': 'cuda', 'qsv': 'qsv', 'vaapi': 'vaapi'}
+HW_SCALE_FILTERS = {'nvenc': 'scale_cuda', 'qsv': 'scale_qsv', 'vaapi': 'scale_vaapi'}
+
+# Source codecs copied into the output untouched when a stream needs no change
+COPY_VIDEO_CODECS = {'h264'}
+COPY_AUDIO_CODECS = {'aac', 'mp3'}
+COPY_CONTAINERS = {'.mp4', '.m4v', '.mov', '.mkv'}
+
+# Frame rates closer than this are treated as equal
+RATE_TOLERANCE = 0.01
+
+# Encoder options for each backend and quality level
+QUALITY_MAPS = {
+    'nvenc': {
+        "Low": ['-preset', 'fast', '-cq', '30'],
+        "Medium": ['-preset', 'medium', '-cq', '25'],
+        "High": ['-preset', 'slow', '-cq', '20'],
+        "Very High": ['-preset', 'slow', '-cq', '18']
+    },
+    'amf': {
+        "Low": ['-quality', 'speed', '-qp_i', '30'],
+        "Medium": ['-quality', 'balanced', '-qp_i', '25'],
+        "High": ['-quality', 'quality', '-qp_i', '20'],
+        "Very High": ['-quality', 'quality', '-qp_i', '18']
+    },
+    'qsv': {
+        "Low": ['-preset', 'veryfast', '-global_quality', '30', '-look_ahead', '0'],
+        "Medium": ['-preset', 'medium', '-global_quality', '25', '-look_ahead', '1'],
+        "High": ['-preset', 'slow', '-global_quality', '20', '-look_ahead', '1'],
+        "Very High": ['-preset', 'slower', '-global_quality', '18', '-look_ahead', '1']
+    },
+    'videotoolbox': {
+        "Low": ['-q:v', '60'],
+        "Medium": ['-q:v', '50'],
+        "High": ['-q:v', '40'],
+        "Very High": ['-q:v', '30']
+    },
+    'vaapi': {
+        "Low": ['-qp', '30'],
+        "Medium": ['-qp', '25'],
+        "High": ['-qp', '20'],
+        "Very High": ['-qp', '18']
+    },
+    'cpu': {
+        "Low": ['-crf', '28', '-preset', 'ultrafast'],
+        "Medium": ['-crf', '23', '-preset', 'fast'],
+        "High": ['-crf', '18', '-preset', 'medium'],
+        "Very High": ['-crf', '15', '-preset', 'slow']
+    },
+}
+
+
+# Frame selection when most source frames would be thrown away:
+# 'exact' decodes everything, 'approximate' skips non-reference frames and
+# 'keyframe' decodes keyframes only
+FRAME_SELECTION_MODES = ['exact', 'approximate', 'keyframe']
+SKIP_FRAME_ARGS = {
+    'exact': [],
+    'approximate': ['-skip_frame', 'nonref'],
+    'keyframe': ['-skip_frame', 'nokey'],
+}
+
+# Let the decoder skip frames once this many source frames map onto each output frame
+DECIMATE_RATIO = 2.0
+
+# Audio retiming: 'pitch' keeps the pitch with atempo, 'resample' plays the
+# samples faster (pitch rises with speed, much cheaper) and 'drop' removes audio
+AUDIO_MODES = ['pitch', 'resample', 'drop']
+
+# MP4 layouts: faststart moves the index to the front in a second pass over
+# the file; fragmented writes a streamable file in one pass; plain leaves
+# the index at the end
+LAYOUTS = ['faststart', 'fragmented', 'plain']
+LAYOUT_MOVFLAGS = {
+    'faststart': '+faststart',
+    'fragmented': '+frag_keyframe+empty_moov+default_base_moof',
+    'plain': None,
+}
+# Containers that take -movflags
+MOVFLAGS_CONTAINERS = {'.mp4', '.m4v', '.mov'}
+# Inputs whose container cannot hold H.264 and AAC get outputs in another one
+OUTPUT_EXTENSIONS = {'.webm': '.mkv', '.wmv': '.mp4'}
+# Audio encoder used unless the container needs another one
+AUDIO_ENCODE_ARGS = ['-c:a', 'aac', '-b:a', '128k']
+# Audio codecs for containers where AAC is poorly supported
+CONTAINER_AUDIO_ARGS = {'.avi': ['-c:a', 'libmp3lame', '-b:a', '192k']}
+
+# Settings a per-file output variant may override
+VARIANT_KEYS = {'speed', 'fps', 'quality'}
+
+
+def encoder_backend(video_settings, hw_accel='cpu'):
+    """Return the encoder backend for a video, honouring a per-file override"""
+    return video_settings.get('encoder') or hw_accel
+
+
+def output_frame_rate(video_settings):
+    """Return the output frame rate in frames per second, if known"""
+    if video_settings['fps'] != "Keep Original":
+        return float(video_settings['fps'])
+    probe = video_settings.get('probe') or {}
+    return (probe.get('video') or {}).get('fps')
+
+
+def decode_strategy(video_settings):
+    """Choose decoder frame skipping and pre-retime decimation for a video
+
+    Returns ``(input_args, pre_filter)``. When the output rate is below
+    ``source_fps * speed`` the frames that survive are picked in the source
+    timeline before setpts and scaling, and once it is far below, the
+    selected frame_selection mode decides how many frames the decoder may
+    skip outright.
+    """
+    probe = video_settings.get('probe') or {}
+    source_fps = (probe.get('video') or {}).get('fps')
+    out_fps = output_frame_rate(video_settings)
+    speed = float(video_settings['speed'])
+    # With a speed map the source rate needed changes from segment to segment
+    if not source_fps or not out_fps or video_settings.get('speed_map'):
+        return [], None
+
+    ratio = source_fps * speed / out_fps
+    if ratio <= 1 + RATE_TOLERANCE:
+        return [], None
+
+    skip_args = []
+    if ratio >= DECIMATE_RATIO:
+        mode = video_settings.get('frame_selection') or 'exact'
+        skip_args = SKIP_FRAME_ARGS.get(mode, [])
+    # Frames needed per second of source time
+    return skip_args, f"fps={out_fps / speed:.6g}"
+
+
+def atempo_chain(speed):
+    """Build an atempo filter chain, each stage limited to 2x"""
+    audio_filter = f"atempo={min(speed, 2.0)}"
+
+    # Handle speeds > 2.0 for audio
+    if speed > 2.0:
+        remaining_speed = speed / 2.0
+        while remaining_speed > 2.0:
+            audio_filter += ",atempo=2.0"
+            remaining_speed /= 2.0
+        if remaining_speed > 1.0:
+            audio_filter += f",atempo={remaining_speed}"
+    return audio_filter
+
+
+def has_audio_stream(video_settings):
+    """Whether the output keeps audio: not dropped, and present in the probed input"""
+    if video_settings.get('audio') == 'drop':
+        return False
+    probe = video_settings.get('probe')
+    return not probe or probe.get('audio') is not None
+
+
+def audio_filter_chain(video_settings):
+    """Retiming filter chain for the audio stream in the selected audio mode"""
+    speed = float(video_settings['speed'])
+    probe = video_settings.get('probe') or {}
+    sample_rate = (probe.get('audio') or {}).get('sample_rate')
+    # Resampling needs the source rate; fall back to atempo without a probe
+    if video_settings.get('audio') == 'resample' and sample_rate:
+        return f"asetrate={round(sample_rate * speed)},aresample={sample_rate}"
+    return atempo_chain(speed)
+
+
+def scale_filter(max_height, hw_accel='cpu', hw_frames=False):
+    """Downscale to at most ``max_height`` lines, on the GPU when frames stay there"""
+    name = HW_SCALE_FILTERS[hw_accel] if hw_frames else 'scale'
+    return f"{name}=-2:'min(ih,{max_height})'"
+
+
+def _rates_match(rate, other):
+    return bool(rate and other) and abs(rate - other) <= RATE_TOLERANCE * other
+
+
+def plan_streams(video_settings, hw_accel='cpu', streams='av', max_height=None, container=None):
+    """Decide how each stream of a video is produced from its probed properties
+
+    Returns a JSON-serialisable plan: the input-side ``decode`` arguments
+    and, for 'video' and 'audio', an ``action`` of 'copy', 'encode' or
+    'drop' with the filters left once no-op stages are removed. A stream
+    that needs no change is copied only if the setting ``stream_copy`` asks
+    for it and its codec fits ``container`` (no container means always
+    encode, e.g. for segments). Otherwise the quality setting applies.
+    Frame-rate reduction runs before retiming and scaling, and with a GPU
+    backend decoded frames stay in device memory up to the encoder.
+    ``notes`` explain each choice.
+    """
+    hw_accel = encoder_backend(video_settings, hw_accel)
+    probe = video_settings.get('probe') or {}
+    source = probe.get('video') or {}
+    speed = float(video_settings['speed'])
+    speed_map = video_settings.get('speed_map')
+    retimed = speed != 1 or bool(speed_map)
+    may_copy = (bool(video_settings.get('stream_copy'))
+                and bool(container) and container.lower() in COPY_CONTAINERS)
+    notes = []
+    plan = {'backend': hw_accel, 'decode': [], 'video': {'action': 'drop'},
+            'audio': {'action': 'drop'}, 'notes': notes}
+
+    if 'v' in streams:
+        source_fps = source.get('fps')
+        out_fps = output_frame_rate(video_settings)
+        keeps_rate = video_settings['fps'] == "Keep Original" or _rates_match(source_fps, out_fps)
+        # Sources already small enough for a preview need no scaler
+        needs_scale = bool(max_height) and not (source.get('height')
+                                                and source['height'] <= max_height)
+        if (may_copy and not retimed and keeps_rate and not needs_scale
+                and source.get('codec') in COPY_VIDEO_CODECS):
+            plan['video'] = {'action': 'copy'}
+            notes.append(f"video: {source['codec']} copied, speed and frame rate unchanged")
+        else:
+            # Segment and concat filters run on system memory frames
+            hw_frames = hw_accel in HW_FRAME_FORMATS and not speed_map
+            plan['decode'].extend(HWACCEL_ARGS.get(hw_accel, []))
+            if hw_frames:
+                plan['decode'].extend(['-hwaccel_output_format', HW_FRAME_FORMATS[hw_accel]])
+                notes.append(f"video: frames stay in {HW_FRAME_FORMATS[hw_accel]} surfaces")
+            skip_args, decimate_filter = decode_strategy(video_settings)
+            plan['decode'].extend(skip_args)
+
+            filters = []
+            rate = None if video_settings['fps'] == "Keep Original" else video_settings['fps']
+            if decimate_filter:
+                filters.append(decimate_filter)
+                notes.append(f"video: frames dropped to {decimate_filter[4:]} fps of source "
+                             "time before retiming")
+                # The fps filter already produces the output rate
+                rate = None
+            elif not speed_map and source_fps and _rates_match(source_fps * speed, out_fps):
+                rate = None
+            if speed != 1 and not speed_map:
+                filters.append(f"setpts={1/speed}*PTS")
+            if needs_scale:
+                filters.append(scale_filter(max_height, hw_accel, hw_frames))
+            if speed_map and hw_accel == 'vaapi':
+                # The VA-API encoder only takes surfaces
+                filters.extend(['format=nv12', 'hwupload'])
+            plan['video'] = {'action': 'encode', 'encoder': ENCODERS.get(hw_accel, 'libx264'),
+                             'filters': filters, 'rate': rate, 'hw_frames': hw_frames,
+                             'skip_frames': skip_args}
+            if speed_map:
+                notes.append("video: retimed per segment, filters run after the join")
+
+    if 'a' in streams and has_audio_stream(video_settings):
+        codec = (probe.get('audio') or {}).get('codec')
+        if may_copy and not retimed and codec in COPY_AUDIO_CODECS:
+            plan['audio'] = {'action': 'copy'}
+            notes.append(f"audio: {codec} copied, speed unchanged")
+        else:
+            filters = [audio_filter_chain(video_settings)] if retimed and not speed_map else []
+            plan['audio'] = {'action': 'encode', 'filters': filters}
+    return plan
+
+
+def speed_map_graph(video_settings, segments, has_video=True, has_audio=True, video_filters=()):
+    """Filter graph playing each ``[start, end, speed]`` segment at its own speed
+
+    The segment/asegment filters cut the decoded streams at the segment
+    boundaries in order, each piece is retimed, and concat joins them into
+    ``[vout]``/``[aout]``, so the input is decoded once in a single pass.
+    ``video_filters`` run on the joined video.
+    """
+    count = len(segments)
+    timestamps = '|'.join(f"{end:.3f}" for _, end, _ in segments[:-1])
+    graph = []
+    if has_video:
+        cut = f"segment=timestamps={timestamps}" if count > 1 else "null"
+        graph.append(f"[0:v]{cut}" + ''.join(f"[vs{i}]" for i in range(count)))
+    if has_audio:
+        cut = f"asegment=timestamps={timestamps}" if count > 1 else "anull"
+        graph.append(f"[0:a]{cut}" + ''.join(f"[as{i}]" for i in range(count)))
+    pieces = ""
+    for i, (_, _, speed) in enumerate(segments):
+        if has_video:
+            graph.append(f"[vs{i}]setpts=(PTS-STARTPTS)/{speed}[vr{i}]")
+            pieces += f"[vr{i}]"
+        if has_audio:
+            chain = audio_filter_chain({**video_settings, 'speed': speed})
+            graph.append(f"[as{i}]asetpts=PTS-STARTPTS,{chain}[ar{i}]")
+            pieces += f"[ar{i}]"
+    outputs = ("[vjoin]" if has_video else "") + ("[aout]" if has_audio else "")
+    graph.append(f"{pieces}concat=n={count}:v={int(has_video)}:a={int(has_audio)}{outputs}")
+    if has_video:
+        graph.append(f"[vjoin]{','.join(video_filters) or 'null'}[vout]")
+    return ';'.join(graph)
+
+
+def output_extension(input_path):
+    """Extension of the outputs made from an input"""
+    suffix = Path(input_path).suffix
+    return OUTPUT_EXTENSIONS.get(suffix.lower(), suffix)
+
+
+def muxer_args(extension, layout='faststart'):
+    """The MP4 layout's -movflags, for the containers that take them"""
+    flags = LAYOUT_MOVFLAGS[layout or 'faststart']
+    if flags and extension.lower() in MOVFLAGS_CONTAINERS:
+        return ['-movflags', flags]
+    return []
+
+
+def audio_encode_args(extension):
+    """Audio encoder and bitrate arguments for an output container"""
+    return CONTAINER_AUDIO_ARGS.get(extension.lower(), AUDIO_ENCODE_ARGS)
+
+
+def video_encode_args(video_settings, video_plan, hw_accel='cpu'):
+    """Output frame rate, encoder and quality arguments for a planned video stream"""
+    if video_plan['action'] == 'copy':
+        return ['-c:v', 'copy']
+    args = []
+    # Frame rate, unless the filters already produce it
+    if video_plan['rate']:
+        args.extend(['-r', str(video_plan['rate'])])
+
+    # Hardware encoder selection and quality
+    args.extend(['-c:v', video_plan['encoder']])
+    quality_map = QUALITY_MAPS.get(hw_accel, QUALITY_MAPS['cpu'])
+    args.extend(quality_map[video_settings['quality']])
+    return args
+
+
+def build_ffmpeg_command(input_path, output_path, video_settings, hw_accel='cpu',
+                         threads='auto', ffmpeg='ffmpeg', start=None, duration=None,
+                         streams='av', max_height=None, container=None):
+    """Build FFmpeg command based on settings with hardware acceleration
+
+    ``start`` and ``duration`` (seconds of source time) restrict the input to
+    one segment; ``streams`` selects 'av', video-only 'v' or audio-only 'a'.
+    ``max_height`` scales the video down for previews. The stream handling
+    comes from plan_streams and the MP4 layout from the 'layout' setting.
+    ``container`` is the final output's extension when ``output_path`` is an
+    intermediate file, so the codecs chosen suit the final container.
+    """
+    cmd = [ffmpeg] + PROGRESS_ARGS
+    threads = video_settings.get('threads') or threads
+
+    # Placeholder paths (see encode_params) stand for the usual output name
+    extension = (container or Path(str(output_path)).suffix
+                 or output_extension(video_settings.get('path', '')))
+    # Segments are cut at arbitrary times, which stream copy cannot do
+    container = extension if not start and not duration else None
+    plan = plan_streams(video_settings, hw_accel, streams, max_height, container)
+    video, audio = plan['video'], plan['audio']
+
+    # Hardware decoding and frame skipping (input options precede -i)
+    cmd.extend(plan['decode'])
+
+    # Input-side segment selection
+    if start:
+        cmd.extend(['-ss', f"{start:.6f}"])
+    if duration:
+        cmd.extend(['-t', f"{duration:.6f}"])
+    cmd.extend(['-i', str(input_path)])
+
+    # CPU threads optimization
+    if str(threads) != 'auto' and 'encode' in (video['action'], audio['action']):
+        cmd.extend(['-threads', str(threads)])
+
+    has_video = video['action'] != 'drop'
+    has_audio = audio['action'] != 'drop'
+
+    # Apply filters
+    segments = clip_speed_map(video_settings.get('speed_map') or [], start, duration)
+    if segments:
+        cmd.extend(['-filter_complex', speed_map_graph(video_settings, segments, has_video,
+                                                       has_audio, video.get('filters', ()))])
+        if has_video:
+            cmd.extend(['-map', '[vout]'])
+        if has_audio:
+            cmd.extend(['-map', '[aout]'])
+    else:
+        if video.get('filters'):
+            cmd.extend(['-filter:v', ','.join(video['filters'])])
+        if audio.get('filters'):
+            cmd.extend(['-filter:a', ','.join(audio['filters'])])
+
+    if has_video:
+        cmd.extend(video_encode_args(video_settings, video, plan['backend']))
+    else:
+        cmd.append('-vn')
+
+    # Audio encoding
+    if audio['action'] == 'copy':
+        cmd.extend(['-c:a', 'copy'])
+    elif has_audio:
+        cmd.extend(audio_encode_args(extension))
+    else:
+        cmd.append('-an')
+
+    # Output layout (intermediate segments are never served directly)
+    if streams == 'av':
+        cmd.extend(muxer_args(extension, video_settings.get('layout')))
+
+    # Overwrite output
+    cmd.extend(['-y', str(output_path)])
+
+    return cmd
+
+
+def build_variants_command(input_path, targets, hw_accel='cpu', threads='auto',
+                           ffmpeg='ffmpeg'):
+    """Build one FFmpeg command rendering several variants of the same input
+
+    ``targets`` is a list of ``(video_settings, output_path)``. The input is
+    demuxed and decoded once and split in the filter graph into one branch
+    per output, each with its own retiming and encoder.
+    """
+    base = targets[0][0]
+    threads = base.get('threads') or threads
+    plans = [plan_streams(settings, hw_accel) for settings, _ in targets]
+    cmd = [ffmpeg] + PROGRESS_ARGS
+    cmd.extend(HWACCEL_ARGS.get(plans[0]['backend'], []))
+    if plans[0]['video']['hw_frames']:
+        cmd.extend(['-hwaccel_output_format', HW_FRAME_FORMATS[plans[0]['backend']]])
+
+    # Decoder frame skipping is shared, so only use it when every variant agrees
+    skip_args = plans[0]['video']['skip_frames']
+    if all(plan['video']['skip_frames'] == skip_args for plan in plans):
+        cmd.extend(skip_args)
+    cmd.extend(['-i', str(input_path)])
+
+    count = len(targets)
+    has_audio = has_audio_stream(base)
+    graph = ["[0:v]split={}{}".format(count, ''.join(f"[s{i}]" for i in range(count)))]
+    if has_audio:
+        graph.append("[0:a]asplit={}{}".format(count, ''.join(f"[t{i}]" for i in range(count))))
+    for i, plan in enumerate(plans):
+        graph.append(f"[s{i}]{','.join(plan['video']['filters']) or 'null'}[v{i}]")
+        if has_audio:
+            graph.append(f"[t{i}]{','.join(plan['audio']['filters']) or 'anull'}[a{i}]")
+    cmd.extend(['-filter_complex', ';'.join(graph)])
+
+    for i, (settings, output_path) in enumerate(targets):
+        cmd.extend(['-map', f"[v{i}]"])
+        if has_audio:
+            cmd.extend(['-map', f"[a{i}]"])
+        if str(threads) != 'auto':
+            cmd.extend(['-threads', str(threads)])
+        cmd.extend(video_encode_args(settings, plans[i]['video'], plans[i]['backend']))
+        extension = Path(str(output_path)).suffix
+        cmd.extend(audio_encode_args(extension) if has_audio else ['-an'])
+        cmd.extend(muxer_args(extension, settings.get('layout')))
+        cmd.extend(['-y', str(output_path)])
+    return cmd
+
+
+def copied_streams(job):
+    """Streams of a job's outputs that are copied rather than re-encoded"""
+    return sorted({stream for target in job.payload['targets'] if not target['source']
+                   for stream in ('video', 'audio')
+                   if target['plan'][stream]['action'] == 'copy'})
+
+
+def with_threads(cmd, threads):
+    """Copy of a command with the -threads value of every output set to ``threads``
+
+    Outputs built without -threads ('auto') get one. Each output ends with
+    ``-y <path>``, as the builders above write it.
+    """
+    result = []
+    found = False
+    index = 0
+    while index < len(cmd):
+        arg = cmd[index]
+        if arg == '-threads' and index + 1 < len(cmd):
+            result.extend([arg, str(threads)])
+            found = True
+            index += 2
+            continue
+        if arg == '-y':
+            if not found:
+                result.extend(['-threads', str(threads)])
+            found = False
+        result.append(arg)
+        index += 1
+    return result
+
+
+def expand_variants(video):
+    """Return the full settings of each output a video entry asks for"""
+    variants = video.get('variants')
+    if not variants:
+        return [video]
+    base = {key: value for key, value in video.items() if key != 'variants'}
+    return [make_video(video['path'], {**base, **variant}) for variant in variants]
+
+
+def variant_suffix(settings, variants):
+    """Name part telling apart variants that share a speed"""
+    suffix = ""
+    if len({str(variant['fps']) for variant in variants}) > 1:
+        fps = 'orig' if settings['fps'] == "Keep Original" else settings['fps']
+        suffix += f"_{fps}fps"
+    if len({variant['quality'] for variant in variants}) > 1:
+        suffix += "_" + settings['quality'].lower().replace(' ', '')
+    if settings.get('speed_map'):
+        suffix += f"_silent{float(settings['silent_speed'])}x"
+    return suffix
+
+
+def is_output_for(output_path, input_path, speed, output_folder, suffix=""):
+    """Whether a path is one generate_output_filename could have chosen"""
+    output_path = Path(output_path)
+    input_file = Path(input_path)
+    if output_path.parent != Path(output_folder):
+        return False
+    stem = re.escape(f"{input_file.stem}_{speed}x{suffix}")
+    extension = re.escape(output_extension(input_path))
+    return re.fullmatch(rf"{stem}(_\d+)?{extension}", output_path.name) is not None
+
+
+def generate_output_filename(input_path, speed, output_folder, reserved=None, suffix=""):
+    """Generate output filename with conflict resolution"""
+    input_file = Path(input_path)
+    base_name = input_file.stem
+    extension = output_extension(input_file)
+    reserved = reserved if reserved is not None else set()
+
+    # Create base output filename
+    output_name = f"{base_name}_{speed}x{suffix}{extension}"
+    output_path = Path(output_folder) / output_name
+
+    # Handle conflicts (including names already claimed by queued jobs)
+    counter = 1
+    while output_path.exists() or str(output_path) in reserved:
+        output_name = f"{base_name}_{speed}x{suffix}_{counter}{extension}"
+        output_path = Path(output_folder) / output_name
+        counter += 1
+
+    reserved.add(str(output_path))
+    return str(output_path)
+
+
+def encode_params(video_settings, hw_accel='cpu', threads='auto'):
+    """Normalised encode parameters of a video, independent of file paths"""
+    cmd = build_ffmpeg_command('{input}', '{output}', video_settings, hw_accel, threads)
+    return json.dumps(cmd[1 + len(PROGRESS_ARGS):])
+
+
+def expected_output_duration(video_settings):
+    """Duration the output should have, from the probed input duration"""
+    probe = video_settings.get('probe') or {}
+    if video_settings.get('speed_map'):
+        return mapped_duration(video_settings['speed_map'], probe.get('duration'))
+    if not probe.get('duration'):
+        return None
+    return probe['duration'] / float(video_settings['speed'])
+
+
+def make_video(path, settings=None):
+    """Create a video entry with the given settings over the defaults"""
+    video = dict(DEFAULT_SETTINGS)
+    video.update(settings or {})
+    video['path'] = str(path)
+    video['speed'] = float(video['speed'])
+    video['fps'] = str(video['fps'])
+    if video['quality'] not in QUALITY_LEVELS:
+        raise ValueError(f"Unknown quality {video['quality']!r}")
+    if video['speed'] <= 0:
+        raise ValueError("Speed must be positive")
+    if video.get('audio', 'pitch') not in AUDIO_MODES:
+        raise ValueError(f"Unknown audio mode {video['audio']!r}")
+    if video.get('layout', 'faststart') not in LAYOUTS:
+        raise ValueError(f"Unknown output layout {video['layout']!r}")
+    if video.get('silent_speed'):
+        video['silent_speed'] = float(video['silent_speed'])
+        if video['silent_speed'] <= 0:
+            raise ValueError("Silent speed must be positive")
+        if video.get('variants'):
+            raise ValueError("Variable speed cannot be combined with output variants")
+    if video.get('variants'):
+        variants = []
+        for variant in video['variants']:
+            unknown = set(variant) - VARIANT_KEYS
+            if unknown:
+                raise ValueError(f"Unknown variant setting(s): {', '.join(sorted(unknown))}")
+            checked = make_video(path, {**video, **variant, 'variants': None})
+            variants.append({key: checked[key] for key in VARIANT_KEYS})
+        video['variants'] = variants
+    return video
+
+
+class BatchEngine:
+    """Plan and run a batch of encodes without any UI dependency
+
+    Callbacks are invoked from worker threads:
+    ``on_progress(job, update)``, ``on_job_start(job)`` and ``on_job_done(job)``.
+    Outputs are encoded to a temporary name and renamed into place on
+    success, and every job is recorded in a journal in the output folder.
+    With a ``result_cache``, outputs already encoded from the same input
+    content and parameters are linked or copied instead of re-encoded.
+    With a ``tuner`` (speedup.tuning.AutoTuner), the number of concurrent
+    jobs and each job's threads are chosen and adapted by the tuner. A
+    ``governor`` (speedup.governor.ResourceGovernor) sets the priority and
+    limits of every ffmpeg process and splits its thread budget between jobs.
+    A ``metrics`` recorder (speedup.metrics.MetricsRecorder) receives
+    per-job stage timings and encode measurements. ``runner`` replaces
+    run_ffmpeg, e.g. to run commands on remote workers (speedup.farm).
+    ``stop`` and ``cancel`` stop running ffmpeg processes and delete their
+    partial outputs; ``pause`` holds back queued jobs. None of them block.
+    A ``cost_model`` (speedup.costmodel.CostModel) predicts each job's
+    encode time, which orders the queue by ``order`` ('longest' first,
+    'shortest' first or 'fifo') and drives the batch ETA. A ``stager``
+    (speedup.staging.ScratchStager) copies the next queued inputs to local
+    scratch while encodes run and uploads outputs written to scratch in the
+    background; a job with an upload finishes when its outputs are in place.
+    """
+
+    def __init__(self, output_folder, hw_accel='cpu', threads='auto', max_workers=None,
+                 ffmpeg='ffmpeg', on_progress=None, on_job_start=None, on_job_done=None,
+                 chunks='off', ffprobe='ffprobe', defaults=None, journal=True,
+                 result_cache=None, tuner=None, governor=None, metrics=None, runner=None,
+                 cost_model=None, order='longest', stager=None):
+        self.output_folder = output_folder
+        # Settings applied to videos that do not set them explicitly
+        self.defaults = defaults or {}
+        self.hw_accel = hw_accel
+        self.threads = threads
+        self.max_workers = max_workers or default_worker_count()
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.chunks = chunks
+        self.on_progress = on_progress
+        self.on_job_start = on_job_start
+        self.on_job_done = on_job_done
+
+        self.use_journal = journal
+        self.journal = None
+        self.result_cache = result_cache
+        self.tuner = tuner
+        self.governor = governor
+        self.metrics = metrics
+        self.runner = runner or run_ffmpeg
+        # Remote workers read and write the shared folders themselves
+        self.stager = stager if self.runner is run_ffmpeg else None
+        self.cost_model = cost_model
+        # Predictions are needed to order by; without them the queue stays FIFO
+        self.order = order if cost_model else 'fifo'
+        order_key(self.order)
+        self.scheduler = None
+        self.stopped = False
+        self._paused = False
+        self.started = None
+        self._fractions = {}
+        self._finished = 0
+        self._total = 0
+        self._skipped = 0
+        self._reused = 0
+        self._next_id = 0
+        self._reserved = set()
+        self._lock = threading.Lock()
+
+    def open_journal(self):
+        """Open the job journal if the output folder exists"""
+        if self.use_journal and self.journal is None and Path(self.output_folder).is_dir():
+            self.journal = JobJournal(self.output_folder)
+        return self.journal
+
+    def plan(self, videos, resume=False, analyse=True):
+        """Resolve output names and commands for each video
+
+        A video with output variants becomes a single job whose command
+        decodes the input once and writes every variant. With ``resume``,
+        outputs whose journal entry is done and which pass the validity check
+        are left out; a job with nothing left to render is marked 'skipped',
+        and unfinished outputs reuse their previous name instead of getting
+        a new suffix. Without ``analyse`` no audio is decoded for variable
+        speed, and those videos are planned at their speech speed.
+        """
+        journal = self.open_journal()
+        if self.tuner and not self.tuner.configured:
+            self.tuner.configure([{**self.defaults, **video} for video in videos])
+            if self.scheduler:
+                self.scheduler.set_active_limit(self.tuner.jobs)
+        threads = self.tuner.threads if self.tuner else self.threads
+        videos = [{**self.defaults, **video} for video in videos]
+        # Variable speed needs each input's loudness profile before its command is built
+        if analyse:
+            with self.batch_span('analysis'):
+                attach_speed_maps(videos, self.ffmpeg, self.max_workers)
+        jobs = []
+        for video in videos:
+            planning = time.perf_counter()
+            try:
+                fingerprint = input_fingerprint(video['path'])
+            except OSError:
+                fingerprint = None
+            content = None
+            if self.result_cache:
+                try:
+                    content = content_fingerprint(video['path'])
+                except (OSError, ValueError):
+                    pass
+            variants = expand_variants(video)
+            targets = [self._plan_target(settings, variants, fingerprint, content, journal, resume)
+                       for settings in variants]
+            pending = [target for target in targets if not target['complete']] or targets
+
+            # Outputs found in the result cache are reused rather than encoded
+            encode = [target for target in pending if not target['source']]
+            if len(encode) == 1:
+                target = encode[0]
+                cmd = build_ffmpeg_command(video['path'], target['partial'], target['video'],
+                                           self.hw_accel, threads, ffmpeg=self.ffmpeg)
+            elif encode:
+                cmd = build_variants_command(video['path'],
+                                             [(target['video'], target['partial'])
+                                              for target in encode],
+                                             self.hw_accel, threads, ffmpeg=self.ffmpeg)
+            else:
+                cmd = None
+            job = Job(self._next_id, encoder_backend(video, self.hw_accel), {
+                'video': video, 'fingerprint': fingerprint, 'targets': pending, 'cmd': cmd,
+            })
+            if self.cost_model:
+                work = job_work(encode) if encode else 0.0
+                predicted = self.cost_model.predict(job.backend, video['quality'], work)
+                job.payload['work'] = work
+                if predicted is not None:
+                    job.payload['predicted'] = predicted
+            if all(target['complete'] for target in targets):
+                job.status = 'skipped'
+            elif self.metrics:
+                self.metrics.add_span(job, 'plan', time.perf_counter() - planning)
+            self._next_id += 1
+            jobs.append(job)
+        return jobs
+
+    def _plan_target(self, settings, variants, fingerprint, content, journal, resume):
+        """Output name, journal key, cache hit and resume state of one output of a video"""
+        # Tuned thread counts vary from run to run and are left out of the key
+        params = encode_params(settings, self.hw_accel, 'auto' if self.tuner else self.threads)
+        previous = journal.find(fingerprint, params) if journal and fingerprint else None
+        expected = expected_output_duration(settings)
+        cache_key = result_key(content, params) if content else None
+        cached = self.result_cache.get(cache_key) if cache_key else None
+
+        output_path = settings.get('output') if len(variants) == 1 else None
+        if not output_path and resume and previous:
+            output_path = previous['output']
+        suffix = variant_suffix(settings, variants)
+        if (not output_path and cached and cached['output'] not in self._reserved
+                and is_output_for(cached['output'], settings['path'], settings['speed'],
+                                  self.output_folder, suffix)):
+            # Re-running a batch reuses the earlier output in place, not a _1 copy
+            output_path = cached['output']
+        if not output_path:
+            output_path = generate_output_filename(
+                settings['path'], settings['speed'], self.output_folder, self._reserved, suffix
+            )
+        self._reserved.add(str(output_path))
+
+        # Shared-decode variants always encode, so only single outputs may copy
+        container = Path(output_path).suffix if len(variants) == 1 else None
+        plan = plan_streams(settings, self.hw_accel, container=container)
+        complete = bool(resume and previous and previous['state'] == 'done'
+                        and Path(previous['output']) == Path(output_path)
+                        and output_is_complete(output_path,
+                                               previous['expected_duration'] or expected,
+                                               self.ffprobe))
+        return {'video': settings, 'output': str(output_path),
+                'partial': str(partial_path(output_path)), 'params': params,
+                'expected_duration': expected, 'complete': complete, 'cache_key': cache_key,
+                'source': cached['output'] if cached else None, 'cached': cached, 'plan': plan}
+
+    def run(self, jobs):
+        """Run planned jobs and return the scheduler summary"""
+        self.start_queue()
+        self.submit(jobs)
+        return self.finish_queue()
+
+    def start_queue(self):
+        """Start the worker pool so jobs can be submitted while it runs"""
+        self.started = time.monotonic()
+        self.open_journal()
+        self.scheduler = JobScheduler(self._run_job,
+                                      max_workers=self.tuner.max_jobs if self.tuner else self.max_workers,
+                                      on_job_start=self.on_job_start,
+                                      on_job_done=self._job_done,
+                                      order_key=order_key(self.order))
+        if self.tuner:
+            self.scheduler.set_active_limit(self.tuner.jobs)
+        if self.governor and self.governor.active:
+            self.governor.decide(f"resource policy: {self.governor.describe()}")
+        if self.metrics:
+            self.metrics.batch_started()
+        if self.stopped:
+            self.scheduler.stop()
+        if self._paused:
+            self.scheduler.pause()
+        if self.stager:
+            self.stager.start()
+        self.scheduler.start()
+
+    def submit(self, jobs):
+        """Queue planned jobs on the running pool, journalling each one"""
+        queue = []
+        for job in jobs:
+            with self._lock:
+                self._total += 1
+                if job.status == 'skipped':
+                    self._skipped += 1
+                    self._fractions[job.job_id] = 1.0
+                    continue
+            if self.journal:
+                payload = job.payload
+                for target in payload['targets']:
+                    target['journal_id'] = self.journal.add(
+                        payload['video']['path'], payload['fingerprint'], target['params'],
+                        target['output'], payload['cmd'], target['expected_duration'])
+            queue.append(job)
+        # Queue them together so workers see the whole batch when picking threads
+        self.scheduler.submit_many(queue)
+        self._prefetch()
+
+    def enqueue(self, videos):
+        """Plan videos and queue them on the running pool"""
+        jobs = self.plan(videos)
+        self.submit(jobs)
+        return jobs
+
+    def finish_queue(self):
+        """Wait for all submitted jobs and return the summary"""
+        self.scheduler.close()
+        self.scheduler.wait()
+        if self.stager:
+            # Jobs with outputs still uploading are not finished yet
+            self.stager.drain()
+        summary = self.scheduler.summary()
+
+        # Record jobs that never started
+        if self.journal:
+            for job in self.scheduler.jobs:
+                if job.status in ('queued', 'cancelled'):
+                    self._mark_targets(job, 'cancelled')
+
+        summary['total'] += self._skipped
+        summary['skipped'] = self._skipped
+        summary['reused'] = self._reused
+        summary['copied'] = sum(1 for job in self.scheduler.jobs if job.status == 'done'
+                                and copied_streams(job))
+        if self.tuner:
+            summary['tuning'] = self.tuner.report()
+        if self.governor and self.governor.decisions:
+            summary['governor'] = list(self.governor.decisions)
+        if self.cost_model:
+            summary['cost_model'] = self.cost_model.report()
+            self.cost_model.save()
+        if self.stager:
+            summary['staging'] = self.stager.report()
+            self.stager.close()
+        if self.metrics:
+            self.metrics.batch_finished()
+        return summary
+
+    def stop(self, grace=STOP_GRACE):
+        """Cancel queued jobs and stop running ones, killing them after ``grace`` seconds"""
+        self.stopped = True
+        if self.scheduler:
+            self.scheduler.stop(cancel_running=True, grace=grace)
+
+    def cancel(self, job, grace=STOP_GRACE):
+        """Cancel a single queued or running job; False if it already finished"""
+        if self.scheduler is None:
+            return False
+        return self.scheduler.cancel(job, grace)
+
+    def pause(self):
+        """Hold back queued jobs; running jobs carry on"""
+        self._paused = True
+        if self.scheduler:
+            self.scheduler.pause()
+
+    def resume(self):
+        self._paused = False
+        if self.scheduler:
+            self.scheduler.resume()
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def overall_fraction(self):
+        """Fraction of the whole batch completed so far"""
+        with self._lock:
+            if not self._total:
+                return 0.0
+            return sum(self._fractions.values()) / self._total
+
+    def batch_eta(self):
+        """Estimate the remaining time of the batch
+
+        With a cost model, queued jobs' predicted times, scaled by how far
+        off the predictions for this batch's finished jobs were, are laid
+        out in queue order on the job slots after what is left of the
+        running jobs. Otherwise the overall rate so far is extrapolated.
+        """
+        if self.cost_model and self.scheduler:
+            eta = self._modelled_eta()
+            if eta is not None:
+                return eta
+        overall = self.overall_fraction()
+        if overall <= 0 or self.started is None:
+            return None
+        elapsed = time.monotonic() - self.started
+        return elapsed / overall * (1 - overall)
+
+    def _modelled_eta(self):
+        running = self.scheduler.running_jobs
+        queued = self.scheduler.pending_jobs
+        known = [job.payload['predicted'] for job in running + queued
+                 if 'predicted' in job.payload]
+        if not known:
+            return None
+        # Jobs that could not be predicted are taken to be typical ones
+        typical = statistics.mean(known)
+        scale = self.cost_model.correction()
+        now = time.monotonic()
+        remaining = []
+        for job in running:
+            with self._lock:
+                fraction = self._fractions.get(job.job_id) or 0.0
+            if fraction >= 0.05 and job.started is not None:
+                # Far enough in, the job's own rate beats the prediction
+                elapsed = now - job.started
+                remaining.append(elapsed / fraction * (1 - fraction))
+            else:
+                remaining.append(job.payload.get('predicted', typical) * scale * (1 - fraction))
+        queued = [job.payload.get('predicted', typical) * scale for job in queued]
+        slots = min(self.scheduler.active_limit,
+                    self.scheduler.throttle_limit or self.scheduler.active_limit)
+        return makespan(remaining, queued, slots)
+
+    def _prefetch(self):
+        """Tell the stager which inputs the queue will encode next"""
+        if self.stager and self.scheduler:
+            self.stager.prefetch([job.payload['video']['path']
+                                  for job in self.scheduler.pending_jobs if job.payload['cmd']])
+
+    def _span(self, job, name):
+        return self.metrics.span(job, name) if self.metrics else contextlib.nullcontext()
+
+    def batch_span(self, name):
+        """Time a batch-wide stage in the metrics, if they are recorded"""
+        return self.metrics.batch_span(name) if self.metrics else contextlib.nullcontext()
+
+    def _mark_targets(self, job, state, error=None):
+        if not self.journal:
+            return
+        for target in job.payload['targets']:
+            if target.get('journal_id'):
+                self.journal.mark(target['journal_id'], state, error)
+
+    def _run_job(self, job):
+        targets = job.payload['targets']
+        if self.metrics and job.queued is not None:
+            self.metrics.add_span(job, 'queue', job.started - job.queued)
+        if job.payload['cmd'] and not job.payload['video'].get('threads'):
+            # Share the cores (or the governor's thread budget) between running jobs
+            threads = None
+            if self.tuner:
+                threads = self.tuner.threads_for(self.scheduler.running_count,
+                                                 self.scheduler.pending_count)
+            elif self.governor:
+                running = self.scheduler.running_count
+                # Sized for the active limit, not a throttle that may lift while it runs
+                threads = self.governor.threads_for(running, self.scheduler.pending_count,
+                                                    self.scheduler.active_limit)
+                if threads:
+                    threads = self.governor.claim(job.job_id, threads, job.cancel_token)
+                    self.governor.decide(f"job {job.job_id}: {threads} of "
+                                         f"{self.governor.thread_budget} thread(s) with "
+                                         f"{running} job(s) running")
+            if threads:
+                job.payload['threads'] = threads
+                job.payload['cmd'] = with_threads(job.payload['cmd'], threads)
+        encode = [target for target in targets if not target['source']]
+        self._mark_targets(job, 'running')
+        try:
+            for target in targets:
+                if target['source']:
+                    with self._span(job, 'reuse'):
+                        self._reuse(target)
+            result = {}
+            if encode:
+                started = time.monotonic()
+                if self.stager:
+                    self._stage(job, encode)
+                result = self._encode(job, encode)
+                if encode[0].get('staged'):
+                    self._upload(job, encode, time.monotonic() - started)
+                else:
+                    # Only a complete encode ever appears under the final name
+                    with self._span(job, 'commit'):
+                        for target in encode:
+                            os.replace(target['partial'], target['output'])
+                        self._remember(encode, time.monotonic() - started)
+            result['outputs'] = [target['output'] for target in targets]
+            result['output'] = result['outputs'][0]
+        except BaseException as e:
+            if self.metrics and isinstance(e, FFmpegError):
+                self.metrics.update(job, exit_code=e.returncode)
+            for target in targets:
+                for path in (target['partial'], target.get('staged')):
+                    try:
+                        os.remove(path)
+                    except (OSError, TypeError):
+                        pass
+            if isinstance(e, Cancelled):
+                self._mark_targets(job, 'cancelled')
+            else:
+                self._mark_targets(job, 'failed', str(e))
+            raise
+        finally:
+            if self.governor:
+                self.governor.release(job.job_id)
+        if 'unsettled' not in job.payload:
+            self._mark_targets(job, 'done')
+        return result
+
+    def _stage(self, job, targets):
+        """Point a job's command at its staged input and at scratch outputs"""
+        path = job.payload['video']['path']
+        with self._span(job, 'stage'):
+            job.payload['input'] = self.stager.acquire(path, job.cancel_token)
+        # This job has left the queue; the next one can be staged
+        self._prefetch()
+        replace = {str(path): job.payload['input']}
+        if self.stager.stages(self.output_folder):
+            for target in targets:
+                target['staged'] = self.stager.output_path(target['output'])
+                replace[target['partial']] = target['staged']
+        job.payload['cmd'] = [replace.get(arg, arg) for arg in job.payload['cmd']]
+
+    def _upload(self, job, targets, seconds):
+        """Upload a job's scratch outputs; the job finishes with the upload"""
+        started = time.perf_counter()
+        # Counted down by the upload and by _job_done; the last one finishes the job
+        job.payload['unsettled'] = 2
+
+        def uploaded(error):
+            if self.metrics:
+                self.metrics.add_span(job, 'upload', time.perf_counter() - started)
+            if error:
+                job.payload['upload_error'] = f"upload failed: {error}"
+                self._mark_targets(job, 'failed', job.payload['upload_error'])
+            else:
+                self._remember(targets, seconds)
+                self._mark_targets(job, 'done')
+            if self._settle(job):
+                self._job_finished(job)
+
+        self.stager.upload([(target['staged'], target['partial'], target['output'])
+                            for target in targets], uploaded)
+
+    def _settle(self, job):
+        with self._lock:
+            job.payload['unsettled'] -= 1
+            return job.payload['unsettled'] == 0
+
+    def _reuse(self, target):
+        """Put a cached output in place of an encode"""
+        if not os.path.exists(target['output']) or not os.path.samefile(target['source'],
+                                                                        target['output']):
+            reuse_output(target['source'], target['partial'])
+            os.replace(target['partial'], target['output'])
+        cached = target['cached']
+        self.result_cache.record(hits=1, bytes_reused=cached['size'],
+                                 seconds_saved=cached['encode_seconds'])
+        with self._lock:
+            self._reused += 1
+
+    def _remember(self, targets, seconds):
+        """Record freshly encoded outputs in the result cache"""
+        if not self.result_cache:
+            return
+        for target in targets:
+            if target['cache_key']:
+                # A shared decode's time is split evenly between its outputs
+                self.result_cache.put(target['cache_key'], target['output'],
+                                      seconds / len(targets))
+        self.result_cache.record(encodes=len(targets))
+
+    def _encode(self, job, targets):
+        video = job.payload['video']
+
+        def report(update):
+            if update['fraction'] is not None:
+                with self._lock:
+                    self._fractions[job.job_id] = update['fraction']
+            if self.tuner:
+                self.tuner.observe(job, update)
+                self.tuner.adjust(self.scheduler)
+            if self.governor:
+                self.governor.check_load(self.scheduler)
+            if self.on_progress:
+                self.on_progress(job, update)
+
+        # Time blocked on I/O is measured locally, with and without a staged input
+        monitor = IOWaitMonitor() if self.metrics and self.runner is run_ffmpeg else None
+
+        def on_spawn(process):
+            if self.governor:
+                self.governor.apply(process, f"job {job.job_id} ({Path(video['path']).name})")
+            if monitor:
+                monitor.watch(process)
+
+        try:
+            return self._run_encode(job, targets, report, on_spawn)
+        finally:
+            if monitor:
+                monitor.stop()
+                self.metrics.update(job, io_wait=monitor.seconds,
+                                    staged=job.payload.get('input', video['path']) != video['path'])
+
+    def _run_encode(self, job, targets, report, on_spawn):
+        video = job.payload['video']
+        probe = video.get('probe')
+        duration = probe.get('duration') if probe else None
+        # Priority and memory cap are set in the child before ffmpeg runs
+        preexec = self.governor.preexec() if self.governor else None
+
+        # Long inputs can be split into keyframe-aligned chunks encoded in parallel
+        from speedup.chunked import chunk_count, encode_chunked
+        chunks = chunk_count(video.get('chunks', self.chunks), duration)
+        # Chunks are cut and joined locally, so only with the local runner
+        # Copied video is bound by I/O, not the encoder, and is never chunked
+        if (chunks > 1 and len(targets) == 1 and not video.get('speed_map')
+                and targets[0]['plan']['video']['action'] != 'copy'
+                and self.runner is run_ffmpeg):
+            with self._span(job, 'encode'):
+                return encode_chunked(job.payload.get('input', video['path']),
+                                      targets[0].get('staged', targets[0]['partial']),
+                                      targets[0]['video'],
+                                      chunks, self.hw_accel,
+                                      job.payload.get('threads', self.threads),
+                                      ffmpeg=self.ffmpeg, ffprobe=self.ffprobe,
+                                      on_progress=report, on_spawn=on_spawn,
+                                      cancel=job.cancel_token, preexec=preexec)
+
+        # Progress follows the longest output, i.e. the slowest variant
+        speed = min(float(target['video']['speed']) for target in targets)
+        expected = [target['expected_duration'] for target in targets]
+        if not all(expected):
+            expected = [duration / speed] if duration else [None]
+        with self._span(job, 'encode'):
+            reader = self.runner(job.payload['cmd'], report, expected_duration=max(expected),
+                                 speed=speed, on_spawn=on_spawn, cancel=job.cancel_token,
+                                 preexec=preexec)
+        frames = reader.snapshot()['frame']
+        if self.metrics:
+            # Time between the final progress report and the process exiting
+            if reader.ended is not None:
+                self.metrics.add_span(job, 'finalize', time.monotonic() - reader.ended)
+            self.metrics.update(job, frames=frames, rusage=reader.rusage)
+        return {'frames': frames}
+
+    def _job_done(self, job):
+        if self.stager:
+            self._prefetch()
+            self.stager.release(job.payload['video']['path'])
+        if 'unsettled' in job.payload and not self._settle(job):
+            return
+        self._job_finished(job)
+
+    def _job_finished(self, job):
+        if job.payload.get('upload_error') and job.status == 'done':
+            job.status = 'failed'
+            job.error = job.payload['upload_error']
+        with self._lock:
+            self._finished += 1
+            self._fractions[job.job_id] = 1.0
+        if self.cost_model and job.status == 'done' and job.payload.get('work'):
+            video = job.payload['video']
+            self.cost_model.observe(job.backend, video['quality'], job.payload['work'],
+                                    job.payload.get('predicted'), job.elapsed)
+        if self.metrics:
+            self.metrics.job_finished(job)
+        if self.on_job_done:
+            self.on_job_done(job)
@@ -0,0 +1,405 @@
+import collections
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+import types
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from speedup.progress import Cancelled, FFmpegError, run_ffmpeg
+
+DEFAULT_PORT = 8765
+# A lease not renewed by a heartbeat within this many seconds is handed to another worker
+LEASE_TIMEOUT = 15.0
+HEARTBEAT_INTERVAL = 2.0
+# Attempts per job before it fails for good, e.g. when it keeps killing workers
+MAX_ATTEMPTS = 3
+
+
+def map_path(value, path_map):
+    """Rewrite a coordinator path prefix to the worker's mount of the same share"""
+    for source, destination in path_map:
+        if value == source or value.startswith(source.rstrip('/') + '/'):
+            return destination + value[len(source):]
+    return value
+
+
+class RemoteResult:
+    """What run_ffmpeg's reader offers the engine, filled in from a worker's report"""
+
+    def __init__(self, update, report):
+        self._update = update or {}
+        rusage = report.get('rusage')
+        self.rusage = types.SimpleNamespace(**rusage) if rusage else None
+        finalize = report.get('finalize')
+        self.ended = time.monotonic() - finalize if finalize is not None else None
+        self.worker = report.get('worker')
+
+    def snapshot(self):
+        return dict(self._update)
+
+
+class FarmTask:
+    """One ffmpeg command waiting for, or leased to, a remote worker"""
+
+    def __init__(self, task_id, cmd, on_progress, expected_duration, speed):
+        self.task_id = task_id
+        self.cmd = cmd
+        self.on_progress = on_progress
+        self.expected_duration = expected_duration
+        self.speed = speed
+        self.attempts = 0
+        self.worker = None
+        self.deadline = None
+        self.last_update = None
+        self.report = None
+        self.done = threading.Event()
+
+
+class FarmCoordinator:
+    """Hand ffmpeg commands to remote workers over HTTP and wait for the results
+
+    ``run`` has run_ffmpeg's signature, so a BatchEngine created with
+    ``runner=coordinator.run`` plans, journals and caches exactly as for
+    local encodes while its worker threads wait on remote ones. Workers
+    lease commands, renew the lease with heartbeats that carry progress,
+    and report the result. A lease that expires is given to the next
+    worker, up to ``max_attempts`` times.
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, token=None,
+                 lease_timeout=LEASE_TIMEOUT, max_attempts=MAX_ATTEMPTS, on_event=None):
+        self.token = token
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.on_event = on_event
+        self.closed = False
+        self.workers = {}
+        self._pending = collections.deque()
+        self._leased = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        if host in ('0.0.0.0', ''):
+            host = socket.gethostname()
+        return f"http://{host}:{port}"
+
+    def event(self, message):
+        if self.on_event:
+            self.on_event(message)
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True,
+                         name="farm-server").start()
+        threading.Thread(target=self._reap, daemon=True, name="farm-reaper").start()
+
+    def close(self, linger=HEARTBEAT_INTERVAL * 2):
+        """Tell polling workers the batch is over, then stop serving"""
+        self.closed = True
+        self._stop.wait(linger)
+        self._stop.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def run(self, cmd, on_progress=None, expected_duration=None, speed=1.0, on_spawn=None,
+            cancel=None, **_):
+        """Run a command on the next free worker and return its result
+
+        Raises FFmpegError like run_ffmpeg when the command fails remotely
+        or no worker manages to finish it, and Cancelled when ``cancel``
+        is cancelled first; the worker then loses its lease and stops.
+        """
+        task = FarmTask(next(self._ids), cmd, on_progress, expected_duration, speed)
+        with self._lock:
+            self._pending.append(task)
+        while not task.done.wait(0.25):
+            if cancel and cancel.cancelled:
+                self.withdraw(task)
+                raise Cancelled("cancelled")
+        report = task.report
+        if report.get('status') != 'done':
+            raise FFmpegError(report.get('exit_code') or 1,
+                              report.get('stderr_tail') or [report.get('error') or "remote failure"])
+        return RemoteResult(task.last_update, report)
+
+    def withdraw(self, task):
+        """Take a task back; its worker learns at the next heartbeat"""
+        with self._lock:
+            if task in self._pending:
+                self._pending.remove(task)
+            self._leased.pop(task.task_id, None)
+            worker = task.worker
+        self.event(f"task {task.task_id} cancelled" + (f" on {worker}" if worker else ""))
+
+    def lease(self, worker):
+        """The next task for a worker, or None"""
+        with self._lock:
+            self.workers[worker] = time.time()
+            if not self._pending:
+                return None
+            task = self._pending.popleft()
+            task.attempts += 1
+            task.worker = worker
+            task.deadline = time.monotonic() + self.lease_timeout
+            self._leased[task.task_id] = task
+        self.event(f"task {task.task_id} leased to {worker} (attempt {task.attempts})")
+        return task
+
+    def heartbeat(self, worker, task_id, update=None):
+        """Renew a lease; False tells the worker it no longer holds the task"""
+        with self._lock:
+            self.workers[worker] = time.time()
+            task = self._leased.get(task_id)
+            if task is None or task.worker != worker:
+                return False
+            task.deadline = time.monotonic() + self.lease_timeout
+            if update:
+                task.last_update = update
+        if update and task.on_progress:
+            task.on_progress(update)
+        return True
+
+    def complete(self, worker, task_id, report):
+        """Accept a worker's result; reports from a superseded lease are ignored"""
+        with self._lock:
+            task = self._leased.get(task_id)
+            if task is None or task.worker != worker:
+                return False
+            del self._leased[task_id]
+            if report.get('update'):
+                task.last_update = report['update']
+        task.report = dict(report, worker=worker)
+        task.done.set()
+        self.event(f"task {task_id} {report.get('status')} on {worker}")
+        return True
+
+    def _reap(self):
+        """Requeue tasks whose worker stopped sending heartbeats"""
+        while not self._stop.wait(1.0):
+            now = time.monotonic()
+            failed = []
+            messages = []
+            with self._lock:
+                for task_id, task in list(self._leased.items()):
+                    if task.deadline > now:
+                        continue
+                    del self._leased[task_id]
+                    lost = task.worker
+                    task.worker = None
+                    if task.attempts >= self.max_attempts:
+                        failed.append(task)
+                    else:
+                        # Back to the front: it has waited longest
+                        self._pending.appendleft(task)
+                    messages.append(f"worker {lost} lost task {task_id}; "
+                                    + ("giving up" if task in failed else "requeued"))
+            for message in messages:
+                self.event(message)
+            for task in failed:
+                task.report = {'status': 'failed',
+                               'error': f"no worker finished it in {task.attempts} attempts"}
+                task.done.set()
+
+    def status(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'leased': {task_id: task.worker for task_id, task in self._leased.items()},
+                'workers': dict(self.workers),
+                'closed': self.closed,
+            }
+
+    def _handler(self):
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, code, body=None):
+                data = json.dumps(body or {}).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _authorised(self):
+                if coordinator.token and self.headers.get('X-Farm-Token') != coordinator.token:
+                    self._reply(403, {'error': "bad token"})
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self._authorised():
+                    return
+                if self.path == '/status':
+                    self._reply(200, coordinator.status())
+                else:
+                    self._reply(404, {'error': "unknown endpoint"})
+
+            def do_POST(self):
+                if not self._authorised():
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                    worker = str(body['worker'])
+                except (ValueError, KeyError):
+                    self._reply(400, {'error': "bad request"})
+                    return
+                if self.path == '/lease':
+                    task = coordinator.lease(worker)
+                    if task is None:
+                        self._reply(200, {'task': None, 'closed': coordinator.closed})
+                    else:
+                        self._reply(200, {'task': {
+                            'id': task.task_id, 'cmd': task.cmd,
+                            'expected_duration': task.expected_duration, 'speed': task.speed,
+                        }, 'heartbeat': HEARTBEAT_INTERVAL})
+                elif self.path == '/heartbeat':
+                    ok = coordinator.heartbeat(worker, body.get('task'), body.get('update'))
+                    self._reply(200, {'ok': ok})
+                elif self.path == '/complete':
+                    ok = coordinator.complete(worker, body.get('task'), body)
+                    self._reply(200, {'ok': ok})
+                else:
+                    self._reply(404, {'error': "unknown endpoint"})
+
+        return Handler
+
+
+class FarmWorker:
+    """Pull commands from a coordinator and run them with the local ffmpeg
+
+    Only ffmpeg is ever run: the first element of a leased command is
+    replaced by this worker's binary. ``path_map`` rewrites coordinator
+    path prefixes to where the shared storage is mounted here. The worker
+    exits once the coordinator reports the batch closed, unless
+    ``persist`` is set.
+    """
+
+    def __init__(self, server, name=None, slots=1, ffmpeg='ffmpeg', path_map=(), token=None,
+                 poll_interval=2.0, persist=False, on_event=None):
+        self.server = server.rstrip('/')
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.slots = slots
+        self.ffmpeg = ffmpeg
+        self.path_map = list(path_map)
+        self.token = token
+        self.poll_interval = poll_interval
+        self.persist = persist
+        self.on_event = on_event
+        self.completed = 0
+        self._stop = threading.Event()
+
+    def event(self, message):
+        if self.on_event:
+            self.on_event(message)
+
+    def _post(self, endpoint, body, timeout=10):
+        request = urllib.request.Request(
+            f"{self.server}/{endpoint}", data=json.dumps(dict(body, worker=self.name)).encode(),
+            headers={'Content-Type': 'application/json', 'X-Farm-Token': self.token or ''})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read() or b'{}')
+
+    def run(self):
+        """Work until the coordinator closes, with one thread per slot"""
+        threads = [threading.Thread(target=self._slot_loop, daemon=True, name=f"farm-slot-{i}")
+                   for i in range(self.slots)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.completed
+
+    def stop(self):
+        self._stop.set()
+
+    def _slot_loop(self):
+        unreachable_since = None
+        while not self._stop.is_set():
+            try:
+                reply = self._post('lease', {})
+                unreachable_since = None
+            except (OSError, ValueError) as e:
+                # The coordinator may not be up yet, or has gone away
+                now = time.monotonic()
+                unreachable_since = unreachable_since or now
+                if not self.persist and now - unreachable_since > self.poll_interval * 15:
+                    self.event(f"coordinator unreachable ({e}); exiting")
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            task = reply.get('task')
+            if task is None:
+                if reply.get('closed') and not self.persist:
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            self._run_task(task, reply.get('heartbeat', HEARTBEAT_INTERVAL))
+
+    def _run_task(self, task, interval):
+        cmd = [self.ffmpeg] + [map_path(arg, self.path_map) for arg in task['cmd'][1:]]
+        state = {'update': None, 'process': None, 'lost': False}
+        finished = threading.Event()
+
+        def beat():
+            while not finished.wait(interval):
+                try:
+                    reply = self._post('heartbeat', {'task': task['id'], 'update': state['update']})
+                except (OSError, ValueError):
+                    continue
+                if not reply.get('ok'):
+                    # The lease went to another worker; stop writing the same output
+                    state['lost'] = True
+                    if state['process'] and state['process'].poll() is None:
+                        state['process'].kill()
+                    return
+
+        def spawned(process):
+            state['process'] = process
+
+        heartbeat = threading.Thread(target=beat, daemon=True)
+        heartbeat.start()
+        self.event(f"task {task['id']}: running")
+        report = {'task': task['id']}
+        try:
+            reader = run_ffmpeg(cmd, lambda update: state.update(update=update),
+                                expected_duration=task.get('expected_duration'),
+                                speed=task.get('speed') or 1.0, on_spawn=spawned)
+            report.update(status='done', exit_code=0, update=reader.snapshot())
+            if reader.ended is not None:
+                report['finalize'] = time.monotonic() - reader.ended
+            if reader.rusage is not None:
+                usage = reader.rusage
+                report['rusage'] = {'ru_utime': usage.ru_utime, 'ru_stime': usage.ru_stime,
+                                    'ru_maxrss': usage.ru_maxrss}
+        except FFmpegError as e:
+            report.update(status='failed', exit_code=e.returncode, error=str(e),
+                          stderr_tail=e.stderr_tail)
+        except OSError as e:
+            report.update(status='failed', error=str(e))
+        finally:
+            finished.set()
+        if state['lost']:
+            self.event(f"task {task['id']}: lease lost")
+            return
+        for attempt in range(5):
+            try:
+                self._post('complete', report)
+                break
+            except (OSError, ValueError):
+                self._stop.wait(self.poll_interval)
+        self.completed += 1
+        self.event(f"task {task['id']}: {report['status']}")
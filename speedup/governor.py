@@ -0,0 +1,229 @@
+import ctypes
+import ctypes.util
+import os
+import platform
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from speedup.tuning import load_average
+
+# ioprio_set(2) syscall numbers per architecture
+IOPRIO_SYSCALLS = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'armv7l': 314}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASSES = {'realtime': 1, 'best-effort': 2, 'idle': 3}
+
+# Named policies; 'background' keeps encodes out of the way of other work
+PROFILES = {
+    'normal': {},
+    'background': {'nice': 15, 'ionice': 'idle', 'load_threshold': 0.8, 'thread_share': 0.5},
+}
+
+
+def io_priority_setter(io_class, level=4):
+    """Function that sets the calling process's I/O class with ioprio_set; None if unsupported
+
+    libc is loaded here, so the returned function only makes the syscall
+    and is safe to call between fork and exec.
+    """
+    number = IOPRIO_SYSCALLS.get(platform.machine())
+    if number is None or not sys.platform.startswith('linux'):
+        return None
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    value = IOPRIO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT | (0 if io_class == 'idle' else level)
+    return lambda: libc.syscall(number, IOPRIO_WHO_PROCESS, 0, value) == 0
+
+
+class ResourceGovernor:
+    """Apply a resource policy to every ffmpeg process the engine starts
+
+    ``thread_budget`` is the total number of encoder threads shared by all
+    concurrent jobs. ``nice`` and ``ionice`` lower CPU and I/O priority,
+    ``memory_limit_mb`` caps each process's address space (RLIMIT_AS) and
+    ``load_threshold`` (a fraction of the cores) holds back new jobs while
+    the system load is above it. Each decision is passed to ``on_decision``
+    and kept in ``decisions``.
+    """
+
+    def __init__(self, thread_budget=None, nice=None, ionice=None, memory_limit_mb=None,
+                 load_threshold=None, on_decision=None, interval=10.0):
+        self.cores = os.cpu_count() or 1
+        self.thread_budget = thread_budget
+        self.nice = nice
+        self.ionice = ionice
+        self.memory_limit_mb = memory_limit_mb
+        self.load_threshold = load_threshold
+        self.on_decision = on_decision
+        self.interval = interval
+        self.decisions = []
+        self.throttled = False
+        self._last_check = 0.0
+        self._claims = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition()
+
+    @classmethod
+    def from_profile(cls, name, **overrides):
+        """Build a governor from a named profile, with explicit settings taking precedence"""
+        settings = dict(PROFILES[name])
+        share = settings.pop('thread_share', None)
+        if share:
+            settings['thread_budget'] = max(1, int((os.cpu_count() or 1) * share))
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**settings)
+
+    @property
+    def active(self):
+        return any(value is not None for value in (self.thread_budget, self.nice, self.ionice,
+                                                   self.memory_limit_mb, self.load_threshold))
+
+    def decide(self, message):
+        """Record a decision and pass it on"""
+        with self._lock:
+            self.decisions.append({'time': time.time(), 'message': message})
+        if self.on_decision:
+            self.on_decision(message)
+
+    def threads_for(self, running, pending=0, limit=None):
+        """Share of the thread budget for a job starting with ``running`` jobs active (itself included)
+
+        The budget is divided between the jobs expected to run alongside it,
+        at most ``limit`` at once, so the shares of concurrent jobs never
+        add up to more than the budget.
+        """
+        if not self.thread_budget:
+            return None
+        expected = running + pending
+        if limit:
+            expected = min(limit, expected)
+        return max(1, self.thread_budget // max(1, expected))
+
+    def claim(self, key, threads, cancel=None):
+        """Reserve up to ``threads`` of the budget for ``key`` until release()
+
+        Jobs queued after others started (e.g. by a folder watch) only get
+        what is left, and wait while the whole budget is held, so running
+        jobs never hold more than the budget. Raises Cancelled if
+        ``cancel`` (a CancelToken) is cancelled while waiting.
+        """
+        with self._released:
+            while True:
+                free = self.thread_budget - sum(self._claims.values())
+                if free > 0:
+                    break
+                if cancel:
+                    cancel.check()
+                self._released.wait(0.25)
+            threads = min(threads, free)
+            self._claims[key] = threads
+        return threads
+
+    def release(self, key):
+        with self._released:
+            self._claims.pop(key, None)
+            self._released.notify_all()
+
+    def preexec(self):
+        """Function lowering the priority and capping the memory of a child before it execs
+
+        Passed to Popen as ``preexec_fn``, so ffmpeg never allocates memory
+        or starts I/O at full priority. None when there is nothing to apply
+        or processes cannot be changed before exec (Windows).
+        """
+        if os.name != 'posix':
+            return None
+        steps = []
+        if self.nice is not None and hasattr(os, 'setpriority'):
+            steps.append(lambda: os.setpriority(os.PRIO_PROCESS, 0, self.nice))
+        if self.ionice:
+            set_io = io_priority_setter(self.ionice)
+            if set_io:
+                steps.append(set_io)
+        if self.memory_limit_mb and resource is not None:
+            limit = self.memory_limit_mb * 1024 * 1024
+            steps.append(lambda: resource.setrlimit(resource.RLIMIT_AS, (limit, limit)))
+        if not steps:
+            return None
+
+        def apply_limits():
+            # A limit the child may not set is skipped rather than failing the spawn
+            for step in steps:
+                try:
+                    step()
+                except (OSError, ValueError):
+                    pass
+
+        return apply_limits
+
+    def apply(self, process, label):
+        """Record the priority and memory cap a freshly started process runs with
+
+        They are set before exec by preexec(); this reads back what took
+        effect where the platform allows it.
+        """
+        applied = []
+        pid = process.pid
+        if self.nice is not None:
+            try:
+                nice = os.getpriority(os.PRIO_PROCESS, pid)
+                applied.append(f"nice {nice}" if nice == self.nice
+                               else f"nice {self.nice} not applied (running at {nice})")
+            except (AttributeError, OSError) as e:
+                applied.append(f"nice unavailable ({e.__class__.__name__})")
+        if self.ionice:
+            supported = (os.name == 'posix' and sys.platform.startswith('linux')
+                         and platform.machine() in IOPRIO_SYSCALLS)
+            applied.append(f"ionice {self.ionice}" if supported else "ionice unavailable")
+        if self.memory_limit_mb:
+            limit = self.memory_limit_mb * 1024 * 1024
+            try:
+                soft, _ = resource.prlimit(pid, resource.RLIMIT_AS)
+                applied.append(f"memory cap {self.memory_limit_mb} MB" if soft == limit
+                               else "memory cap not applied")
+            except (AttributeError, OSError, ValueError):
+                applied.append("memory cap unavailable")
+        if applied:
+            self.decide(f"{label}: {', '.join(applied)}")
+
+    def check_load(self, scheduler):
+        """Hold new jobs to one at a time while the load is above the threshold"""
+        if not self.load_threshold:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_check < self.interval:
+                return
+            self._last_check = now
+        load = load_average()
+        if load is None:
+            return
+        limit = self.load_threshold * self.cores
+        if load > limit and not self.throttled:
+            self.throttled = True
+            scheduler.throttle(1)
+            self.decide(f"load {load:.1f} above {limit:.1f}: starting one job at a time")
+        elif load <= limit and self.throttled:
+            self.throttled = False
+            scheduler.throttle(None)
+            self.decide(f"load {load:.1f} back under {limit:.1f}: resuming normal concurrency")
+
+    def describe(self):
+        """One-line summary of the policy"""
+        parts = []
+        if self.thread_budget:
+            parts.append(f"{self.thread_budget} thread budget")
+        if self.nice is not None:
+            parts.append(f"nice {self.nice}")
+        if self.ionice:
+            parts.append(f"ionice {self.ionice}")
+        if self.memory_limit_mb:
+            parts.append(f"{self.memory_limit_mb} MB per job")
+        if self.load_threshold:
+            parts.append(f"throttle above load {self.load_threshold * self.cores:.1f}")
+        return ", ".join(parts) or "no limits"
@@ -0,0 +1,955 @@
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+import os
+import sys
+import threading
+from pathlib import Path
+import time
+from speedup.engine import (AUDIO_MODES, BatchEngine, FPS_CHOICES, FRAME_SELECTION_MODES, LAYOUTS,
+                            QUALITY_LEVELS, SUPPORTED_FORMATS, make_video)
+from speedup.scheduler import default_worker_count
+from speedup.progress import STOP_GRACE, CancelToken, Cancelled, FFmpegError, format_eta
+from speedup.preview import PREVIEW_SECONDS, PreviewCache, render_preview
+from speedup.probe import MediaProber, ProbeCache
+from speedup.registry import VideoRegistry, scan_videos
+from speedup.results import ResultCache
+from speedup.costmodel import ORDER_POLICIES, CostModel
+from speedup.governor import PROFILES, ResourceGovernor
+from speedup.staging import STAGE_MODES, ScratchStager
+from speedup.metrics import MetricsRecorder, metrics_path
+from speedup.tuning import AutoTuner, load_calibration
+from speedup.capabilities import cached_capabilities, detect_capabilities, find_ffmpeg
+
+try:
+    from tkinterdnd2 import DND_FILES, TkinterDnD
+except ImportError:
+    DND_FILES = TkinterDnD = None
+
+class VideoSpeedupTool:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Video Speed-Up Tool")
+        self.root.geometry("800x700")
+        self.root.configure(bg='#f0f0f0')
+        
+        # Variables
+        self.videos = VideoRegistry()
+        self.probe_queue = []
+        self.scan_stop = threading.Event()
+        self.output_folder = tk.StringVar()
+        self.processing = False
+        self.engine = None
+        self.process_thread = None
+        # File list item of each planned job, for cancelling from the list
+        self.jobs_by_item = {}
+        self.preview_token = None
+        self.closing = False
+        self.supported_formats = SUPPORTED_FORMATS
+        
+        # Check FFmpeg availability; encoder detection is cached on disk and
+        # runs in the background on a cache miss so the window opens at once
+        self.ffmpeg_path = find_ffmpeg()
+        self.ffmpeg_available = self.ffmpeg_path is not None
+        self.capabilities = cached_capabilities(self.ffmpeg_path)
+        self.hw_acceleration = self.get_hw_acceleration(self.capabilities)
+        
+        # Media metadata (ffprobe results cached on disk)
+        try:
+            probe_cache = ProbeCache()
+        except Exception:
+            probe_cache = None
+        self.prober = MediaProber(probe_cache)
+        self.probing = False
+        
+        # Outputs already encoded from identical inputs and settings
+        try:
+            self.result_cache = ResultCache()
+        except Exception:
+            self.result_cache = None
+        
+        # Rendered previews, reused while the same settings are previewed again
+        try:
+            self.preview_cache = PreviewCache()
+        except OSError:
+            self.preview_cache = None
+        
+        self.setup_ui()
+        self.setup_drag_drop()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        if self.capabilities is None:
+            self.hw_label.config(text="🔍 Detecting hardware acceleration...", foreground='gray')
+            threading.Thread(target=self.detect_hardware_acceleration, daemon=True).start()
+        
+    def get_hw_acceleration(self, capabilities):
+        """Derive the hardware acceleration options from detected capabilities"""
+        hw_options = capabilities['hw'] if capabilities else []
+        return {
+            'available': hw_options,
+            'selected': hw_options[0] if hw_options else 'cpu'
+        }
+        
+    def detect_hardware_acceleration(self):
+        """Detect encoder capabilities in a background thread"""
+        capabilities = detect_capabilities(self.ffmpeg_path)
+        self.root.after(0, self.apply_capabilities, capabilities)
+        
+    def apply_capabilities(self, capabilities):
+        """Fill in the hardware acceleration options once detection finishes"""
+        self.capabilities = capabilities
+        self.ffmpeg_available = capabilities['available']
+        self.hw_acceleration = self.get_hw_acceleration(capabilities)
+        self.hw_combo.config(values=['cpu'] + self.hw_acceleration['available'])
+        # Only change the selection if the user has not picked one meanwhile
+        if self.hw_accel_var.get() == 'cpu':
+            self.hw_accel_var.set(self.hw_acceleration['selected'])
+        self.update_hw_status()
+        
+    def update_hw_status(self):
+        """Show the detected hardware acceleration backends"""
+        if self.hw_acceleration['available']:
+            hw_status = f"🚀 Hardware Acceleration: {', '.join(self.hw_acceleration['available']).upper()}"
+            hw_color = 'green'
+        else:
+            hw_status = "⚡ CPU Processing Only"
+            hw_color = 'orange'
+        self.hw_label.config(text=hw_status, foreground=hw_color)
+    
+    def setup_ui(self):
+        """Setup the user interface"""
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # Title
+        title_label = ttk.Label(main_frame, text="Video Speed-Up Tool", 
+                               font=('Arial', 16, 'bold'))
+        title_label.grid(row=0, column=0, columnspan=3, pady=(0, 20))
+        
+        # FFmpeg and Hardware status
+        status_row = 1
+        if not self.ffmpeg_available:
+            warning_label = ttk.Label(main_frame, 
+                                    text="⚠️ FFmpeg not found! Please install FFmpeg to use this tool.",
+                                    foreground='red', font=('Arial', 10, 'bold'))
+            warning_label.grid(row=status_row, column=0, columnspan=3, pady=(0, 10))
+            status_row += 1
+        
+        # Hardware acceleration status
+        self.hw_label = ttk.Label(main_frame, font=('Arial', 10, 'bold'))
+        self.hw_label.grid(row=status_row, column=0, columnspan=3, pady=(0, 10))
+        self.update_hw_status()
+        status_row += 1
+        
+        # File selection section
+        file_frame = ttk.LabelFrame(main_frame, text="Video Files", padding="10")
+        file_frame.grid(row=status_row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
+        status_row += 1
+        
+        # Drag and drop area
+        self.drop_label = ttk.Label(file_frame, 
+                                   text="Drag & Drop video files or folders here\n(or use buttons below)",
+                                   background='white', relief='sunken', padding="20")
+        self.drop_label.grid(row=0, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        # File operation buttons
+        btn_frame = ttk.Frame(file_frame)
+        btn_frame.grid(row=1, column=0, columnspan=3, pady=(0, 10))
+        
+        ttk.Button(btn_frame, text="Add Video Files", 
+                  command=self.add_video_files).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(btn_frame, text="Add Folder", 
+                  command=self.add_folder).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Remove Selected", 
+                  command=self.remove_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Clear All", 
+                  command=self.clear_files).pack(side=tk.LEFT, padx=5)
+        
+        # File list
+        list_frame = ttk.Frame(file_frame)
+        list_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # Treeview for file list with individual settings
+        self.file_tree = ttk.Treeview(list_frame, columns=('duration', 'speed', 'fps', 'quality'), 
+                                     show='tree headings', height=8)
+        self.file_tree.heading('#0', text='Video File')
+        self.file_tree.heading('duration', text='Duration')
+        self.file_tree.heading('speed', text='Speed (x)')
+        self.file_tree.heading('fps', text='Frame Rate')
+        self.file_tree.heading('quality', text='Quality')
+        
+        self.file_tree.column('#0', width=260)
+        self.file_tree.column('duration', width=80)
+        self.file_tree.column('speed', width=80)
+        self.file_tree.column('fps', width=90)
+        self.file_tree.column('quality', width=90)
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.file_tree.yview)
+        self.file_tree.configure(yscrollcommand=scrollbar.set)
+        
+        self.file_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        
+        # Bind double-click to edit settings
+        self.file_tree.bind('<Double-1>', self.edit_video_settings)
+        self.file_tree.bind('<Delete>', lambda event: self.remove_selected())
+        
+        # Batch summary from probed metadata
+        self.file_summary_var = tk.StringVar(value="")
+        ttk.Label(file_frame, textvariable=self.file_summary_var).grid(row=3, column=0, columnspan=3,
+                                                                     sticky=tk.W, pady=(5, 0))
+        
+        # Global settings section
+        settings_frame = ttk.LabelFrame(main_frame, text="Global Settings", padding="10")
+        settings_frame.grid(row=status_row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
+        status_row += 1
+        
+        # Speed setting
+        ttk.Label(settings_frame, text="Default Speed Multiplier:").grid(row=0, column=0, sticky=tk.W)
+        self.speed_var = tk.StringVar(value="2.0")
+        speed_entry = ttk.Entry(settings_frame, textvariable=self.speed_var, width=10)
+        speed_entry.grid(row=0, column=1, padx=(5, 20), sticky=tk.W)
+        
+        # Frame rate setting
+        ttk.Label(settings_frame, text="Frame Rate:").grid(row=0, column=2, sticky=tk.W)
+        self.fps_var = tk.StringVar(value="30")
+        fps_combo = ttk.Combobox(settings_frame, textvariable=self.fps_var, 
+                                values=FPS_CHOICES, width=12)
+        fps_combo.grid(row=0, column=3, padx=(5, 20), sticky=tk.W)
+        
+        # Quality setting
+        ttk.Label(settings_frame, text="Quality:").grid(row=1, column=0, sticky=tk.W, pady=(10, 0))
+        self.quality_var = tk.StringVar(value="High")
+        quality_combo = ttk.Combobox(settings_frame, textvariable=self.quality_var,
+                                   values=QUALITY_LEVELS, width=12)
+        quality_combo.grid(row=1, column=1, padx=(5, 20), sticky=tk.W, pady=(10, 0))
+        
+        # Apply to all button
+        ttk.Button(settings_frame, text="Apply to All Videos", 
+                  command=self.apply_to_all).grid(row=1, column=2, columnspan=2, 
+                                                padx=(20, 0), pady=(10, 0))
+        
+        # Performance settings
+        ttk.Label(settings_frame, text="Hardware Acceleration:").grid(row=2, column=0, sticky=tk.W, pady=(10, 0))
+        self.hw_accel_var = tk.StringVar(value=self.hw_acceleration['selected'])
+        hw_options = ['cpu'] + self.hw_acceleration['available']
+        self.hw_combo = ttk.Combobox(settings_frame, textvariable=self.hw_accel_var, 
+                                    values=hw_options, width=12)
+        self.hw_combo.grid(row=2, column=1, padx=(5, 20), sticky=tk.W, pady=(10, 0))
+        
+        # CPU threads ("tune" also picks the number of concurrent jobs)
+        ttk.Label(settings_frame, text="CPU Threads:").grid(row=2, column=2, sticky=tk.W, pady=(10, 0))
+        self.threads_var = tk.StringVar(value="auto")
+        threads_combo = ttk.Combobox(settings_frame, textvariable=self.threads_var,
+                                   values=["auto", "tune", "1", "2", "4", "6", "8", "12", "16"], width=8)
+        threads_combo.grid(row=2, column=3, padx=(5, 0), sticky=tk.W, pady=(10, 0))
+        
+        # Concurrent ffmpeg jobs
+        ttk.Label(settings_frame, text="Concurrent Jobs:").grid(row=3, column=0, sticky=tk.W, pady=(10, 0))
+        self.jobs_var = tk.StringVar(value="auto")
+        jobs_combo = ttk.Combobox(settings_frame, textvariable=self.jobs_var,
+                                values=["auto", "1", "2", "3", "4", "6", "8", "12", "16"], width=12)
+        jobs_combo.grid(row=3, column=1, padx=(5, 20), sticky=tk.W, pady=(10, 0))
+        
+        # Split long inputs into chunks encoded in parallel
+        ttk.Label(settings_frame, text="Split Long Videos:").grid(row=3, column=2, sticky=tk.W, pady=(10, 0))
+        self.chunks_var = tk.StringVar(value="off")
+        chunks_combo = ttk.Combobox(settings_frame, textvariable=self.chunks_var,
+                                  values=["off", "auto", "2", "4", "8", "16"], width=8)
+        chunks_combo.grid(row=3, column=3, padx=(5, 0), sticky=tk.W, pady=(10, 0))
+        
+        # Frame selection for high speed multipliers
+        ttk.Label(settings_frame, text="High-Speed Frames:").grid(row=4, column=0, sticky=tk.W, pady=(10, 0))
+        self.frame_selection_var = tk.StringVar(value="exact")
+        frame_combo = ttk.Combobox(settings_frame, textvariable=self.frame_selection_var,
+                                 values=FRAME_SELECTION_MODES, width=12, state='readonly')
+        frame_combo.grid(row=4, column=1, padx=(5, 20), sticky=tk.W, pady=(10, 0))
+        
+        # Audio retiming; resampling is cheaper but shifts the pitch
+        ttk.Label(settings_frame, text="Audio:").grid(row=4, column=2, sticky=tk.W, pady=(10, 0))
+        self.audio_var = tk.StringVar(value="pitch")
+        audio_combo = ttk.Combobox(settings_frame, textvariable=self.audio_var,
+                                 values=AUDIO_MODES, width=8, state='readonly')
+        audio_combo.grid(row=4, column=3, padx=(5, 0), sticky=tk.W, pady=(10, 0))
+        
+        # Resource profile; "background" yields CPU and disk to other programs
+        ttk.Label(settings_frame, text="Priority:").grid(row=5, column=0, sticky=tk.W, pady=(10, 0))
+        self.priority_var = tk.StringVar(value="normal")
+        priority_combo = ttk.Combobox(settings_frame, textvariable=self.priority_var,
+                                    values=sorted(PROFILES), width=12, state='readonly')
+        priority_combo.grid(row=5, column=1, padx=(5, 20), sticky=tk.W, pady=(10, 0))
+        
+        # Variable speed: silent stretches play faster than speech
+        ttk.Label(settings_frame, text="Silent Parts:").grid(row=5, column=2, sticky=tk.W, pady=(10, 0))
+        self.silent_speed_var = tk.StringVar(value="off")
+        silent_combo = ttk.Combobox(settings_frame, textvariable=self.silent_speed_var,
+                                  values=["off", "4", "8", "16"], width=8, state='readonly')
+        silent_combo.grid(row=5, column=3, padx=(5, 0), sticky=tk.W, pady=(10, 0))
+        
+        # Queue order by predicted encode time; longest first finishes the batch soonest
+        ttk.Label(settings_frame, text="Job Order:").grid(row=6, column=0, sticky=tk.W, pady=(10, 0))
+        self.order_var = tk.StringVar(value="longest")
+        order_combo = ttk.Combobox(settings_frame, textvariable=self.order_var,
+                                 values=ORDER_POLICIES, width=12, state='readonly')
+        order_combo.grid(row=6, column=1, padx=(5, 20), sticky=tk.W, pady=(10, 0))
+        
+        # MP4 layout; fragmented files skip the faststart rewrite of the whole output
+        ttk.Label(settings_frame, text="Output Layout:").grid(row=6, column=2, sticky=tk.W, pady=(10, 0))
+        self.layout_var = tk.StringVar(value="faststart")
+        layout_combo = ttk.Combobox(settings_frame, textvariable=self.layout_var,
+                                  values=LAYOUTS, width=10, state='readonly')
+        layout_combo.grid(row=6, column=3, padx=(5, 0), sticky=tk.W, pady=(10, 0))
+        
+        # Copy network inputs to a local disk ahead of their encodes
+        ttk.Label(settings_frame, text="Local Staging:").grid(row=7, column=0, sticky=tk.W, pady=(10, 0))
+        self.stage_var = tk.StringVar(value="off")
+        stage_combo = ttk.Combobox(settings_frame, textvariable=self.stage_var,
+                                 values=STAGE_MODES, width=12, state='readonly')
+        stage_combo.grid(row=7, column=1, padx=(5, 20), sticky=tk.W, pady=(10, 0))
+        
+        # Streams needing no change (1x, same frame rate) can skip the encoder
+        ttk.Label(settings_frame, text="Unchanged Streams:").grid(row=7, column=2, sticky=tk.W, pady=(10, 0))
+        self.stream_copy_var = tk.StringVar(value="re-encode")
+        copy_combo = ttk.Combobox(settings_frame, textvariable=self.stream_copy_var,
+                                values=["re-encode", "copy"], width=10, state='readonly')
+        copy_combo.grid(row=7, column=3, padx=(5, 0), sticky=tk.W, pady=(10, 0))
+        
+        # Output folder section
+        output_frame = ttk.LabelFrame(main_frame, text="Output Settings", padding="10")
+        output_frame.grid(row=status_row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
+        status_row += 1
+        
+        ttk.Label(output_frame, text="Output Folder:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Entry(output_frame, textvariable=self.output_folder, width=50).grid(row=0, column=1, 
+                                                                               padx=(5, 5), sticky=(tk.W, tk.E))
+        ttk.Button(output_frame, text="Browse", 
+                  command=self.select_output_folder).grid(row=0, column=2)
+        
+        # Preview section
+        preview_frame = ttk.LabelFrame(main_frame, text="Preview", padding="10")
+        preview_frame.grid(row=status_row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
+        status_row += 1
+        
+        ttk.Button(preview_frame, text=f"Preview Selected Video ({PREVIEW_SECONDS} seconds)", 
+                  command=self.preview_video).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.cancel_preview_btn = ttk.Button(preview_frame, text="Cancel", 
+                                            command=self.cancel_preview, state='disabled')
+        self.cancel_preview_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Label(preview_frame, text="Start at (s):").pack(side=tk.LEFT)
+        self.preview_position_var = tk.StringVar(value="0")
+        ttk.Entry(preview_frame, textvariable=self.preview_position_var, width=8).pack(side=tk.LEFT, padx=(5, 10))
+        
+        self.preview_label = ttk.Label(preview_frame, text="Select a video to preview")
+        self.preview_label.pack(side=tk.LEFT)
+        
+        # Processing section
+        process_frame = ttk.LabelFrame(main_frame, text="Processing", padding="10")
+        process_frame.grid(row=status_row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        # Progress bar
+        self.progress_var = tk.StringVar(value="Ready to process videos")
+        ttk.Label(process_frame, textvariable=self.progress_var).grid(row=0, column=0, columnspan=2, sticky=tk.W)
+        
+        self.progress_bar = ttk.Progressbar(process_frame, mode='determinate')
+        self.progress_bar.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 10))
+        
+        # Process button
+        self.process_btn = ttk.Button(process_frame, text="Start Processing", 
+                                     command=self.start_processing)
+        self.process_btn.grid(row=2, column=0, pady=(0, 5))
+        
+        self.stop_btn = ttk.Button(process_frame, text="Stop Processing", 
+                                  command=self.stop_processing, state='disabled')
+        self.stop_btn.grid(row=2, column=1, padx=(10, 0), pady=(0, 5))
+        
+        # Resume skips outputs the journal records as complete
+        self.resume_btn = ttk.Button(process_frame, text="Resume Batch", 
+                                    command=lambda: self.start_processing(resume=True))
+        self.resume_btn.grid(row=2, column=2, padx=(10, 0), pady=(0, 5))
+        
+        # Queue control while a batch runs
+        self.pause_btn = ttk.Button(process_frame, text="Pause Queue", 
+                                   command=self.toggle_pause, state='disabled')
+        self.pause_btn.grid(row=3, column=0, pady=(0, 5))
+        
+        self.cancel_btn = ttk.Button(process_frame, text="Cancel Selected", 
+                                    command=self.cancel_selected, state='disabled')
+        self.cancel_btn.grid(row=3, column=1, padx=(10, 0), pady=(0, 5))
+        
+        # Latest resource governor decision
+        self.governor_var = tk.StringVar(value="")
+        ttk.Label(process_frame, textvariable=self.governor_var).grid(row=4, column=0, columnspan=3, sticky=tk.W)
+        
+        # Configure grid weights
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        file_frame.columnconfigure(1, weight=1)
+        list_frame.columnconfigure(0, weight=1)
+        list_frame.rowconfigure(0, weight=1)
+        output_frame.columnconfigure(1, weight=1)
+        process_frame.columnconfigure(0, weight=1)
+        
+    def setup_drag_drop(self):
+        """Setup drag and drop functionality"""
+        if not hasattr(self.drop_label, 'drop_target_register'):
+            return
+        self.drop_label.drop_target_register(DND_FILES)
+        self.drop_label.dnd_bind('<<Drop>>', self.handle_drop)
+        
+    def handle_drop(self, event):
+        """Handle dropped files/folders"""
+        files = self.root.tk.splitlist(event.data)
+        paths = []
+        for file_path in files:
+            if os.path.isfile(file_path):
+                if Path(file_path).suffix.lower() in self.supported_formats:
+                    paths.append(file_path)
+            elif os.path.isdir(file_path):
+                self.add_videos_from_folder(file_path)
+        self.add_paths(paths)
+        
+    def add_video_files(self):
+        """Add individual video files"""
+        filetypes = [
+            ("Video files", "*.mp4 *.avi *.mov *.mkv *.wmv *.flv *.webm *.m4v"),
+            ("All files", "*.*")
+        ]
+        files = filedialog.askopenfilenames(title="Select Video Files", filetypes=filetypes)
+        self.add_paths(files)
+        
+    def add_folder(self):
+        """Add all videos from a folder"""
+        folder_path = filedialog.askdirectory(title="Select Folder with Videos")
+        if folder_path:
+            self.add_videos_from_folder(folder_path)
+            
+    def add_videos_from_folder(self, folder_path):
+        """Scan a folder tree in the background and add its videos in batches"""
+        if self.global_settings() is None:
+            return
+        self.scan_stop.clear()
+        stop = self.scan_stop
+        self.file_summary_var.set(f"Scanning {folder_path}...")
+        
+        def on_batch(paths):
+            self.root.after(0, lambda: stop.is_set() or self.add_paths(paths))
+            
+        threading.Thread(target=scan_videos, args=(folder_path, on_batch),
+                         kwargs={'stop': stop}, daemon=True).start()
+        
+    def global_settings(self):
+        """Speed, frame rate and quality chosen above the list, or None after reporting an error"""
+        try:
+            settings = {
+                'speed': float(self.speed_var.get()),
+                'fps': self.fps_var.get(),
+                'quality': self.quality_var.get()
+            }
+        except ValueError:
+            messagebox.showerror("Error", "Invalid speed value!")
+            return None
+        try:
+            make_video('', settings)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
+        return settings
+        
+    def add_paths(self, paths):
+        """Add video files to the list, inserting only the new rows"""
+        settings = self.global_settings()
+        if settings is None:
+            return
+        for file_path in paths:
+            self.add_video_to_list(file_path, settings)
+        self.update_file_summary()
+        self.probe_new_videos()
+        
+    def add_video_to_list(self, file_path, settings):
+        """Add a video file to the processing list"""
+        video = make_video(file_path, settings)
+        item_id = self.videos.add(video)
+        if item_id is None:
+            return
+        self.file_tree.insert('', 'end', iid=item_id, text=Path(file_path).name,
+                              values=self.row_values(video))
+        self.probe_queue.append(file_path)
+        
+    def row_values(self, video):
+        return (self.format_duration(video), self.format_speeds(video), video['fps'], video['quality'])
+        
+    def format_speeds(self, video):
+        """Speed column text; one entry per output variant"""
+        variants = video.get('variants') or [video]
+        return ", ".join(str(variant['speed']) for variant in variants)
+        
+    def refresh_row(self, item_id):
+        """Redraw one file list row from its registry entry"""
+        self.file_tree.item(item_id, values=self.row_values(self.videos.get(item_id)))
+        
+    def remove_selected(self):
+        """Remove the selected videos from the list"""
+        selection = self.file_tree.selection()
+        for item_id in selection:
+            self.videos.remove(item_id)
+        if selection:
+            self.file_tree.delete(*selection)
+            self.update_file_summary()
+        
+    def format_duration(self, video):
+        """Format the probed duration of a video for the file list"""
+        if 'probe' not in video:
+            return "..."
+        probe = video['probe']
+        if not probe or probe.get('duration') is None:
+            return "?"
+        return format_eta(probe['duration'])
+        
+    def update_file_summary(self):
+        """Show the total input and estimated output duration of the batch"""
+        if not len(self.videos):
+            self.file_summary_var.set("")
+            return
+        summary = (f"{len(self.videos)} video(s), {format_eta(self.videos.total_in)} of footage "
+                   f"-> {format_eta(self.videos.total_out)} output")
+        if self.videos.unknown:
+            summary += f" ({self.videos.unknown} not probed yet)"
+        self.file_summary_var.set(summary)
+        
+    def probe_new_videos(self):
+        """Probe videos that have no metadata yet in a background thread"""
+        if self.probing or not self.ffmpeg_available or not self.probe_queue:
+            return
+        paths, self.probe_queue = self.probe_queue, []
+        self.probing = True
+        
+        def apply_batch(batch):
+            for path, probe in batch.items():
+                item_id = self.videos.item_for_path(path)
+                # The video may have been removed while it was being probed
+                if item_id is not None:
+                    self.videos.update(item_id, probe=probe)
+                    self.refresh_row(item_id)
+            self.update_file_summary()
+            
+        def run_probe():
+            try:
+                self.prober.probe_many(paths, lambda batch: self.root.after(0, apply_batch, batch))
+            finally:
+                self.root.after(0, self.finish_probing)
+                
+        threading.Thread(target=run_probe, daemon=True).start()
+        
+    def finish_probing(self):
+        """Pick up any files added while the previous probe was running"""
+        self.probing = False
+        self.probe_new_videos()
+                                
+    def edit_video_settings(self, event):
+        """Edit settings for selected video"""
+        selection = self.file_tree.selection()
+        if not selection:
+            return
+            
+        item_id = selection[0]
+        video = self.videos.get(item_id)
+        
+        # Create settings dialog
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Edit Video Settings")
+        dialog.geometry("300x200")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Settings fields
+        # Several comma-separated speeds render all of them from one decode
+        ttk.Label(dialog, text="Speed Multiplier(s):").grid(row=0, column=0, padx=10, pady=5, sticky=tk.W)
+        speed_var = tk.StringVar(value=self.format_speeds(video))
+        ttk.Entry(dialog, textvariable=speed_var).grid(row=0, column=1, padx=10, pady=5)
+        
+        ttk.Label(dialog, text="Frame Rate:").grid(row=1, column=0, padx=10, pady=5, sticky=tk.W)
+        fps_var = tk.StringVar(value=video['fps'])
+        ttk.Combobox(dialog, textvariable=fps_var, 
+                    values=FPS_CHOICES).grid(row=1, column=1, padx=10, pady=5)
+        
+        ttk.Label(dialog, text="Quality:").grid(row=2, column=0, padx=10, pady=5, sticky=tk.W)
+        quality_var = tk.StringVar(value=video['quality'])
+        ttk.Combobox(dialog, textvariable=quality_var,
+                    values=QUALITY_LEVELS).grid(row=2, column=1, padx=10, pady=5)
+        
+        def save_settings():
+            try:
+                speeds = [float(part) for part in speed_var.get().split(',') if part.strip()]
+                if not speeds or min(speeds) <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error", "Invalid speed value!")
+                return
+            try:
+                make_video(video['path'], {'speed': speeds[0], 'fps': fps_var.get(),
+                                           'quality': quality_var.get()})
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            variants = [{'speed': speed} for speed in speeds] if len(speeds) > 1 else None
+            self.videos.update(item_id, speed=speeds[0], variants=variants,
+                               fps=fps_var.get(), quality=quality_var.get())
+            self.refresh_row(item_id)
+            self.update_file_summary()
+            dialog.destroy()
+                
+        ttk.Button(dialog, text="Save", command=save_settings).grid(row=3, column=0, pady=20)
+        ttk.Button(dialog, text="Cancel", command=dialog.destroy).grid(row=3, column=1, pady=20)
+        
+    def apply_to_all(self):
+        """Apply current global settings to all videos"""
+        settings = self.global_settings()
+        if settings is None:
+            return
+        for item_id, video in self.videos.items():
+            self.videos.update(item_id, variants=None, **settings)
+            self.refresh_row(item_id)
+            
+        self.update_file_summary()
+        messagebox.showinfo("Success", "Settings applied to all videos!")
+            
+    def clear_files(self):
+        """Clear all video files from the list"""
+        self.scan_stop.set()
+        self.videos.clear()
+        self.probe_queue = []
+        self.file_tree.delete(*self.file_tree.get_children())
+        self.update_file_summary()
+        
+    def select_output_folder(self):
+        """Select output folder"""
+        folder = filedialog.askdirectory(title="Select Output Folder")
+        if folder:
+            self.output_folder.set(folder)
+            
+    def preview_video(self):
+        """Preview selected video with current settings"""
+        selection = self.file_tree.selection()
+        if not selection:
+            messagebox.showwarning("Warning", "Please select a video to preview!")
+            return
+            
+        if not self.ffmpeg_available:
+            messagebox.showerror("Error", "FFmpeg is required for preview functionality!")
+            return
+            
+        video = dict(self.videos.get(selection[0]), frame_selection=self.frame_selection_var.get(),
+                     audio=self.audio_var.get())
+        
+        try:
+            position = max(0.0, float(self.preview_position_var.get() or 0))
+        except ValueError:
+            messagebox.showerror("Error", "Invalid preview start position!")
+            return
+        
+        # Clamp the start so the preview does not seek past the end
+        probe = video.get('probe')
+        if probe and probe.get('duration'):
+            position = min(position, max(0.0, probe['duration'] - 1))
+        
+        def preview_progress(update):
+            if update['fraction'] is not None:
+                text = f"Rendering preview... {update['fraction'] * 100:.0f}%"
+                self.root.after(0, lambda: self.preview_label.config(text=text))
+                
+        # A new preview replaces one still rendering
+        if self.preview_token:
+            self.preview_token.cancel()
+        token = self.preview_token = CancelToken()
+        self.cancel_preview_btn.config(state='normal')
+        
+        def run_preview():
+            try:
+                preview_path, cached = render_preview(video['path'], video, position, self.preview_cache,
+                                                      ffmpeg=self.ffmpeg_path or 'ffmpeg',
+                                                      on_progress=preview_progress, cancel=token)
+                status = "Preview (cached)" if cached else "Preview saved"
+                self.root.after(0, lambda: self.preview_label.config(text=f"{status}: {preview_path}"))
+                
+                # Try to open the preview
+                if os.name == 'nt':  # Windows
+                    os.startfile(str(preview_path))
+                elif os.name == 'posix':  # macOS and Linux
+                    os.system(f'open "{preview_path}"' if os.uname().sysname == 'Darwin' 
+                             else f'xdg-open "{preview_path}"')
+                             
+            except Cancelled:
+                if token is self.preview_token:
+                    self.root.after(0, lambda: self.preview_label.config(text="Preview cancelled"))
+            except (FFmpegError, OSError) as e:
+                error_msg = f"Failed to create preview: {e}"
+                self.root.after(0, lambda: messagebox.showerror("Preview Error", error_msg))
+            finally:
+                if token is self.preview_token:
+                    self.root.after(0, lambda: self.cancel_preview_btn.config(state='disabled'))
+                
+        threading.Thread(target=run_preview, daemon=True).start()
+        
+    def cancel_preview(self):
+        """Stop the preview being rendered"""
+        if self.preview_token:
+            self.preview_token.cancel()
+        
+    def get_encoder_backend(self):
+        """Return the encoder backend used by build_ffmpeg_command"""
+        return self.hw_accel_var.get() if hasattr(self, 'hw_accel_var') else 'cpu'
+        
+    def start_processing(self, resume=False):
+        """Start processing all videos"""
+        if not len(self.videos):
+            messagebox.showwarning("Warning", "No video files selected!")
+            return
+            
+        if not self.output_folder.get():
+            messagebox.showwarning("Warning", "Please select an output folder!")
+            return
+            
+        if not self.ffmpeg_available:
+            messagebox.showerror("Error", "FFmpeg is required for video processing!")
+            return
+            
+        # Create output folder if it doesn't exist
+        output_dir = Path(self.output_folder.get())
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        self.processing = True
+        self.process_btn.config(state='disabled')
+        self.resume_btn.config(state='disabled')
+        self.stop_btn.config(state='normal')
+        self.pause_btn.config(state='normal', text="Pause Queue")
+        self.cancel_btn.config(state='normal')
+        
+        # Start processing in separate thread
+        self.process_thread = threading.Thread(target=self.process_videos, args=(resume,), daemon=True)
+        self.process_thread.start()
+        
+    def process_videos(self, resume=False):
+        """Process all videos on the batch engine, reporting errors and restoring the buttons"""
+        try:
+            self._run_batch(resume)
+        except Exception as e:
+            error_msg = f"Processing failed: {e}"
+            self.root.after(0, lambda: self.update_progress(error_msg, 0))
+            self.root.after(0, lambda: messagebox.showerror("Processing Error", error_msg))
+        finally:
+            self.jobs_by_item = {}
+            if not self.closing:
+                self.root.after(0, self.reset_ui)
+                
+    def _run_batch(self, resume):
+        """Plan and run the batch, then queue the summary"""
+        items = list(self.videos.items())
+        videos = [video for _, video in items]
+        total_videos = len(videos)
+        
+        jobs_setting = self.jobs_var.get()
+        max_workers = default_worker_count() if jobs_setting == 'auto' else max(1, int(jobs_setting))
+        
+        self.root.after(0, lambda: self.governor_var.set(""))
+        governor = ResourceGovernor.from_profile(
+            self.priority_var.get(),
+            on_decision=lambda message: self.root.after(0, lambda: self.governor_var.set(message)))
+        if not governor.active:
+            governor = None
+        
+        defaults = {'frame_selection': self.frame_selection_var.get(),
+                    'audio': self.audio_var.get(), 'layout': self.layout_var.get(),
+                    'stream_copy': self.stream_copy_var.get() == 'copy'}
+        if self.silent_speed_var.get() != 'off':
+            defaults['silent_speed'] = float(self.silent_speed_var.get())
+        
+        stager = None
+        if self.stage_var.get() != 'off':
+            stager = ScratchStager(mode=self.stage_var.get())
+        
+        threads = self.threads_var.get()
+        tuner = None
+        if threads == 'tune':
+            cores = governor.thread_budget if governor else None
+            tuner = AutoTuner(cores=cores,
+                              calibration=load_calibration(self.ffmpeg_path or 'ffmpeg', cores))
+            threads = 'auto'
+        
+        def report(job, update):
+            engine = self.engine
+            overall = engine.overall_fraction()
+            name = Path(job.payload['video']['path']).name
+            
+            details = []
+            if update['fraction'] is not None:
+                details.append(f"{update['fraction'] * 100:.0f}%")
+            if update['fps']:
+                details.append(f"{update['fps']:.0f} fps")
+            if update['speed']:
+                details.append(f"{update['speed']:.2f}x")
+            details.append(f"ETA {format_eta(update['eta'])}")
+            message = (f"{name}: {', '.join(details)} | {engine.finished}/{total_videos} done, "
+                       f"batch ETA {format_eta(engine.batch_eta())}")
+            self.root.after(0, lambda: self.update_progress(message, overall * 100))
+            
+        def job_started(job):
+            name = Path(job.payload['video']['path']).name
+            eta = format_eta(self.engine.batch_eta())
+            self.root.after(0, lambda: self.progress_var.set(
+                f"Processing {name} ({self.engine.finished}/{total_videos} done, batch ETA {eta})"))
+            
+        def job_done(job):
+            overall = self.engine.overall_fraction()
+            name = Path(job.payload['video']['path']).name
+            verb = "Cancelled" if job.status == 'cancelled' else "Finished"
+            message = f"{verb} {name} ({self.engine.finished}/{total_videos})"
+            self.root.after(0, lambda: self.update_progress(message, overall * 100))
+            
+        self.engine = BatchEngine(self.output_folder.get(), hw_accel=self.get_encoder_backend(),
+                                  threads=threads, max_workers=max_workers, tuner=tuner,
+                                  governor=governor,
+                                  metrics=MetricsRecorder(metrics_path(self.output_folder.get())),
+                                  ffmpeg=self.ffmpeg_path or 'ffmpeg', on_progress=report,
+                                  on_job_start=job_started, on_job_done=job_done,
+                                  chunks=self.chunks_var.get(),
+                                  defaults=defaults,
+                                  result_cache=self.result_cache,
+                                  cost_model=CostModel(), order=self.order_var.get(),
+                                  stager=stager)
+        if not self.processing:
+            self.engine.stop()
+        if resume:
+            self.root.after(0, lambda: self.progress_var.set("Checking completed outputs..."))
+        jobs = self.engine.plan(videos, resume=resume)
+        self.jobs_by_item = {item_id: job for (item_id, _), job in zip(items, jobs)}
+        summary = self.engine.run(jobs)
+        if self.closing:
+            return
+        
+        # Processing complete
+        if self.processing:
+            self.root.after(0, lambda: self.update_progress("Processing complete!", 100))
+        else:
+            self.root.after(0, lambda: self.update_progress("Processing stopped by user", 0))
+        self.root.after(0, lambda: self.show_summary(summary, videos))
+        
+    def show_summary(self, summary, videos):
+        """Report the aggregated batch results"""
+        message = f"Successfully processed {summary['succeeded']} of {summary['total']} video(s)."
+        if summary['skipped']:
+            message += f"\n{summary['skipped']} video(s) were already complete."
+        if summary.get('tuning'):
+            tuning = summary['tuning']
+            message += (f"\nAuto-tune: {tuning['initial']['jobs']} job(s) x "
+                        f"{tuning['initial']['threads']} thread(s), "
+                        f"{tuning['aggregate_fps'] or '?'} frames/s overall.")
+        if summary['reused']:
+            message += f"\n{summary['reused']} output(s) were reused instead of re-encoded."
+        if summary.get('governor'):
+            message += f"\nResources: {summary['governor'][0]['message']}"
+        if summary.get('cost_model'):
+            accuracy = summary['cost_model']
+            message += (f"\nPredicted {format_eta(accuracy['predicted_seconds'])} of encoding, "
+                        f"took {format_eta(accuracy['actual_seconds'])} "
+                        f"({accuracy['mean_error_pct']}% average error per video).")
+        if summary['copied']:
+            message += (f"\n{summary['copied']} video(s) had unchanged streams copied "
+                        f"instead of re-encoded at the chosen quality.")
+        if summary.get('staging'):
+            staging = summary['staging']
+            message += (f"\nStaging: {staging['hits']} input(s) read from the local copy, "
+                        f"{staging['misses']} read in place.")
+        if summary['cancelled']:
+            message += f"\n{summary['cancelled']} video(s) were not processed."
+        if summary['failed']:
+            names = [Path(videos[job_id]['path']).name for job_id, _ in summary['failures']]
+            details = "\n".join(f"  {name}: {error}" for name, (_, error)
+                                in zip(names[:10], summary['failures'][:10]))
+            if len(names) > 10:
+                details += f"\n  ...and {len(names) - 10} more"
+            message += f"\n{summary['failed']} video(s) failed:\n{details}"
+            messagebox.showwarning("Processing Finished", message)
+        else:
+            messagebox.showinfo("Success", message)
+            
+    def update_progress(self, message, percentage):
+        """Update progress bar and message"""
+        self.progress_var.set(message)
+        self.progress_bar.config(value=percentage)
+        
+    def stop_processing(self):
+        """Stop the processing; running encodes are stopped and their partial files removed"""
+        self.processing = False
+        if self.engine:
+            self.engine.stop()
+            self.progress_var.set("Stopping...")
+        self.pause_btn.config(state='disabled')
+        self.cancel_btn.config(state='disabled')
+        
+    def toggle_pause(self):
+        """Hold back or release the jobs still queued"""
+        if not self.engine:
+            return
+        if self.engine.paused:
+            self.engine.resume()
+            self.pause_btn.config(text="Pause Queue")
+        else:
+            self.engine.pause()
+            self.pause_btn.config(text="Continue Queue")
+            
+    def cancel_selected(self):
+        """Cancel the jobs of the selected videos, whether queued or running"""
+        if not self.engine:
+            return
+        for item_id in self.file_tree.selection():
+            job = self.jobs_by_item.get(item_id)
+            if job:
+                self.engine.cancel(job)
+                
+    def on_close(self):
+        """Stop encodes and previews, then close once their processes have exited"""
+        self.closing = True
+        self.stop_processing()
+        self.cancel_preview()
+        self.scan_stop.set()
+        deadline = time.monotonic() + STOP_GRACE + 1
+        
+        def close_when_idle():
+            busy = self.process_thread is not None and self.process_thread.is_alive()
+            if busy and time.monotonic() < deadline:
+                self.root.after(100, close_when_idle)
+            else:
+                self.root.destroy()
+                
+        close_when_idle()
+        
+    def reset_ui(self):
+        """Reset UI after processing"""
+        self.processing = False
+        self.process_btn.config(state='normal')
+        self.resume_btn.config(state='normal')
+        self.stop_btn.config(state='disabled')
+        self.pause_btn.config(state='disabled', text="Pause Queue")
+        self.cancel_btn.config(state='disabled')
+
+
+def main(started=None):
+    started = started or time.perf_counter()
+    try:
+        # Try to use TkinterDnD for drag and drop
+        root = TkinterDnD.Tk()
+    except Exception:
+        # Fallback to regular tkinter if TkinterDnD is not available
+        root = tk.Tk()
+        messagebox.showwarning("Warning", 
+                             "Drag and drop functionality requires tkinterdnd2 package.\n"
+                             "Install with: pip install tkinterdnd2")
+    
+    app = VideoSpeedupTool(root)
+    
+    # Report time to an interactive window when asked
+    if '--startup-time' in sys.argv:
+        root.after_idle(lambda: print(f"Window ready in {time.perf_counter() - started:.3f}s"))
+    root.mainloop()
@@ -0,0 +1,116 @@
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from speedup.probe import probe_file
+
+JOURNAL_NAME = ".speedup-journal.sqlite3"
+
+# States a journal entry moves through
+STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+
+def partial_path(output_path):
+    """Temporary name an output is encoded to before being renamed into place"""
+    output_path = Path(output_path)
+    # Keep the extension so ffmpeg still picks the right container
+    return output_path.with_name(f".{output_path.stem}.partial{output_path.suffix}")
+
+
+def output_is_complete(output_path, expected_duration=None, ffprobe='ffprobe', tolerance=0.02):
+    """Cheap validity check of a finished output against its expected duration"""
+    try:
+        if os.path.getsize(output_path) == 0:
+            return False
+        probe = probe_file(output_path, ffprobe)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return False
+    duration = probe.get('duration')
+    if not duration:
+        return False
+    if expected_duration:
+        return abs(duration - expected_duration) <= max(1.0, expected_duration * tolerance)
+    return True
+
+
+class JobJournal:
+    """Persistent record of batch jobs kept in the output folder
+
+    Each entry stores the job's state, command, input fingerprint, encode
+    parameter key, timings and output path so an interrupted batch can be
+    resumed without redoing finished work.
+    """
+
+    def __init__(self, output_folder, name=JOURNAL_NAME):
+        self.path = Path(output_folder) / name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' input TEXT NOT NULL, fingerprint TEXT, params TEXT NOT NULL,'
+            ' output TEXT NOT NULL, command TEXT, state TEXT NOT NULL,'
+            ' expected_duration REAL, error TEXT,'
+            ' queued_at REAL, started_at REAL, finished_at REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_key ON jobs(fingerprint, params)')
+        # Anything still marked running was interrupted by a crash
+        self._conn.execute("UPDATE jobs SET state='failed', error='interrupted' WHERE state='running'")
+        self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def find(self, fingerprint, params):
+        """Return the latest entry for an input and encode parameters, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, output, state, expected_duration FROM jobs'
+                ' WHERE fingerprint=? AND params=? ORDER BY id DESC LIMIT 1',
+                (fingerprint, params)).fetchone()
+        if not row:
+            return None
+        return dict(zip(('id', 'output', 'state', 'expected_duration'), row))
+
+    def add(self, input_path, fingerprint, params, output, command, expected_duration=None):
+        """Record a newly queued job and return its journal id"""
+        cursor = self._execute(
+            'INSERT INTO jobs (input, fingerprint, params, output, command, state,'
+            ' expected_duration, queued_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (str(input_path), fingerprint, params, str(output), json.dumps(command), 'queued',
+             expected_duration, time.time()))
+        return cursor.lastrowid
+
+    def mark(self, entry_id, state, error=None):
+        """Move an entry to a new state, recording start or finish time"""
+        now = time.time()
+        if state == 'running':
+            self._execute('UPDATE jobs SET state=?, started_at=? WHERE id=?',
+                          (state, now, entry_id))
+        else:
+            self._execute('UPDATE jobs SET state=?, error=?, finished_at=? WHERE id=?',
+                          (state, error, now, entry_id))
+
+    def completed_fingerprints(self):
+        """Return the input fingerprints of every successfully finished job"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT fingerprint FROM jobs WHERE state='done'")
+            return {row[0] for row in rows}
+
+    def entries(self):
+        """Return every journal entry, oldest first"""
+        with self._lock:
+            cursor = self._conn.execute('SELECT * FROM jobs ORDER BY id')
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+from speedup.engine import make_video
+
+# Per-job keys that may appear in a manifest, besides input/output
+JOB_KEYS = {'speed', 'fps', 'quality', 'encoder', 'threads', 'chunks', 'frame_selection',
+            'audio', 'variants', 'silent_speed', 'silence_threshold', 'stream_copy', 'layout'}
+
+
+class ManifestError(ValueError):
+    """A job manifest could not be parsed"""
+
+
+def load_manifest(path):
+    """Load a JSON job manifest
+
+    The manifest is either a list of jobs or an object of the form::
+
+        {
+            "output_folder": "out",
+            "defaults": {"speed": 2.0, "fps": "30", "quality": "High", "encoder": "cpu"},
+            "jobs": [{"input": "talk.mp4", "speed": 4}, "clip.mov",
+                     {"input": "demo.mp4", "variants": [{"speed": 1.5}, {"speed": 4}]}]
+        }
+
+    A job may be a bare input path. ``variants`` lists several outputs
+    (speed, fps and quality over the job's settings) rendered from a single
+    decode of the input. Relative paths are resolved against the
+    manifest's directory. Returns ``(videos, options)``.
+    """
+    path = Path(path)
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"Cannot read manifest {path}: {e}") from e
+
+    if isinstance(data, list):
+        data = {'jobs': data}
+    if not isinstance(data, dict) or not isinstance(data.get('jobs'), list):
+        raise ManifestError("Manifest must be a list of jobs or an object with a 'jobs' list")
+
+    base = path.parent
+    defaults = data.get('defaults', {})
+    unknown = set(defaults) - JOB_KEYS
+    if unknown:
+        raise ManifestError(f"Unknown default setting(s): {', '.join(sorted(unknown))}")
+
+    videos = []
+    for index, entry in enumerate(data['jobs']):
+        if isinstance(entry, str):
+            entry = {'input': entry}
+        if not isinstance(entry, dict) or not (entry.get('input') or entry.get('path')):
+            raise ManifestError(f"Job {index} has no input")
+
+        settings = dict(defaults)
+        settings.update({key: value for key, value in entry.items() if key in JOB_KEYS})
+        try:
+            video = make_video(base / (entry.get('input') or entry['path']), settings)
+        except (TypeError, ValueError) as e:
+            raise ManifestError(f"Job {index}: {e}") from e
+        if entry.get('output'):
+            if video.get('variants'):
+                raise ManifestError(f"Job {index}: a job with variants cannot set one output")
+            video['output'] = str(base / entry['output'])
+        videos.append(video)
+
+    options = {}
+    if data.get('output_folder'):
+        options['output_folder'] = str(base / data['output_folder'])
+    return videos, options
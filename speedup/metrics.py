@@ -0,0 +1,246 @@
+import contextlib
+import importlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from speedup.progress import peak_rss_mb
+
+METRICS_NAME = ".speedup-metrics.jsonl"
+# The JSON lines file is rotated to <name>.1 once it grows past this size
+MAX_METRICS_BYTES = 16 * 1024 * 1024
+
+# Prometheus metric name, type and help text for each exported aggregate
+PROMETHEUS_METRICS = {
+    'jobs': ('speedup_jobs_total', 'counter', "Finished jobs by status"),
+    'span_seconds': ('speedup_span_seconds_total', 'counter', "Time spent in each job stage"),
+    'batch_seconds': ('speedup_batch_span_seconds_total', 'counter',
+                      "Time spent in batch-wide stages"),
+    'frames': ('speedup_frames_total', 'counter', "Frames encoded"),
+    'output_bytes': ('speedup_output_bytes_total', 'counter', "Bytes of finished outputs"),
+    'cpu_seconds': ('speedup_ffmpeg_cpu_seconds_total', 'counter',
+                    "User plus system CPU time of ffmpeg processes"),
+    'io_wait_seconds': ('speedup_io_wait_seconds_total', 'counter',
+                        "Encode time ffmpeg spent blocked on I/O, by whether the input was staged"),
+    'last_fps': ('speedup_last_job_fps', 'gauge', "Encode rate of the last finished job"),
+    'running': ('speedup_batch_running', 'gauge', "1 while a batch is running"),
+    'updated': ('speedup_last_update_timestamp_seconds', 'gauge', "Time of the last update"),
+}
+
+
+def metrics_path(output_folder):
+    return Path(output_folder) / METRICS_NAME
+
+
+def load_hook(spec):
+    """Instantiate a profiler hook from a ``module:factory`` spec"""
+    module_name, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(f"Hook {spec!r} must look like module:factory")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRecorder:
+    """Per-job spans and counters written as JSON lines and a Prometheus text file
+
+    Stages are timed with ``span(job, name)``; a finished job's record holds
+    each stage's seconds, frames, encode rate, output size and bitrate,
+    ffmpeg CPU time and peak memory, time blocked on I/O, and the exit
+    status. ``textfile`` is
+    rewritten atomically after every job for node_exporter's textfile
+    collector. Each of ``hooks`` may define ``span_started(job, name)``,
+    ``span_finished(job, name, seconds)`` and ``job_finished(job, record)``
+    to feed an external profiler. Recording costs a few clock reads per
+    stage and one small write per job.
+    """
+
+    def __init__(self, path=None, textfile=None, hooks=()):
+        self.path = Path(path) if path else None
+        self.textfile = Path(textfile) if textfile else None
+        self.hooks = list(hooks)
+        self._jobs = {}
+        self._totals = {'jobs': {}, 'span_seconds': {}, 'batch_seconds': {}, 'frames': 0,
+                        'output_bytes': 0, 'cpu_seconds': 0.0, 'io_wait_seconds': {},
+                        'last_fps': 0.0, 'running': 0}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _entry(self, job):
+        return self._jobs.setdefault(job.job_id, {'spans': {}})
+
+    def _call_hooks(self, method, *args):
+        for hook in self.hooks:
+            callback = getattr(hook, method, None)
+            if callback:
+                callback(*args)
+
+    @contextlib.contextmanager
+    def span(self, job, name):
+        """Time one stage of a job; repeated stages add up"""
+        self._call_hooks('span_started', job, name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(job, name, time.perf_counter() - started)
+
+    def add_span(self, job, name, seconds):
+        """Record a stage timed elsewhere"""
+        with self._lock:
+            spans = self._entry(job)['spans']
+            spans[name] = spans.get(name, 0.0) + seconds
+        self._call_hooks('span_finished', job, name, seconds)
+
+    @contextlib.contextmanager
+    def batch_span(self, name):
+        """Time a stage covering the whole batch, such as probing"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            with self._lock:
+                totals = self._totals['batch_seconds']
+                totals[name] = totals.get(name, 0.0) + seconds
+
+    def update(self, job, **fields):
+        """Attach measurements such as frames or rusage to a job"""
+        with self._lock:
+            self._entry(job).update(fields)
+
+    def batch_started(self):
+        with self._lock:
+            self._totals['running'] = 1
+        self.write_textfile()
+
+    def batch_finished(self):
+        with self._lock:
+            self._totals['running'] = 0
+        self.write_textfile()
+        self.close()
+
+    def job_finished(self, job):
+        """Write the job's record and fold it into the exported totals"""
+        with self._lock:
+            entry = self._jobs.pop(job.job_id, {'spans': {}})
+        record = self._record(job, entry)
+        with self._lock:
+            totals = self._totals
+            totals['jobs'][job.status] = totals['jobs'].get(job.status, 0) + 1
+            for name, seconds in record['spans'].items():
+                totals['span_seconds'][name] = totals['span_seconds'].get(name, 0.0) + seconds
+            totals['frames'] += record.get('frames') or 0
+            totals['output_bytes'] += record.get('output_bytes') or 0
+            totals['cpu_seconds'] += record.get('cpu_seconds') or 0.0
+            if record.get('io_wait') is not None:
+                staged = 'true' if record['staged'] else 'false'
+                waits = totals['io_wait_seconds']
+                waits[staged] = waits.get(staged, 0.0) + record['io_wait']
+            if record.get('fps'):
+                totals['last_fps'] = record['fps']
+            if self.path:
+                self._write_line(record)
+        self._call_hooks('job_finished', job, record)
+        self.write_textfile()
+        return record
+
+    def _record(self, job, entry):
+        video = job.payload['video']
+        targets = job.payload['targets']
+        spans = {name: round(seconds, 4) for name, seconds in entry['spans'].items()}
+        record = {
+            'time': round(time.time(), 3),
+            'job': job.job_id,
+            'input': video['path'],
+            'outputs': [target['output'] for target in targets],
+            'status': job.status,
+            'exit_code': entry.get('exit_code', 0 if job.status == 'done' else None),
+            'elapsed': round(job.elapsed, 3),
+            'spans': spans,
+        }
+        if job.error:
+            record['error'] = job.error
+        if job.payload.get('predicted') is not None:
+            record['predicted'] = round(job.payload['predicted'], 3)
+        frames = entry.get('frames')
+        if frames is not None:
+            record['frames'] = frames
+            if spans.get('encode'):
+                record['fps'] = round(frames / spans['encode'], 1)
+        rusage = entry.get('rusage')
+        if rusage is not None:
+            record['cpu_seconds'] = round(rusage.ru_utime + rusage.ru_stime, 3)
+            record['max_rss_mb'] = peak_rss_mb(rusage)
+        if entry.get('io_wait') is not None:
+            record['io_wait'] = entry['io_wait']
+            record['staged'] = entry['staged']
+            if spans.get('encode'):
+                record['io_wait_pct'] = round(entry['io_wait'] / spans['encode'] * 100, 1)
+        if job.status == 'done':
+            sizes = []
+            for target in targets:
+                try:
+                    sizes.append(os.path.getsize(target['output']))
+                except OSError:
+                    pass
+            record['output_bytes'] = sum(sizes)
+            durations = [target['expected_duration'] for target in targets]
+            if sizes and all(durations):
+                record['bitrate'] = round(sum(sizes) * 8 / sum(durations))
+        return record
+
+    def _write_line(self, record):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                if self.path.stat().st_size > MAX_METRICS_BYTES:
+                    os.replace(self.path, f"{self.path}.1")
+            except OSError:
+                pass
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def prometheus_text(self):
+        """The current totals in the Prometheus text exposition format"""
+        with self._lock:
+            totals = {key: dict(value) if isinstance(value, dict) else value
+                      for key, value in self._totals.items()}
+        totals['updated'] = round(time.time(), 3)
+        labels = {'jobs': 'status', 'span_seconds': 'span', 'batch_seconds': 'span',
+                  'io_wait_seconds': 'staged'}
+        lines = []
+        for key, (name, kind, help_text) in PROMETHEUS_METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            value = totals[key]
+            if key in labels:
+                for label, amount in sorted(value.items()):
+                    lines.append(f'{name}{{{labels[key]}="{_escape(label)}"}} {round(amount, 4)}')
+            else:
+                lines.append(f"{name} {round(value, 4)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self):
+        """Replace the Prometheus text file; the collector never sees a partial file"""
+        if not self.textfile:
+            return
+        tmp_path = f"{self.textfile}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, self.textfile)
+        except OSError:
+            pass
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
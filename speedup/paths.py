@@ -0,0 +1,15 @@
+import os
+from pathlib import Path
+
+APP_NAME = "video-speedup-tool"
+
+
+def cache_dir():
+    """Return the per-user cache directory, creating it if needed"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    path = Path(base) / APP_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from speedup.engine import build_ffmpeg_command
+from speedup.fingerprint import input_fingerprint
+from speedup.paths import cache_dir
+from speedup.progress import run_ffmpeg
+
+PREVIEW_SECONDS = 10
+PREVIEW_HEIGHT = 360
+# Fastest encoder settings; previews are for judging timing, not quality.
+# They are played locally, so they skip the faststart rewrite.
+PREVIEW_SETTINGS = {'quality': 'Low', 'encoder': 'cpu', 'threads': 'auto', 'layout': 'plain'}
+
+
+def preview_key(input_path, video, position):
+    """Cache key for a preview of ``input_path`` at ``position`` seconds"""
+    parts = {
+        'input': input_fingerprint(input_path),
+        'speed': float(video['speed']),
+        'fps': str(video['fps']),
+        'position': round(float(position), 2),
+        'frame_selection': video.get('frame_selection') or 'exact',
+        'audio': video.get('audio') or 'pitch',
+        'speed_map': video.get('speed_map'),
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def build_preview_command(input_path, output_path, video, position=0.0,
+                          seconds=PREVIEW_SECONDS, ffmpeg='ffmpeg'):
+    """Build a reduced-resolution preview command seeking on the input side"""
+    settings = dict(video, **PREVIEW_SETTINGS)
+    speed = float(video['speed'])
+    # seconds of output need seconds * speed of source
+    return build_ffmpeg_command(input_path, output_path, settings, ffmpeg=ffmpeg,
+                                start=position, duration=seconds * speed,
+                                max_height=PREVIEW_HEIGHT)
+
+
+class PreviewCache:
+    """Rendered previews on disk with a total size cap and LRU eviction"""
+
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024):
+        self.directory = Path(directory or cache_dir() / 'previews')
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path_for(self, key):
+        return self.directory / f"{key}.mp4"
+
+    def get(self, key):
+        """Return the cached preview path and mark it recently used, or None"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def add(self, key, rendered_path):
+        """Move a finished render into the cache and enforce the size cap"""
+        path = self.path_for(key)
+        os.replace(rendered_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Delete least recently used previews until the cache fits its cap"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                # Skip renders that are still in progress
+                if entry.is_file() and not entry.name.startswith('tmp-'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+def render_preview(input_path, video, position=0.0, cache=None, ffmpeg='ffmpeg',
+                   on_progress=None, cancel=None):
+    """Return ``(path, cached)`` for a preview, rendering it on a cache miss
+
+    Raises Cancelled if ``cancel`` (a CancelToken) stops the render.
+    """
+    cache = cache or PreviewCache()
+    key = preview_key(input_path, video, position)
+    path = cache.get(key)
+    if path:
+        return path, True
+
+    partial = cache.directory / f"tmp-{key}-{threading.get_ident()}.mp4"
+    cmd = build_preview_command(input_path, partial, video, position, ffmpeg=ffmpeg)
+    try:
+        run_ffmpeg(cmd, on_progress, speed=float(video['speed']), limit=PREVIEW_SECONDS,
+                   cancel=cancel)
+        return cache.add(key, partial), False
+    finally:
+        if partial.exists():
+            partial.unlink()
@@ -0,0 +1,250 @@
+import array
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from speedup.paths import cache_dir
+
+PROBE_CMD = ['-v', 'error', '-print_format', 'json', '-show_format', '-show_streams']
+
+
+def parse_rate(value):
+    """Convert an ffprobe frame rate such as '30000/1001' to a float"""
+    try:
+        num, _, den = value.partition('/')
+        num = float(num)
+        den = float(den) if den else 1.0
+        return num / den if den else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize_probe(data):
+    """Reduce raw ffprobe JSON to the fields the tool uses"""
+    fmt = data.get('format', {})
+    streams = []
+    video = None
+    audio = None
+    for stream in data.get('streams', []):
+        kind = stream.get('codec_type')
+        entry = {'index': stream.get('index'), 'type': kind, 'codec': stream.get('codec_name')}
+        if kind == 'video':
+            # Cover art is reported as a video stream with a single frame
+            if stream.get('disposition', {}).get('attached_pic'):
+                continue
+            entry.update({
+                'width': stream.get('width'),
+                'height': stream.get('height'),
+                'fps': parse_rate(stream.get('avg_frame_rate')) or parse_rate(stream.get('r_frame_rate')),
+                'pix_fmt': stream.get('pix_fmt'),
+                'profile': stream.get('profile'),
+            })
+            if video is None:
+                video = entry
+        elif kind == 'audio':
+            entry.update({
+                'channels': stream.get('channels'),
+                'sample_rate': int(stream['sample_rate']) if stream.get('sample_rate') else None,
+            })
+            if audio is None:
+                audio = entry
+        streams.append(entry)
+
+    return {
+        'duration': _to_float(fmt.get('duration')),
+        'bit_rate': int(fmt['bit_rate']) if fmt.get('bit_rate') else None,
+        'format': fmt.get('format_name'),
+        'streams': streams,
+        'video': video,
+        'audio': audio,
+    }
+
+
+def probe_file(path, ffprobe='ffprobe'):
+    """Run ffprobe on a file and return its summarized metadata"""
+    result = subprocess.run([ffprobe] + PROBE_CMD + [str(path)], capture_output=True,
+                            text=True, check=True)
+    return summarize_probe(json.loads(result.stdout or '{}'))
+
+
+class ProbeCache:
+    """On-disk probe results keyed by (path, size, mtime_ns) with LRU eviction
+
+    Audio loudness profiles used for variable speed are kept next to the
+    probe results and validated the same way.
+    """
+
+    def __init__(self, db_path=None, max_entries=50000):
+        self.db_path = str(db_path or cache_dir() / 'probe.sqlite3')
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS probes ('
+            ' path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,'
+            ' data TEXT, last_used REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS probes_lru ON probes(last_used)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS loudness ('
+            ' path TEXT, window REAL, size INTEGER, mtime_ns INTEGER, levels BLOB,'
+            ' last_used REAL, PRIMARY KEY (path, window))')
+        self._conn.commit()
+
+    @staticmethod
+    def file_key(path):
+        """Return the (size, mtime_ns) pair used to validate an entry"""
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def get_many(self, paths):
+        """Return {path: metadata} for every path with a valid cache entry"""
+        hits = {}
+        keys = {}
+        for path in paths:
+            try:
+                keys[path] = self.file_key(path)
+            except OSError:
+                continue
+
+        now = time.time()
+        with self._lock:
+            rows = []
+            items = list(keys)
+            # Stay well under SQLite's bound-variable limit
+            for start in range(0, len(items), 500):
+                chunk = items[start:start + 500]
+                marks = ','.join('?' * len(chunk))
+                rows.extend(self._conn.execute(
+                    f'SELECT path, size, mtime_ns, data FROM probes WHERE path IN ({marks})', chunk))
+            for path, size, mtime_ns, data in rows:
+                if keys.get(path) == (size, mtime_ns):
+                    hits[path] = json.loads(data)
+            if hits:
+                self._conn.executemany('UPDATE probes SET last_used=? WHERE path=?',
+                                       [(now, path) for path in hits])
+                self._conn.commit()
+        return hits
+
+    def get(self, path):
+        """Return cached metadata for a path, or None if missing or stale"""
+        return self.get_many([path]).get(path)
+
+    def put_many(self, entries):
+        """Store {path: metadata} entries and evict the least recently used"""
+        now = time.time()
+        rows = []
+        for path, data in entries.items():
+            try:
+                size, mtime_ns = self.file_key(path)
+            except OSError:
+                continue
+            rows.append((path, size, mtime_ns, json.dumps(data), now))
+
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)', rows)
+            count = self._conn.execute('SELECT COUNT(*) FROM probes').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM probes WHERE path IN '
+                    '(SELECT path FROM probes ORDER BY last_used LIMIT ?)',
+                    (count - self.max_entries,))
+            self._conn.commit()
+
+    def put(self, path, data):
+        self.put_many({path: data})
+
+    def get_levels(self, path, window):
+        """Return the cached loudness profile (dBFS per window) of a file, or None"""
+        try:
+            key = self.file_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, levels FROM loudness WHERE path=? AND window=?',
+                (path, window)).fetchone()
+            if not row or (row[0], row[1]) != key:
+                return None
+            self._conn.execute('UPDATE loudness SET last_used=? WHERE path=? AND window=?',
+                               (time.time(), path, window))
+            self._conn.commit()
+        # Stored as tenths of a dB in 16-bit integers
+        return [value / 10 for value in array.array('h', row[2])]
+
+    def put_levels(self, path, window, levels):
+        try:
+            size, mtime_ns = self.file_key(path)
+        except OSError:
+            return
+        data = array.array('h', (round(level * 10) for level in levels)).tobytes()
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?, ?)',
+                               (path, window, size, mtime_ns, data, time.time()))
+            count = self._conn.execute('SELECT COUNT(*) FROM loudness').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM loudness WHERE rowid IN '
+                    '(SELECT rowid FROM loudness ORDER BY last_used LIMIT ?)',
+                    (count - self.max_entries,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MediaProber:
+    """Probe files concurrently, serving unchanged files from the cache"""
+
+    def __init__(self, cache=None, max_workers=None, ffprobe='ffprobe'):
+        self.cache = cache
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) * 2)
+        self.ffprobe = ffprobe
+
+    def probe_many(self, paths, on_batch=None, batch_size=200):
+        """Probe paths, calling on_batch({path: metadata}) as results arrive
+
+        Files that fail to probe map to None. Returns every result.
+        """
+        paths = list(paths)
+        results = self.cache.get_many(paths) if self.cache else {}
+        if results and on_batch:
+            on_batch(dict(results))
+
+        missing = [path for path in paths if path not in results]
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(probe_file, path, self.ffprobe): path for path in missing}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    pending[path] = future.result()
+                except (subprocess.CalledProcessError, OSError, ValueError):
+                    pending[path] = None
+                if len(pending) >= batch_size:
+                    self._flush(pending, results, on_batch)
+                    pending = {}
+        self._flush(pending, results, on_batch)
+        return results
+
+    def _flush(self, pending, results, on_batch):
+        if not pending:
+            return
+        results.update(pending)
+        if self.cache:
+            self.cache.put_many({path: data for path, data in pending.items() if data})
+        if on_batch:
+            on_batch(dict(pending))
@@ -0,0 +1,349 @@
+import collections
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# ffmpeg prints the input duration on stderr before encoding starts
+DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+# Arguments that make ffmpeg report machine-readable progress on stdout
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+
+# Seconds ffmpeg gets to exit after 'q' and SIGTERM before it is killed
+STOP_GRACE = 5.0
+
+# Held while a child is reaped or signalled, so a signal never reaches a
+# PID that was reaped and reused in between
+REAP_LOCK = threading.Lock()
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg exited with a non-zero status"""
+
+    def __init__(self, returncode, stderr_tail):
+        self.returncode = returncode
+        self.stderr_tail = list(stderr_tail)
+        last_line = self.stderr_tail[-1] if self.stderr_tail else ''
+        super().__init__(last_line or f"ffmpeg exited with code {returncode}")
+
+
+class Cancelled(Exception):
+    """A command was stopped on request before it finished"""
+
+
+def stop_process(process, grace=STOP_GRACE):
+    """Ask ffmpeg to quit and kill it if it is still running after ``grace`` seconds
+
+    ffmpeg reads 'q' on stdin and treats SIGTERM the same way: it stops
+    reading input and closes its output. Windows has no SIGTERM, so there
+    only 'q' is sent before the kill. The process is never reaped here;
+    wait_process owns that, and signals are only sent under REAP_LOCK
+    while the process is known to be unreaped so a reused PID is never hit.
+    """
+    with REAP_LOCK:
+        if process.returncode is not None:
+            return
+        try:
+            process.stdin.write(b'q')
+            process.stdin.flush()
+        except (AttributeError, OSError, ValueError):
+            pass
+        if os.name == 'posix':
+            try:
+                process.terminate()
+            except OSError:
+                pass
+    deadline = time.monotonic() + grace
+    while process.returncode is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    with REAP_LOCK:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+
+class CancelToken:
+    """Cancellation shared by a job and every ffmpeg process started for it
+
+    ``cancel()`` returns at once; each attached process is stopped on its
+    own thread with stop_process, and processes attached later are stopped
+    as soon as they start.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.grace = STOP_GRACE
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    def attach(self, process):
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self.cancelled
+        if cancelled:
+            self._stop(process)
+
+    def detach(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def cancel(self, grace=STOP_GRACE):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            self.grace = grace
+            processes = list(self._processes)
+        for process in processes:
+            self._stop(process)
+
+    def check(self):
+        """Raise Cancelled once the token has been cancelled"""
+        if self.cancelled:
+            raise Cancelled("cancelled")
+
+    def _stop(self, process):
+        threading.Thread(target=stop_process, args=(process, self.grace), daemon=True,
+                         name=f"stop-{process.pid}").start()
+
+
+def parse_timestamp(value):
+    """Convert an HH:MM:SS.micro timestamp to seconds"""
+    try:
+        hours, minutes, seconds = value.strip().split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+def format_eta(seconds):
+    """Format a number of seconds as a short human readable duration"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(max(0, seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class Throttle:
+    """Call a function at most once per interval, always passing final updates"""
+
+    def __init__(self, func, interval=0.25):
+        self.func = func
+        self.interval = interval
+        self._last = 0.0
+
+    def __call__(self, update, force=False):
+        now = time.monotonic()
+        if force or now - self._last >= self.interval:
+            self._last = now
+            self.func(update)
+
+
+class ProgressReader:
+    """Parse ffmpeg ``-progress`` output and stderr without buffering the whole log
+
+    Only the last ``tail_size`` stderr lines are kept for error reporting.
+    ``speed`` is the playback speed multiplier so the output position can be
+    compared against the retimed duration; ``limit`` caps the output length
+    when the command uses ``-t``.
+    """
+
+    def __init__(self, on_progress=None, expected_duration=None, speed=1.0,
+                 tail_size=40, interval=0.25, limit=None):
+        self.expected_duration = expected_duration
+        self.speed = speed
+        self.limit = limit
+        self.stderr_tail = collections.deque(maxlen=tail_size)
+        self.state = {}
+        self.started = time.monotonic()
+        self._emit = Throttle(on_progress, interval) if on_progress else None
+        self._input_duration = None
+        # When ffmpeg reported the end; the rest of its run is muxer finalisation
+        self.ended = None
+        # Resource usage of the finished process, where the platform reports it
+        self.rusage = None
+
+    @property
+    def output_duration(self):
+        """Duration of the finished output in seconds, if known"""
+        duration = self.expected_duration
+        if not duration and self._input_duration:
+            duration = self._input_duration / self.speed
+        if self.limit:
+            duration = min(duration, self.limit) if duration else self.limit
+        return duration
+
+    def read_stderr(self, stream):
+        """Drain stderr, keeping a fixed-size tail"""
+        for raw in stream:
+            line = raw.decode(errors='replace').rstrip()
+            if not line:
+                continue
+            if self._input_duration is None:
+                match = DURATION_RE.search(line)
+                if match:
+                    hours, minutes, seconds = match.groups()
+                    self._input_duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            self.stderr_tail.append(line)
+
+    def read_progress(self, stream):
+        """Consume key=value blocks from the -progress channel"""
+        for raw in stream:
+            line = raw.decode(errors='replace').strip()
+            key, sep, value = line.partition('=')
+            if not sep:
+                continue
+            self.state[key] = value
+            if key == 'progress':
+                if value == 'end':
+                    self.ended = time.monotonic()
+                update = self.snapshot()
+                if self._emit:
+                    self._emit(update, force=(value == 'end'))
+
+    def snapshot(self):
+        """Build a progress update from the latest block"""
+        state = self.state
+        position = None
+        if state.get('out_time_us', 'N/A') not in ('N/A', ''):
+            position = int(state['out_time_us']) / 1_000_000
+        elif 'out_time' in state:
+            position = parse_timestamp(state['out_time'])
+
+        fps = _to_float(state.get('fps'))
+        speed_factor = _to_float(state.get('speed', '').rstrip('x'))
+        total = self.output_duration
+        done = state.get('progress') == 'end'
+
+        fraction = None
+        eta = None
+        if total and position is not None:
+            fraction = min(1.0, max(0.0, position / total))
+            if speed_factor:
+                eta = max(0.0, total - position) / speed_factor
+        if done:
+            fraction, eta = 1.0, 0.0
+
+        return {
+            'position': position,
+            'duration': total,
+            'fraction': fraction,
+            'fps': fps,
+            'speed': speed_factor,
+            'frame': _to_int(state.get('frame')),
+            'eta': eta,
+            'elapsed': time.monotonic() - self.started,
+            'done': done,
+        }
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def wait_process(process):
+    """Wait for a process and return ``(returncode, rusage)``
+
+    On POSIX the child is reaped with os.wait4 so its CPU time and peak
+    memory are available; elsewhere rusage is None. The exit is awaited
+    with waitid(WNOWAIT), which leaves the child unreaped, and the reap
+    and ``returncode`` update then happen together under REAP_LOCK.
+    """
+    if not (hasattr(os, 'wait4') and hasattr(os, 'waitid')):
+        return process.wait(), None
+    try:
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+    except ChildProcessError:
+        pass
+    with REAP_LOCK:
+        if process.returncode is not None:
+            return process.returncode, None
+        try:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return process.returncode, usage
+    # Already reaped by Popen itself
+    return process.wait(), None
+
+
+def peak_rss_mb(rusage):
+    """Peak resident set size from a child's rusage (KiB on Linux, bytes on macOS)"""
+    if rusage is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(rusage.ru_maxrss / scale, 1)
+
+
+def io_bytes(rusage):
+    """Bytes a child read from and wrote to storage, or None without rusage
+
+    Counted in 512-byte blocks by Linux; reads served from the page cache
+    are not included.
+    """
+    if rusage is None:
+        return None
+    return {'read': rusage.ru_inblock * 512, 'written': rusage.ru_oublock * 512}
+
+
+def run_ffmpeg(cmd, on_progress=None, expected_duration=None, speed=1.0,
+               tail_size=40, interval=0.25, limit=None, on_spawn=None, cancel=None,
+               preexec=None):
+    """Run an ffmpeg command built with PROGRESS_ARGS, streaming its progress
+
+    ``preexec`` runs in the child before ffmpeg is executed (POSIX only);
+    ``on_spawn(process)`` is called as soon as the process has started.
+    Raises FFmpegError with the stderr tail if ffmpeg fails, and Cancelled
+    if ``cancel`` (a CancelToken) stopped it.
+    """
+    if cancel:
+        cancel.check()
+    reader = ProgressReader(on_progress, expected_duration, speed, tail_size, interval, limit)
+    # stdin stays open so the process can be asked to quit with 'q'
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, preexec_fn=preexec)
+    if on_spawn:
+        on_spawn(process)
+    if cancel:
+        cancel.attach(process)
+    stderr_thread = threading.Thread(target=reader.read_stderr, args=(process.stderr,),
+                                     daemon=True)
+    stderr_thread.start()
+    try:
+        reader.read_progress(process.stdout)
+        returncode, reader.rusage = wait_process(process)
+    finally:
+        if cancel:
+            cancel.detach(process)
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+    stderr_thread.join()
+
+    if cancel and cancel.cancelled:
+        raise Cancelled("cancelled")
+    if returncode != 0:
+        raise FFmpegError(returncode, reader.stderr_tail)
+    return reader
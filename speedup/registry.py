@@ -0,0 +1,113 @@
+import itertools
+import os
+
+from speedup.engine import SUPPORTED_FORMATS
+
+
+def scan_videos(folder, on_batch, batch_size=500, stop=None):
+    """Walk a folder tree with os.scandir and report video paths in batches
+
+    ``on_batch(paths)`` is called every ``batch_size`` files and once at the
+    end, so a caller can hand results to the UI without waiting for the full
+    walk. ``stop`` is an optional threading.Event that aborts the walk.
+    """
+    batch = []
+    stack = [str(folder)]
+    while stack:
+        if stop is not None and stop.is_set():
+            break
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif (os.path.splitext(entry.name)[1].lower() in SUPPORTED_FORMATS
+                              and entry.is_file()):
+                            batch.append(entry.path)
+                    except OSError:
+                        continue
+                    if len(batch) >= batch_size:
+                        on_batch(batch)
+                        batch = []
+        except OSError:
+            continue
+    if batch:
+        on_batch(batch)
+
+
+class VideoRegistry:
+    """Path-keyed index of the batch's video entries
+
+    Every entry gets a stable item id on insertion, used as the Treeview iid,
+    so lookups, edits and removals touch only the affected entries. Running
+    duration totals are kept up to date incrementally for the batch summary.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._by_path = {}
+        self._ids = itertools.count(1)
+        self.total_in = 0.0
+        self.total_out = 0.0
+        self.unknown = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __contains__(self, path):
+        return os.path.normpath(path) in self._by_path
+
+    def _account(self, video, sign):
+        probe = video.get('probe')
+        if probe and probe.get('duration'):
+            speeds = [variant['speed'] for variant in video.get('variants') or [video]]
+            self.total_in += sign * probe['duration']
+            self.total_out += sign * sum(probe['duration'] / speed for speed in speeds)
+        else:
+            self.unknown += sign
+
+    def items(self):
+        return self._items.items()
+
+    def get(self, item_id):
+        return self._items.get(item_id)
+
+    def item_for_path(self, path):
+        return self._by_path.get(os.path.normpath(path))
+
+    def add(self, video):
+        """Register a video entry and return its item id, or None if already listed"""
+        key = os.path.normpath(video['path'])
+        if key in self._by_path:
+            return None
+        item_id = f"v{next(self._ids)}"
+        self._items[item_id] = video
+        self._by_path[key] = item_id
+        self._account(video, 1)
+        return item_id
+
+    def update(self, item_id, **fields):
+        """Change fields of one entry, keeping the totals in step"""
+        video = self._items[item_id]
+        self._account(video, -1)
+        video.update(fields)
+        self._account(video, 1)
+        return video
+
+    def remove(self, item_id):
+        video = self._items.pop(item_id, None)
+        if video is not None:
+            del self._by_path[os.path.normpath(video['path'])]
+            self._account(video, -1)
+        return video
+
+    def clear(self):
+        self._items.clear()
+        self._by_path.clear()
+        self.total_in = self.total_out = 0.0
+        self.unknown = 0
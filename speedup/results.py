@@ -0,0 +1,133 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from speedup.paths import cache_dir
+
+STAT_NAMES = ('hits', 'encodes', 'bytes_reused', 'seconds_saved')
+
+
+def result_key(content_fingerprint, params):
+    """Cache key of one output: input content plus normalised encode parameters"""
+    return hashlib.sha1(f"{content_fingerprint}\n{params}".encode()).hexdigest()
+
+
+def reuse_output(source, destination):
+    """Make ``destination`` hold the finished output ``source``
+
+    Hard links cost no space or copy time; across volumes, or where links
+    are not supported, the file is copied. Returns 'same', 'link' or 'copy'.
+    """
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return 'same'
+    try:
+        os.remove(destination)
+    except OSError:
+        pass
+    try:
+        os.link(source, destination)
+        return 'link'
+    except OSError:
+        shutil.copyfile(source, destination)
+        return 'copy'
+
+
+class ResultCache:
+    """Index of finished outputs keyed by input content and encode parameters
+
+    Entries point at outputs already on disk and are only served while the
+    output still has the size and mtime it had when recorded. At most
+    ``max_entries`` entries are kept, evicting the least recently used.
+    """
+
+    def __init__(self, db_path=None, max_entries=20000):
+        self.db_path = str(db_path or cache_dir() / 'results.sqlite3')
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' key TEXT PRIMARY KEY, output TEXT, size INTEGER, mtime_ns INTEGER,'
+            ' encode_seconds REAL, last_used REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_lru ON results(last_used)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL)')
+        self._conn.commit()
+
+    def get(self, key):
+        """Return ``{'output', 'size', 'encode_seconds'}`` for a valid entry, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT output, size, mtime_ns, encode_seconds FROM results WHERE key=?',
+                (key,)).fetchone()
+            if not row:
+                return None
+            output, size, mtime_ns, encode_seconds = row
+            try:
+                st = os.stat(output)
+                valid = (st.st_size, st.st_mtime_ns) == (size, mtime_ns)
+            except OSError:
+                valid = False
+            if not valid:
+                # The output was deleted or changed since it was recorded
+                self._conn.execute('DELETE FROM results WHERE key=?', (key,))
+            else:
+                self._conn.execute('UPDATE results SET last_used=? WHERE key=?',
+                                   (time.time(), key))
+            self._conn.commit()
+        if not valid:
+            return None
+        return {'output': output, 'size': size, 'encode_seconds': encode_seconds}
+
+    def put(self, key, output, encode_seconds=None):
+        """Record a finished output and evict the least recently used entries"""
+        try:
+            st = os.stat(output)
+        except OSError:
+            return
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, str(output), st.st_size, st.st_mtime_ns, encode_seconds,
+                                time.time()))
+            count = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM results WHERE key IN '
+                    '(SELECT key FROM results ORDER BY last_used LIMIT ?)',
+                    (count - self.max_entries,))
+            self._conn.commit()
+
+    def record(self, **amounts):
+        """Add to the running counters, e.g. ``record(hits=1, bytes_reused=n)``"""
+        with self._lock:
+            for name, amount in amounts.items():
+                self._conn.execute(
+                    'INSERT INTO stats VALUES (?, ?) '
+                    'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                    (name, amount or 0))
+            self._conn.commit()
+
+    def stats(self):
+        """Return the entry count and the hit, encode and savings counters"""
+        with self._lock:
+            values = dict(self._conn.execute('SELECT name, value FROM stats'))
+            entries = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        stats = {name: values.get(name, 0) for name in STAT_NAMES}
+        stats['entries'] = entries
+        lookups = stats['hits'] + stats['encodes']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+            self._conn.execute('DELETE FROM stats')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+import traceback
+
+from speedup.progress import STOP_GRACE, CancelToken, Cancelled
+
+# Default number of simultaneous sessions allowed per encoder backend.
+# Consumer GPUs cap concurrent hardware encode sessions, so the hardware
+# backends get a small limit while CPU jobs are bounded by the pool size.
+DEFAULT_BACKEND_SLOTS = {
+    'cpu': None,
+    'nvenc': 3,
+    'amf': 2,
+    'qsv': 2,
+    'vaapi': 2,
+    'videotoolbox': 2,
+}
+
+
+def default_worker_count():
+    """Pick a sensible number of concurrent ffmpeg jobs for this machine"""
+    cores = os.cpu_count() or 1
+    # libx264 stops scaling after a handful of threads per stream
+    return max(1, cores // 4)
+
+
+class Job:
+    """A single unit of work handed to the scheduler"""
+
+    def __init__(self, job_id, backend, payload):
+        self.job_id = job_id
+        self.backend = backend
+        self.payload = payload
+        self.status = 'queued'
+        self.error = None
+        self.result = None
+        self.queued = None
+        self.started = None
+        self.finished = None
+        # Stops the job's ffmpeg processes when the job is cancelled
+        self.cancel_token = CancelToken()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+class JobScheduler:
+    """Run jobs on a worker pool with a separate slot limit per encoder backend
+
+    ``runner`` is called with each Job from a worker thread. Any exception it
+    raises marks that job as failed without affecting the rest of the queue;
+    Cancelled marks it cancelled. Runners pass ``job.cancel_token`` to the
+    processes they start so running jobs can be cancelled too.
+    """
+
+    def __init__(self, runner, max_workers=None, backend_slots=None,
+                 on_job_start=None, on_job_done=None, order_key=None):
+        self.runner = runner
+        self.max_workers = max_workers or default_worker_count()
+        self.backend_slots = dict(DEFAULT_BACKEND_SLOTS)
+        if backend_slots:
+            self.backend_slots.update(backend_slots)
+        self.on_job_start = on_job_start
+        self.on_job_done = on_job_done
+        # Sort key of the queue, e.g. longest predicted job first; None keeps FIFO
+        self.order_key = order_key
+
+        # Jobs allowed to run at once; may be lowered below the pool size at runtime
+        self.active_limit = self.max_workers
+        # Temporary cap on top of the active limit, e.g. while the system is busy
+        self.throttle_limit = None
+
+        self.jobs = []
+        self._pending = []
+        self._running = {}
+        self._cond = threading.Condition()
+        self._workers = []
+        self._stopped = False
+        self._closed = False
+        self._paused = False
+
+    def submit(self, job):
+        """Queue a job for execution"""
+        return self.submit_many([job])[0]
+
+    def submit_many(self, jobs):
+        """Queue several jobs at once"""
+        now = time.monotonic()
+        for job in jobs:
+            job.queued = now
+        with self._cond:
+            self.jobs.extend(jobs)
+            self._pending.extend(jobs)
+            if self.order_key:
+                # Stable, so equal jobs keep their submission order
+                self._pending.sort(key=self.order_key)
+            self._cond.notify_all()
+        return jobs
+
+    def start(self):
+        """Start the worker threads"""
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f"encode-worker-{i}")
+            worker.start()
+            self._workers.append(worker)
+
+    def close(self):
+        """Signal that no more jobs will be submitted"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stop(self, cancel_running=False, grace=STOP_GRACE):
+        """Cancel all queued jobs, and the running ones with ``cancel_running``
+
+        Running jobs get ``grace`` seconds to exit before they are killed;
+        otherwise they are allowed to finish. Dropped jobs are reported to
+        ``on_job_done`` like those cancelled one at a time.
+        """
+        with self._cond:
+            self._stopped = True
+            dropped = list(self._pending)
+            for job in dropped:
+                job.status = 'cancelled'
+            self._pending.clear()
+            running = [job for job in self.jobs if job.status == 'running']
+            self._cond.notify_all()
+        if cancel_running:
+            for job in running:
+                job.cancel_token.cancel(grace)
+        if self.on_job_done:
+            for job in dropped:
+                self.on_job_done(job)
+
+    def cancel(self, job, grace=STOP_GRACE):
+        """Cancel one job: drop it from the queue, or stop it if it is running
+
+        Returns False when the job had already finished.
+        """
+        with self._cond:
+            if job in self._pending:
+                self._pending.remove(job)
+                job.status = 'cancelled'
+                dropped = True
+            elif job.status == 'running':
+                dropped = False
+            else:
+                return False
+        if dropped:
+            if self.on_job_done:
+                self.on_job_done(job)
+        else:
+            job.cancel_token.cancel(grace)
+        return True
+
+    def pause(self):
+        """Start no new jobs until resume(); running jobs carry on"""
+        with self._cond:
+            self._paused = True
+
+    def resume(self):
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def set_active_limit(self, limit):
+        """Change how many jobs may run at once, between 1 and the pool size"""
+        with self._cond:
+            self.active_limit = max(1, min(self.max_workers, limit))
+            self._cond.notify_all()
+
+    def throttle(self, limit):
+        """Temporarily cap concurrent jobs at ``limit``; None lifts the cap"""
+        with self._cond:
+            self.throttle_limit = limit
+            self._cond.notify_all()
+
+    @property
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    @property
+    def pending_jobs(self):
+        """Queued jobs in the order they will start"""
+        with self._cond:
+            return list(self._pending)
+
+    @property
+    def running_jobs(self):
+        with self._cond:
+            return [job for job in self.jobs if job.status == 'running']
+
+    @property
+    def running_count(self):
+        with self._cond:
+            return sum(self._running.values())
+
+    def wait(self):
+        """Block until every worker has exited"""
+        for worker in self._workers:
+            worker.join()
+
+    def run(self, jobs):
+        """Submit jobs, process them all and return the summary"""
+        for job in jobs:
+            self.submit(job)
+        self.close()
+        self.start()
+        self.wait()
+        return self.summary()
+
+    def _slot_free(self, backend):
+        limit = self.backend_slots.get(backend)
+        if limit is None:
+            return True
+        return self._running.get(backend, 0) < limit
+
+    def _next_job(self):
+        """Take the first queued job whose backend has a free slot"""
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return None
+                if self._paused:
+                    if self._closed and not self._pending:
+                        return None
+                    self._cond.wait()
+                    continue
+                limit = min(self.active_limit, self.throttle_limit or self.active_limit)
+                if sum(self._running.values()) >= limit:
+                    self._cond.wait()
+                    continue
+                for index, job in enumerate(self._pending):
+                    if self._slot_free(job.backend):
+                        del self._pending[index]
+                        self._running[job.backend] = self._running.get(job.backend, 0) + 1
+                        job.status = 'running'
+                        return job
+                if self._closed and not self._pending:
+                    return None
+                self._cond.wait()
+
+    def _release(self, job):
+        with self._cond:
+            self._running[job.backend] -= 1
+            self._cond.notify_all()
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            job.started = time.monotonic()
+            if self.on_job_start:
+                self.on_job_start(job)
+            try:
+                job.cancel_token.check()
+                job.result = self.runner(job)
+                job.status = 'done'
+            except Cancelled:
+                job.status = 'cancelled'
+            except Exception as e:
+                # Isolate the failure to this job and keep the queue moving
+                job.status = 'failed'
+                job.error = str(e) or traceback.format_exc(limit=1)
+            finally:
+                job.finished = time.monotonic()
+                self._release(job)
+
+            if self.on_job_done:
+                self.on_job_done(job)
+
+    def summary(self):
+        """Aggregate job outcomes for reporting"""
+        counts = {'done': 0, 'failed': 0, 'cancelled': 0, 'queued': 0, 'running': 0}
+        for job in self.jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            'total': len(self.jobs),
+            'succeeded': counts['done'],
+            'failed': counts['failed'],
+            'cancelled': counts['cancelled'] + counts['queued'],
+            'failures': [(job.job_id, job.error) for job in self.jobs if job.status == 'failed'],
+        }
@@ -0,0 +1,205 @@
+import array
+import math
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Audio analysis runs on mono 8 kHz PCM in 50 ms windows
+ANALYSIS_RATE = 8000
+WINDOW_SECONDS = 0.05
+
+# Windows quieter than this (dBFS) count as silence
+SILENCE_THRESHOLD_DB = -35.0
+# Shorter pauses keep the speech speed
+MIN_SILENCE_SECONDS = 0.75
+# Speech speed kept on each side of a silent stretch so words are not clipped
+SILENCE_PADDING = 0.15
+# Merge the shortest segments once a map has more than this many
+MAX_SEGMENTS = 400
+
+FLOOR_DB = -100.0
+
+
+def _window_levels(data, window_samples):
+    """RMS level in dBFS of each whole window of 16-bit little-endian samples"""
+    if numpy is not None:
+        samples = numpy.frombuffer(data, dtype='<i2').astype(numpy.float32)
+        power = numpy.mean(numpy.square(samples.reshape(-1, window_samples)), axis=1)
+        levels = 10 * numpy.log10(numpy.maximum(power, 1e-10) / (32768.0 * 32768.0))
+        return numpy.maximum(levels, FLOOR_DB).round(1).tolist()
+
+    samples = array.array('h', data)
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    levels = []
+    for start in range(0, len(samples), window_samples):
+        window = samples[start:start + window_samples]
+        power = math.fsum(value * value for value in window) / window_samples
+        levels.append(round(max(FLOOR_DB, 10 * math.log10(max(power, 1e-10) / 1073741824.0)), 1))
+    return levels
+
+
+def analyze_loudness(path, ffmpeg='ffmpeg', window=WINDOW_SECONDS, rate=ANALYSIS_RATE,
+                     read_size=1 << 16):
+    """Stream the audio track as mono PCM and return the level of each window
+
+    Only the audio stream is decoded, and the PCM is consumed in fixed-size
+    reads, so memory stays bounded whatever the input length. Levels are in
+    dBFS; an input without audio gives an empty list.
+    """
+    cmd = [ffmpeg, '-nostdin', '-v', 'error', '-i', str(path), '-map', '0:a:0?',
+           '-vn', '-sn', '-dn', '-ac', '1', '-ar', str(rate), '-f', 's16le', 'pipe:1']
+    window_samples = max(1, round(rate * window))
+    window_bytes = window_samples * 2
+    read_size = max(window_bytes, read_size - read_size % window_bytes)
+    levels = []
+    pending = b''
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = process.stdout.read(read_size)
+            if not data:
+                break
+            if pending:
+                data = pending + data
+            usable = len(data) - len(data) % window_bytes
+            pending = data[usable:]
+            if usable:
+                levels.extend(_window_levels(data[:usable], window_samples))
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    return levels
+
+
+def build_speed_map(levels, speech_speed, silent_speed, window=WINDOW_SECONDS,
+                    threshold=SILENCE_THRESHOLD_DB, min_silence=MIN_SILENCE_SECONDS,
+                    padding=SILENCE_PADDING, max_segments=MAX_SEGMENTS):
+    """Turn window levels into ``[start, end, speed]`` segments covering the input
+
+    Silent stretches of at least ``min_silence`` seconds, less ``padding``
+    on each side, play at ``silent_speed``; everything else at
+    ``speech_speed``.
+    """
+    total = len(levels) * window
+    if not levels:
+        return []
+    silences = []
+    run_start = None
+    for index, level in enumerate(levels + [0.0]):
+        if level < threshold:
+            if run_start is None:
+                run_start = index
+        elif run_start is not None:
+            start, end = run_start * window + padding, index * window - padding
+            # Leading and trailing silence needs no speech margin towards the edge
+            if run_start == 0:
+                start = 0.0
+            if index == len(levels):
+                end = total
+            if end - start >= min_silence:
+                silences.append((start, end))
+            run_start = None
+
+    segments = []
+    position = 0.0
+    for start, end in silences:
+        if start > position:
+            segments.append([position, start, speech_speed])
+        segments.append([start, end, silent_speed])
+        position = end
+    if position < total:
+        segments.append([position, total, speech_speed])
+
+    # Very long graphs are slow to build; fold the shortest silences back into speech
+    while len(segments) > max_segments:
+        shortest = min((index for index, segment in enumerate(segments)
+                        if segment[2] == silent_speed),
+                       key=lambda index: segments[index][1] - segments[index][0])
+        segments[shortest][2] = speech_speed
+        segments = merge_segments(segments)
+    return [[round(start, 3), round(end, 3), speed] for start, end, speed in segments]
+
+
+def merge_segments(segments):
+    """Join neighbouring segments that play at the same speed"""
+    merged = []
+    for start, end, speed in segments:
+        if merged and merged[-1][2] == speed:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end, speed])
+    return merged
+
+
+def clip_speed_map(segments, start=None, duration=None):
+    """The part of a map inside an input window, shifted to start at zero"""
+    start = start or 0.0
+    stop = start + duration if duration else None
+    clipped = []
+    for seg_start, seg_end, speed in segments:
+        seg_start = max(seg_start, start)
+        if stop is not None:
+            seg_end = min(seg_end, stop)
+        if seg_end > seg_start:
+            clipped.append([seg_start - start, seg_end - start, speed])
+    return clipped
+
+
+def mapped_duration(segments, duration=None):
+    """Output duration of a speed map; input past its last segment keeps that speed"""
+    if not segments:
+        return None
+    output = sum((end - start) / speed for start, end, speed in segments)
+    if duration and duration > segments[-1][1]:
+        output += (duration - segments[-1][1]) / segments[-1][2]
+    return output
+
+
+def speed_map_for(video, ffmpeg='ffmpeg', cache=None):
+    """Analyse a video's audio (or reuse cached levels) and return its speed map"""
+    levels = cache.get_levels(video['path'], WINDOW_SECONDS) if cache else None
+    if levels is None:
+        levels = analyze_loudness(video['path'], ffmpeg)
+        if cache:
+            cache.put_levels(video['path'], WINDOW_SECONDS, levels)
+    return build_speed_map(levels, float(video['speed']), float(video['silent_speed']),
+                           threshold=float(video.get('silence_threshold', SILENCE_THRESHOLD_DB)))
+
+
+def attach_speed_maps(videos, ffmpeg='ffmpeg', max_workers=4):
+    """Add a ``speed_map`` to each video asking for variable speed
+
+    Analyses run concurrently. Videos with output variants, and videos
+    whose audio cannot be analysed, keep the uniform speech speed.
+    """
+    wanted = [video for video in videos if video.get('silent_speed')
+              and not video.get('speed_map') and not video.get('variants')]
+    if not wanted:
+        return
+    from speedup.probe import ProbeCache
+    try:
+        cache = ProbeCache()
+    except Exception:
+        cache = None
+
+    def analyse(video):
+        try:
+            video['speed_map'] = speed_map_for(video, ffmpeg, cache) or None
+        except (subprocess.CalledProcessError, OSError):
+            video['speed_map'] = None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(analyse, wanted))
+    finally:
+        if cache:
+            cache.close()
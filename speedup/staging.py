@@ -0,0 +1,399 @@
+import ctypes
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from speedup.paths import cache_dir
+from speedup.progress import Cancelled
+
+# Inputs copied ahead of the running encodes
+DEFAULT_DEPTH = 2
+# Local space for staged inputs and outputs waiting for upload
+DEFAULT_BUDGET_MB = 20 * 1024
+# Read and write size of staging copies; large sequential requests suit SMB and NFS
+COPY_BUFFER = 8 * 1024 * 1024
+# Free space left on the scratch volume whatever the budget
+FREE_SPACE_RESERVE = 1024 * 1024 * 1024
+
+# Filesystem types of network mounts in /proc/mounts
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', 'afs', '9p',
+                       'fuse.sshfs', 'fuse.rclone', 'davfs', 'glusterfs', 'ceph'}
+DRIVE_REMOTE = 4
+
+STAGE_MODES = ['off', 'auto', 'always']
+
+# How often the threads of a watched process are checked for blocked I/O
+IO_WAIT_INTERVAL = 0.1
+
+
+def scratch_root():
+    return cache_dir() / 'scratch'
+
+
+def _mount_types():
+    """Mount points and their filesystem types, longest mount point first"""
+    mounts = []
+    with open('/proc/mounts', encoding='utf-8') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 3:
+                # Spaces in mount points are escaped as \040
+                mounts.append((fields[1].replace('\\040', ' '), fields[2]))
+    return sorted(mounts, key=lambda mount: len(mount[0]), reverse=True)
+
+
+def is_network_path(path):
+    """Whether a path is on an SMB, NFS or other network mount (False if unknown)"""
+    path = os.path.abspath(path)
+    if os.name == 'nt':
+        if path.startswith('\\\\'):
+            return True
+        root = os.path.splitdrive(path)[0] + '\\'
+        return ctypes.windll.kernel32.GetDriveTypeW(root) == DRIVE_REMOTE
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        mounts = _mount_types()
+    except OSError:
+        return False
+    path = os.path.realpath(path)
+    for mount_point, fs_type in mounts:
+        if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+            return fs_type in NETWORK_FILESYSTEMS
+    return False
+
+
+def bulk_copy(source, destination, buffer_size=COPY_BUFFER, keep_going=None):
+    """Copy a file with large sequential reads; False if ``keep_going()`` stopped it
+
+    A stopped copy leaves no destination file behind.
+    """
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    try:
+        with open(source, 'rb', buffering=0) as src, open(destination, 'wb') as dst:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                if keep_going and not keep_going():
+                    break
+                count = src.readinto(buffer)
+                if not count:
+                    return True
+                dst.write(view[:count])
+    except BaseException:
+        _remove(destination)
+        raise
+    _remove(destination)
+    return False
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class IOWaitMonitor:
+    """Time the watched processes spend blocked on I/O
+
+    Every ``interval`` a process with a thread in uninterruptible sleep
+    (state D, which covers disk reads as well as SMB and NFS requests) is
+    counted as waiting. Only available on Linux; ``seconds`` is None
+    elsewhere.
+    """
+
+    def __init__(self, interval=IO_WAIT_INTERVAL):
+        self.interval = interval
+        self.available = os.path.isdir('/proc/self/task')
+        self._waiting = 0
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def seconds(self):
+        if not self.available:
+            return None
+        with self._lock:
+            return round(self._waiting * self.interval, 3)
+
+    def watch(self, process):
+        """Sample a freshly started process until it exits or the monitor stops"""
+        if self.available:
+            threading.Thread(target=self._sample, args=(process.pid,), daemon=True).start()
+
+    def stop(self):
+        self._done.set()
+
+    def _sample(self, pid):
+        task_dir = f"/proc/{pid}/task"
+        while not self._done.wait(self.interval):
+            try:
+                tasks = os.listdir(task_dir)
+            except OSError:
+                return
+            for task in tasks:
+                try:
+                    with open(f"{task_dir}/{task}/stat", encoding='utf-8') as f:
+                        stat = f.read()
+                except OSError:
+                    continue
+                state = stat[stat.rfind(')') + 2:stat.rfind(')') + 3]
+                if state == 'Z':
+                    return
+                if state == 'D':
+                    with self._lock:
+                        self._waiting += 1
+                    break
+
+
+class ScratchStager:
+    """Stage inputs and outputs on a local scratch disk around the encodes
+
+    Inputs the queue will encode next (``prefetch``) are copied to scratch
+    one at a time, with large sequential reads, while the current encodes
+    run; up to ``depth`` inputs are staged ahead, and never more than
+    ``budget_mb`` of scratch is used. An encode starting on an input that
+    is still being copied waits for the copy; one whose input was never
+    staged reads the original. Outputs are written to scratch and uploaded
+    to their destination in the background. Staged files are deleted once
+    their job or upload is done. With mode 'auto' only inputs and output
+    folders on network mounts are staged; 'always' stages everything.
+    """
+
+    def __init__(self, directory=None, budget_mb=DEFAULT_BUDGET_MB, depth=DEFAULT_DEPTH,
+                 mode='auto', buffer_size=COPY_BUFFER):
+        if mode not in STAGE_MODES[1:]:
+            raise ValueError(f"Unknown staging mode {mode!r}")
+        self.root = Path(directory) if directory else None
+        self.directory = None
+        self.budget = budget_mb * 1024 * 1024
+        self.depth = depth
+        self.mode = mode
+        self.buffer_size = buffer_size
+        self._wanted = []
+        self._staged = {}
+        self._copying = None
+        self._in_use = {}
+        self._pending_upload = 0
+        self._uploads = []
+        self._network = {}
+        self._stats = {'prefetched': 0, 'prefetched_bytes': 0, 'prefetch_seconds': 0.0,
+                       'hits': 0, 'waits': 0, 'misses': 0, 'uploaded': 0,
+                       'uploaded_bytes': 0, 'upload_seconds': 0.0, 'upload_failures': 0}
+        self._closed = False
+        self._cond = threading.Condition()
+        self._uploader = None
+        self._thread = None
+
+    def start(self):
+        """Create this batch's scratch directory and start prefetching"""
+        root = self.root or scratch_root()
+        root.mkdir(parents=True, exist_ok=True)
+        self.directory = Path(tempfile.mkdtemp(prefix='batch-', dir=root))
+        (self.directory / 'inputs').mkdir()
+        (self.directory / 'outputs').mkdir()
+        self._uploader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload')
+        self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self._thread.start()
+
+    def stages(self, path):
+        """Whether a file or folder is staged under the current mode"""
+        if self.mode == 'always':
+            return True
+        path = str(path)
+        if path not in self._network:
+            self._network[path] = is_network_path(path)
+        return self._network[path]
+
+    def _used(self):
+        return sum(self._staged.values()) + self._pending_upload
+
+    def prefetch(self, paths):
+        """Stage the first ``depth`` of ``paths``, the queued inputs in order"""
+        wanted = []
+        for path in paths:
+            if len(wanted) == self.depth:
+                break
+            path = str(path)
+            if path not in wanted and self.stages(path):
+                wanted.append(path)
+        with self._cond:
+            self._wanted = wanted
+            self._cond.notify_all()
+
+    def local_path(self, path):
+        name = hashlib.sha1(path.encode()).hexdigest()[:16]
+        return self.directory / 'inputs' / f"{name}{Path(path).suffix}"
+
+    def _evict(self, path):
+        if path == self._copying:
+            # The copy thread notices and deletes what it has written
+            self._copying = None
+        self._staged.pop(path, None)
+        _remove(self.local_path(path))
+
+    def _next_copy(self):
+        """The first wanted input that is not staged yet and fits, or None"""
+        for path in self._wanted:
+            if path in self._staged or path in self._in_use:
+                continue
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            free = shutil.disk_usage(self.directory).free - FREE_SPACE_RESERVE
+            if self._used() + size > self.budget or size > free:
+                # Later inputs would overtake this one; wait for space instead
+                return None
+            return path, size
+        return None
+
+    def _prefetch_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._next_copy() is None:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                path, size = self._next_copy()
+                self._copying = path
+                self._staged[path] = size
+            local = self.local_path(path)
+            started = time.perf_counter()
+            try:
+                copied = bulk_copy(path, local, self.buffer_size,
+                                   keep_going=lambda: self._copying == path and not self._closed)
+            except OSError:
+                copied = False
+            with self._cond:
+                self._copying = None
+                if copied and path in self._staged:
+                    self._stats['prefetched'] += 1
+                    self._stats['prefetched_bytes'] += size
+                    self._stats['prefetch_seconds'] += time.perf_counter() - started
+                else:
+                    self._evict(path)
+                    # A failed copy is not retried; the encode reads the original
+                    if path in self._wanted:
+                        self._wanted.remove(path)
+                self._cond.notify_all()
+
+    def acquire(self, path, cancel=None):
+        """Path an encode should read ``path`` from, waiting for a copy in progress"""
+        path = str(path)
+        with self._cond:
+            if path == self._copying:
+                self._stats['waits'] += 1
+                while path == self._copying:
+                    if cancel and cancel.cancelled:
+                        raise Cancelled("cancelled")
+                    self._cond.wait(0.25)
+            if path not in self._staged:
+                if self.stages(path):
+                    self._stats['misses'] += 1
+                return path
+            self._stats['hits'] += 1
+            self._in_use[path] = self._in_use.get(path, 0) + 1
+            return str(self.local_path(path))
+
+    def release(self, path):
+        """Evict an input's staged copy once no encode uses it or is queued for it"""
+        path = str(path)
+        with self._cond:
+            if path in self._in_use:
+                self._in_use[path] -= 1
+                if self._in_use[path] > 0:
+                    return
+                del self._in_use[path]
+            if path in self._staged and path not in self._wanted:
+                self._evict(path)
+            self._cond.notify_all()
+
+    def output_path(self, name):
+        """A scratch path to encode an output to before it is uploaded"""
+        handle, path = tempfile.mkstemp(suffix=f"-{Path(name).name}", dir=self.directory / 'outputs')
+        os.close(handle)
+        return path
+
+    def upload(self, files, on_done):
+        """Copy ``(local, partial, output)`` files in the background
+
+        Each local file is copied to ``partial``, on the destination volume,
+        renamed to ``output`` and deleted. ``on_done(error)`` is called from
+        the upload thread with None or the exception that stopped it.
+        """
+        size = sum(os.path.getsize(local) for local, _, _ in files)
+        with self._cond:
+            self._pending_upload += size
+
+        def run():
+            started = time.perf_counter()
+            error = None
+            try:
+                for local, partial, output in files:
+                    bulk_copy(local, partial, self.buffer_size)
+                    os.replace(partial, output)
+            except Exception as e:
+                error = e
+            finally:
+                for local, partial, _ in files:
+                    _remove(local)
+                    if error:
+                        _remove(partial)
+                with self._cond:
+                    self._pending_upload -= size
+                    if error:
+                        self._stats['upload_failures'] += 1
+                    else:
+                        self._stats['uploaded'] += len(files)
+                        self._stats['uploaded_bytes'] += size
+                        self._stats['upload_seconds'] += time.perf_counter() - started
+                    self._cond.notify_all()
+            on_done(error)
+
+        future = self._uploader.submit(run)
+        with self._cond:
+            self._uploads.append(future)
+        return future
+
+    def drain(self):
+        """Wait for every queued upload"""
+        while True:
+            with self._cond:
+                uploads, self._uploads = self._uploads, []
+            if not uploads:
+                return
+            for future in uploads:
+                future.result()
+
+    def report(self):
+        """Prefetch and upload counts, bytes and throughput of the batch"""
+        with self._cond:
+            stats = dict(self._stats)
+        for kind, size, seconds in (('prefetch', 'prefetched_bytes', 'prefetch_seconds'),
+                                    ('upload', 'uploaded_bytes', 'upload_seconds')):
+            stats[seconds] = round(stats[seconds], 3)
+            stats[f"{kind}_mb_per_second"] = (round(stats[size] / 1e6 / stats[seconds], 1)
+                                              if stats[seconds] else None)
+        return stats
+
+    def close(self):
+        """Finish the uploads, stop prefetching and delete the scratch directory"""
+        if self._thread is None:
+            return
+        self.drain()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._uploader.shutdown()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._thread = None
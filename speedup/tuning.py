@@ -0,0 +1,230 @@
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from speedup.paths import cache_dir
+
+# Relative libx264 cost per frame of each quality level's preset
+PRESET_COST = {"Low": 0.4, "Medium": 0.8, "High": 1.0, "Very High": 1.8}
+
+# Load average relative to the core count outside which concurrency is adjusted
+OVERLOADED = 1.15
+UNDERUSED = 0.75
+
+
+def useful_threads(height=None, quality="High"):
+    """Threads a single libx264 encode keeps busy at a frame height
+
+    Frame threading scales with the number of macroblock rows, so small
+    frames saturate early; slower presets do more work per row and use a
+    few more threads productively.
+    """
+    threads = (height or 720) / 180 * min(1.5, max(0.75, PRESET_COST.get(quality, 1.0)))
+    return max(2, min(16, round(threads)))
+
+
+def plan_concurrency(cores, height=None, quality="High", calibration=None):
+    """Return ``(jobs, threads)`` that keep every core busy without oversubscribing
+
+    With a calibration, the thread count that maximises the measured
+    aggregate frame rate ``(cores // threads) * fps(threads)`` is used,
+    limited to what the batch's resolution can use.
+    """
+    cap = min(cores, useful_threads(height, quality))
+    per_job = cap
+    if calibration and calibration.get('fps'):
+        measured = {int(threads): fps for threads, fps in calibration['fps'].items()
+                    if int(threads) <= cap}
+        if measured:
+            per_job = max(measured, key=lambda threads: (cores // threads) * measured[threads])
+    jobs = max(1, cores // per_job)
+    return jobs, max(1, cores // jobs)
+
+
+def calibration_path():
+    return cache_dir() / 'tuning.json'
+
+
+def calibration_key(ffmpeg, cores):
+    path = shutil.which(ffmpeg) or ffmpeg
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}:{cores}"
+
+
+def load_calibration(ffmpeg='ffmpeg', cores=None):
+    """Return the saved calibration for this ffmpeg build and core count, or None"""
+    key = calibration_key(ffmpeg, cores or os.cpu_count() or 1)
+    try:
+        with open(calibration_path(), encoding='utf-8') as f:
+            return json.load(f).get(key)
+    except (OSError, ValueError):
+        return None
+
+
+def calibrate(source=None, ffmpeg='ffmpeg', ffprobe='ffprobe', cores=None, seconds=10,
+              size='1280x720', quality="High", on_step=None):
+    """Measure single-job encode fps at increasing thread counts and save it
+
+    Without a ``source`` a short synthetic clip of ``size`` is generated.
+    """
+    from speedup.bench import synthetic_source
+    from speedup.engine import build_ffmpeg_command, make_video
+    from speedup.probe import probe_file
+    from speedup.progress import run_ffmpeg
+
+    cores = cores or os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 12, 16, cores} & set(range(1, cores + 1)))
+    fps = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        if source is None:
+            source = synthetic_source(Path(work_dir) / "calibrate.mp4", seconds, size,
+                                      ffmpeg=ffmpeg)
+        video = make_video(source, {'speed': 1.0, 'quality': quality, 'fps': "Keep Original"})
+        video['probe'] = probe_file(source, ffprobe)
+        height = (video['probe'].get('video') or {}).get('height')
+        for threads in counts:
+            cmd = build_ffmpeg_command(source, Path(work_dir) / "out.mp4", video,
+                                       threads=threads, ffmpeg=ffmpeg)
+            started = time.perf_counter()
+            reader = run_ffmpeg(cmd)
+            frames = reader.snapshot()['frame'] or 0
+            fps[str(threads)] = round(frames / (time.perf_counter() - started), 1)
+            if on_step:
+                on_step(threads, fps[str(threads)])
+
+    calibration = {'cores': cores, 'height': height, 'quality': quality, 'fps': fps,
+                   'created': time.time()}
+    path = calibration_path()
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+    entries[calibration_key(ffmpeg, cores)] = calibration
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    os.replace(tmp_path, path)
+    return calibration
+
+
+def load_average():
+    """One-minute load average, or None where the platform has none"""
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+class AutoTuner:
+    """Choose and adapt job concurrency and per-job threads during a batch
+
+    ``configure(videos)`` picks the starting point from the core count, the
+    batch's typical resolution and preset, and a calibration when one
+    exists. While jobs run, ``adjust(scheduler)`` lowers the number of
+    active jobs when the load average shows the CPU is oversubscribed and
+    raises it again when cores sit idle; each job's threads are then set
+    from the cores left per running job.
+    """
+
+    def __init__(self, cores=None, calibration=None, interval=15.0):
+        self.cores = cores or os.cpu_count() or 1
+        self.calibration = calibration
+        self.interval = interval
+        self.jobs, self.threads = plan_concurrency(self.cores, calibration=calibration)
+        self.configured = False
+        self.initial = {'jobs': self.jobs, 'threads': self.threads}
+        self.thread_cap = self.cores
+        self.adjustments = []
+        self._frames = {}
+        self._started = None
+        self._last_adjust = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def max_jobs(self):
+        """Upper bound on concurrent jobs, i.e. the worker pool size"""
+        return self.cores
+
+    def configure(self, videos):
+        """Pick the starting jobs and threads for a batch of videos"""
+        heights = [((video.get('probe') or {}).get('video') or {}).get('height')
+                   for video in videos]
+        heights = [height for height in heights if height]
+        qualities = [video.get('quality', "High") for video in videos] or ["High"]
+        height = statistics.median(heights) if heights else None
+        quality = max(set(qualities), key=qualities.count)
+        self.jobs, self.threads = plan_concurrency(self.cores, height, quality, self.calibration)
+        self.initial = {'jobs': self.jobs, 'threads': self.threads, 'height': height,
+                        'quality': quality}
+        self.thread_cap = min(self.cores, useful_threads(height, quality) * 2)
+        self.configured = True
+        return self.jobs, self.threads
+
+    def threads_for(self, running, pending=0):
+        """Threads for a job starting with ``running`` jobs active (itself included)
+
+        Cores are shared between the jobs expected to run alongside it, so
+        the last jobs of a batch get more threads than a full pool does.
+        """
+        expected = max(1, min(self.jobs, running + pending))
+        return max(1, min(self.thread_cap, self.cores // expected))
+
+    def observe(self, job, update):
+        """Record a progress update of a running job"""
+        with self._lock:
+            if self._started is None:
+                self._started = self._last_adjust = time.monotonic()
+            if update.get('frame') is not None:
+                self._frames[job.job_id] = update['frame']
+
+    def adjust(self, scheduler):
+        """Change the active job limit from the observed load, at most once per interval"""
+        now = time.monotonic()
+        load = load_average()
+        with self._lock:
+            if load is None or now - self._last_adjust < self.interval:
+                return
+            self._last_adjust = now
+            active = scheduler.active_limit
+            if load > self.cores * OVERLOADED and active > 1:
+                active -= 1
+            elif load < self.cores * UNDERUSED and scheduler.pending_count and active < self.max_jobs:
+                active += 1
+            else:
+                return
+            elapsed = now - (self._started or now)
+            fps = sum(self._frames.values()) / elapsed if elapsed > 0 else None
+            self.adjustments.append({'at': round(elapsed, 1), 'load': round(load, 2),
+                                     'jobs': active,
+                                     'aggregate_fps': round(fps, 1) if fps else None})
+            self.jobs = active
+        scheduler.set_active_limit(active)
+
+    def aggregate_fps(self):
+        """Output frames per second across all jobs since the batch started"""
+        with self._lock:
+            if self._started is None:
+                return None
+            elapsed = time.monotonic() - self._started
+            return round(sum(self._frames.values()) / elapsed, 1) if elapsed > 0 else None
+
+    def report(self):
+        """The chosen configuration, its adjustments and the measured throughput"""
+        return {
+            'cores': self.cores,
+            'jobs': self.jobs,
+            'threads': self.threads,
+            'initial': dict(self.initial),
+            'calibrated': bool(self.calibration),
+            'aggregate_fps': self.aggregate_fps(),
+            'adjustments': list(self.adjustments),
+        }
@@ -0,0 +1,247 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+from speedup.engine import SUPPORTED_FORMATS
+
+# inotify event masks (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_video(path):
+    return Path(path).suffix.lower() in SUPPORTED_FORMATS
+
+
+class PollingMonitor:
+    """Detect new files by re-reading only directories whose mtime changed
+
+    A directory's mtime changes whenever entries are added, removed or
+    renamed in it, so each poll costs one stat per directory plus a listing
+    of the directories that actually changed.
+    """
+
+    def __init__(self, roots):
+        self.roots = [str(root) for root in roots]
+        self._dir_mtimes = {}
+
+    def scan(self):
+        """Walk the trees once and return every file found"""
+        found = []
+        stack = list(self.roots)
+        while stack:
+            directory = stack.pop()
+            found.extend(self._list(directory, stack))
+        return found
+
+    def _list(self, directory, subdirs):
+        files = []
+        try:
+            self._dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in self._dir_mtimes:
+                            subdirs.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry.path)
+        except OSError:
+            self._dir_mtimes.pop(directory, None)
+        return files
+
+    def changed(self, timeout):
+        """Return files in directories that changed since the last poll"""
+        time.sleep(timeout)
+        found = []
+        stack = []
+        for directory, mtime in list(self._dir_mtimes.items()):
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                del self._dir_mtimes[directory]
+                continue
+            if current != mtime:
+                found.extend(self._list(directory, stack))
+        # New subdirectories are read in full the first time they are seen
+        while stack:
+            directory = stack.pop()
+            found.extend(self._list(directory, stack))
+        return found
+
+    def close(self):
+        pass
+
+
+class InotifyMonitor:
+    """Receive file events from the Linux kernel for whole directory trees"""
+
+    def __init__(self, roots):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.roots = [str(root) for root in roots]
+        self._watches = {}
+        self._poller = PollingMonitor(roots)
+
+    def _watch(self, directory):
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = directory
+
+    def scan(self):
+        """Watch every directory in the trees and return the files found"""
+        found = self._poller.scan()
+        for directory in self._poller._dir_mtimes:
+            self._watch(directory)
+        return found
+
+    def changed(self, timeout):
+        """Return files created, written or moved in since the last call"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        found = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; fall back to a full rescan
+                return self.scan()
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                if mask & IN_DELETE_SELF:
+                    self._watches.pop(wd, None)
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Catch files written before the watch was added
+                    stack = [path]
+                    while stack:
+                        subdir = stack.pop()
+                        self._watch(subdir)
+                        found.extend(self._poller._list(subdir, stack))
+            else:
+                found.append(path)
+        return found
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_monitor(roots, polling=False):
+    """Use inotify on Linux and fall back to polling elsewhere or on failure"""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyMonitor(roots)
+        except (OSError, AttributeError):
+            pass
+    return PollingMonitor(roots)
+
+
+class FolderWatcher:
+    """Feed fully written videos from watched folders into a callback
+
+    A file is handed to ``on_ready(path, defaults)`` once its size and mtime
+    have stayed the same for ``settle`` seconds. ``folders`` maps each input
+    directory to the default settings for videos found in it, and
+    ``is_done(path)`` reports files already processed in earlier runs.
+    Files under an ``exclude`` directory, such as the output folder when it
+    lies inside a watched folder, are never handed over.
+    """
+
+    def __init__(self, folders, on_ready, settle=5.0, poll_interval=2.0, polling=False,
+                 is_done=None, exclude=()):
+        self.folders = {os.path.abspath(folder): defaults or {}
+                        for folder, defaults in folders.items()}
+        self.exclude = [os.path.abspath(folder) for folder in exclude]
+        self.on_ready = on_ready
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.polling = polling
+        self.is_done = is_done or (lambda path: False)
+        self._pending = {}
+        self._handled = set()
+        self._stop = threading.Event()
+
+    def defaults_for(self, path):
+        """Settings of the deepest watched folder containing path"""
+        best = None
+        for folder in self.folders:
+            if path == folder or path.startswith(folder + os.sep):
+                if best is None or len(folder) > len(best):
+                    best = folder
+        return self.folders.get(best, {})
+
+    def excluded(self, path):
+        return any(path.startswith(folder + os.sep) for folder in self.exclude)
+
+    def _consider(self, paths):
+        for path in paths:
+            if path in self._handled or path in self._pending or not is_video(path):
+                continue
+            if Path(path).name.startswith('.') or self.excluded(path):
+                continue
+            self._pending[path] = None
+
+    def _check_pending(self):
+        """Hand over files whose size and mtime have settled"""
+        now = time.monotonic()
+        for path, last in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if last is None or last[0] != signature:
+                self._pending[path] = (signature, now)
+            elif now - last[1] >= self.settle and st.st_size > 0:
+                del self._pending[path]
+                self._handled.add(path)
+                if not self.is_done(path):
+                    self.on_ready(path, self.defaults_for(path))
+
+    def run(self):
+        """Watch until stop() is called"""
+        monitor = make_monitor(list(self.folders), self.polling)
+        try:
+            self._consider(monitor.scan())
+            while not self._stop.is_set():
+                # Wake up regularly while files are settling
+                timeout = min(self.poll_interval, self.settle) if self._pending else self.poll_interval
+                self._consider(monitor.changed(timeout))
+                self._check_pending()
+        finally:
+            monitor.close()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,46 @@
+"""Commands of chunked encodes; no ffmpeg needed"""
+import pytest
+
+from speedup import chunked
+from speedup.engine import make_video
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    """Commands encode_chunked runs, in the order they were started"""
+    ran = []
+    monkeypatch.setattr(chunked, 'find_keyframes', lambda path, ffprobe: [0.0, 100.0, 200.0])
+    monkeypatch.setattr(chunked, 'run_ffmpeg', lambda cmd, *args, **kwargs: ran.append(cmd))
+    return ran
+
+
+def encode(tmp_path, extension):
+    video = make_video('in.mp4', {'speed': 2})
+    video['probe'] = {'duration': 300.0,
+                      'video': {'codec': 'h264', 'width': 1920, 'height': 1080, 'fps': 30.0},
+                      'audio': {'codec': 'aac', 'sample_rate': 48000}}
+    return chunked.encode_chunked('in.mp4', tmp_path / f"out{extension}", video, 3,
+                                  max_workers=1)
+
+
+def audio_command(commands):
+    return next(cmd for cmd in commands if '-vn' in cmd)
+
+
+def test_chunked_audio_uses_the_final_containers_codec(tmp_path, commands):
+    encode(tmp_path, '.avi')
+    audio = audio_command(commands)
+    assert audio[-1].endswith('audio.mka')
+    assert audio[audio.index('-c:a') + 1] == 'libmp3lame'
+    # The join copies the audio as encoded
+    join = commands[-1]
+    assert join[join.index('-c') + 1] == 'copy'
+    assert audio[-1] in join
+
+
+def test_chunked_audio_in_mp4_is_aac(tmp_path, commands):
+    result = encode(tmp_path, '.mp4')
+    assert result['chunks'] == 3
+    audio = audio_command(commands)
+    assert audio[audio.index('-c:a') + 1] == 'aac'
+    assert commands[-1][commands[-1].index('-movflags') + 1] == '+faststart'
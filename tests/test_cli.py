@@ -0,0 +1,31 @@
+"""Headless batch command; no ffmpeg needed"""
+import json
+
+from speedup import speedmap
+from speedup.cli import main
+
+
+def test_dry_run_writes_nothing_and_decodes_nothing(tmp_path, monkeypatch, capsys):
+    cache = tmp_path / 'cache'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache))
+    analysed = []
+    monkeypatch.setattr(speedmap, 'analyze_loudness',
+                        lambda path, *args, **kwargs: analysed.append(path) or [])
+    video = tmp_path / 'talk.mp4'
+    video.write_bytes(b'not really a video')
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(json.dumps({'jobs': [{'input': str(video), 'speed': 2}]}))
+    output = tmp_path / 'out'
+    output.mkdir()
+
+    assert main(['batch', str(manifest), '-o', str(output), '--dry-run', '--no-probe',
+                 '--silent-speed', '6', '--ffmpeg', 'false', '--ffprobe', 'false']) == 0
+
+    record = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert record['status'] == 'planned'
+    assert record['input'] == str(video)
+    assert record['output'] == str(output / 'talk_2.0x.mp4')
+    assert analysed == []
+    # No journal in the output folder and no cache entries
+    assert list(output.iterdir()) == []
+    assert [path for path in cache.rglob('*') if path.is_file()] == []
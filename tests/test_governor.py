@@ -0,0 +1,93 @@
+"""Thread budget shares and process limits of the resource governor; no ffmpeg needed"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from speedup.governor import ResourceGovernor
+from speedup.progress import Cancelled, CancelToken, run_ffmpeg
+from speedup.scheduler import Job, JobScheduler
+
+
+def test_share_follows_expected_concurrency():
+    governor = ResourceGovernor(thread_budget=8)
+    # First of a full batch on four workers
+    assert governor.threads_for(1, 9, limit=4) == 2
+    # Last jobs of the batch share the budget between fewer jobs
+    assert governor.threads_for(2, 0, limit=4) == 4
+    assert governor.threads_for(1, 0, limit=4) == 8
+    assert governor.threads_for(1, 3) == 2
+    assert ResourceGovernor(thread_budget=2).threads_for(1, 9, limit=4) == 1
+    assert ResourceGovernor().threads_for(1, 9, limit=4) is None
+
+
+def test_claims_never_exceed_budget():
+    governor = ResourceGovernor(thread_budget=8)
+    assert governor.claim('a', 6) == 6
+    # A job queued after the first one started only gets what is left
+    assert governor.claim('b', 4) == 2
+    threading.Timer(0.05, governor.release, args=('a',)).start()
+    # With the budget all held, the next claim waits for a release
+    assert governor.claim('c', 4) == 4
+
+
+def test_claim_waiting_for_threads_can_be_cancelled():
+    governor = ResourceGovernor(thread_budget=2)
+    governor.claim('a', 2)
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+    with pytest.raises(Cancelled):
+        governor.claim('b', 1, token)
+
+
+def run_batch(governor, jobs, workers, late=0):
+    """Run sleeping jobs the way the engine shares threads; peak threads in use"""
+    lock = threading.Lock()
+    in_use = {'now': 0, 'peak': 0}
+    scheduler = None
+
+    def runner(job):
+        share = governor.threads_for(scheduler.running_count, scheduler.pending_count,
+                                     scheduler.active_limit)
+        threads = governor.claim(job.job_id, share)
+        with lock:
+            in_use['now'] += threads
+            in_use['peak'] = max(in_use['peak'], in_use['now'])
+        time.sleep(0.02 + 0.01 * (job.job_id % 3))
+        with lock:
+            in_use['now'] -= threads
+        governor.release(job.job_id)
+
+    scheduler = JobScheduler(runner, max_workers=workers)
+    scheduler.submit_many([Job(i, 'cpu', {}) for i in range(jobs)])
+    scheduler.start()
+    for i in range(late):
+        # Jobs arriving while others run, as a folder watch submits them
+        time.sleep(0.015)
+        scheduler.submit(Job(jobs + i, 'cpu', {}))
+    scheduler.close()
+    scheduler.wait()
+    assert scheduler.summary()['succeeded'] == jobs + late
+    return in_use['peak']
+
+
+def test_concurrent_shares_stay_within_budget():
+    for jobs, workers, late in ((10, 4, 0), (3, 4, 0), (5, 3, 0), (1, 4, 6), (2, 4, 5)):
+        assert run_batch(ResourceGovernor(thread_budget=8), jobs, workers, late) <= 8
+    # More workers than a budget of 2 can give a thread each
+    assert run_batch(ResourceGovernor(thread_budget=2), 6, 4) <= 2
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="limits are set before exec on POSIX only")
+def test_limits_apply_before_exec(tmp_path):
+    governor = ResourceGovernor(nice=15, memory_limit_mb=2048)
+    seen = tmp_path / 'seen.txt'
+    # The child reports the priority and cap it started with, before doing anything else
+    code = ("import os, resource, sys; open(sys.argv[1], 'w').write("
+            "f'{os.getpriority(os.PRIO_PROCESS, 0)} {resource.getrlimit(resource.RLIMIT_AS)[0]}')")
+    run_ffmpeg([sys.executable, '-c', code, str(seen)], preexec=governor.preexec(),
+               on_spawn=lambda process: governor.apply(process, 'child'))
+    assert seen.read_text() == f"15 {2048 * 1024 * 1024}"
+    assert ResourceGovernor(thread_budget=4).preexec() is None
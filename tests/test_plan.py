@@ -0,0 +1,122 @@
+"""Filter graphs and stream plans for the common cases; no ffmpeg needed"""
+from speedup.engine import (build_ffmpeg_command, build_variants_command, expand_variants,
+                            make_video, plan_streams)
+
+
+def probe(fps=30.0, height=1080, audio=True, codec='h264'):
+    return {
+        'duration': 60.0,
+        'video': {'codec': codec, 'width': height * 16 // 9, 'height': height, 'fps': fps},
+        'audio': {'codec': 'aac', 'sample_rate': 48000} if audio else None,
+    }
+
+
+def video(probed=None, **settings):
+    video = make_video('in.mp4', dict({'speed': 2}, **settings))
+    video['probe'] = probed or probe()
+    return video
+
+
+def option(cmd, name):
+    """Value following an option in a command"""
+    return cmd[cmd.index(name) + 1]
+
+
+def test_copy_at_1x_when_asked():
+    settings = video(speed=1, fps="30", stream_copy=True)
+    plan = plan_streams(settings, container='.mp4')
+    assert plan['video'] == {'action': 'copy'}
+    assert plan['audio'] == {'action': 'copy'}
+    cmd = build_ffmpeg_command('in.mp4', 'out.mp4', settings)
+    assert option(cmd, '-c:v') == 'copy'
+    assert option(cmd, '-c:a') == 'copy'
+    assert '-filter:v' not in cmd
+
+
+def test_1x_reencodes_at_chosen_quality_by_default():
+    cmd = build_ffmpeg_command('in.mp4', 'out.mp4', video(speed=1, fps="30", quality='Low'))
+    assert option(cmd, '-c:v') == 'libx264'
+    assert option(cmd, '-crf') == '28'
+
+
+def test_decimation_runs_before_retiming_and_scaling():
+    settings = video(probe(fps=60), speed=1, fps="30")
+    plan = plan_streams(settings, container='.mp4')
+    assert plan['video']['filters'] == ['fps=30']
+    assert plan['video']['rate'] is None
+
+    cmd = build_ffmpeg_command('in.mp4', 'out.mp4', video(probe(fps=60), speed=2, fps="30"),
+                               start=0, duration=20, max_height=360)
+    assert option(cmd, '-filter:v') == "fps=15,setpts=0.5*PTS,scale=-2:'min(ih,360)'"
+    assert '-r' not in cmd
+
+
+def test_speed_2_retimes_video_and_audio():
+    # 30 fps played twice as fast fills 60 fps, so no frame is dropped
+    cmd = build_ffmpeg_command('in.mp4', 'out.mp4', video(speed=2, fps="60"))
+    assert option(cmd, '-filter:v') == 'setpts=0.5*PTS'
+    assert option(cmd, '-filter:a') == 'atempo=2.0'
+    assert option(cmd, '-c:a') == 'aac'
+
+
+def test_atempo_chain_above_2x():
+    cmd = build_ffmpeg_command('in.mp4', 'out.mp4', video(speed=8, fps="Keep Original"))
+    assert option(cmd, '-filter:a') == 'atempo=2.0,atempo=2.0,atempo=2.0'
+
+
+def test_input_without_audio_drops_audio():
+    cmd = build_ffmpeg_command('in.mp4', 'out.mp4', video(probe(audio=False)))
+    assert '-an' in cmd
+    assert '-filter:a' not in cmd
+    assert '-c:a' not in cmd
+
+
+def test_gpu_previews_keep_frames_on_surfaces():
+    expected = {
+        'nvenc': (['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda'], 'scale_cuda'),
+        'qsv': (['-hwaccel', 'qsv', '-hwaccel_output_format', 'qsv'], 'scale_qsv'),
+        'vaapi': (['-hwaccel', 'vaapi', '-vaapi_device', '/dev/dri/renderD128',
+                   '-hwaccel_output_format', 'vaapi'], 'scale_vaapi'),
+    }
+    for backend, (decode, scaler) in expected.items():
+        cmd = build_ffmpeg_command('in.mp4', 'preview.mp4', video(encoder=backend),
+                                   hw_accel=backend, start=0, duration=20, max_height=360)
+        start = cmd.index(decode[0])
+        assert cmd[start:start + len(decode)] == decode
+        assert cmd.index(decode[-1]) < cmd.index('-i')
+        assert option(cmd, '-filter:v') == f"fps=15,setpts=0.5*PTS,{scaler}=-2:'min(ih,360)'"
+
+
+def test_speed_map_graph_retimes_each_segment():
+    settings = video(speed=1.5, fps="30")
+    settings['speed_map'] = [[0.0, 5.0, 1.5], [5.0, 10.0, 8.0]]
+    cmd = build_ffmpeg_command('in.mp4', 'out.mp4', settings)
+    assert option(cmd, '-filter_complex') == (
+        "[0:v]segment=timestamps=5.000[vs0][vs1];"
+        "[0:a]asegment=timestamps=5.000[as0][as1];"
+        "[vs0]setpts=(PTS-STARTPTS)/1.5[vr0];"
+        "[as0]asetpts=PTS-STARTPTS,atempo=1.5[ar0];"
+        "[vs1]setpts=(PTS-STARTPTS)/8.0[vr1];"
+        "[as1]asetpts=PTS-STARTPTS,atempo=2.0,atempo=2.0,atempo=2.0[ar1];"
+        "[vr0][ar0][vr1][ar1]concat=n=2:v=1:a=1[vjoin][aout];"
+        "[vjoin]null[vout]"
+    )
+    assert cmd[cmd.index('-filter_complex') + 2:cmd.index('-filter_complex') + 6] == [
+        '-map', '[vout]', '-map', '[aout]']
+    assert '-filter:v' not in cmd
+
+
+def test_variants_share_one_decode():
+    settings = video(fps="60", variants=[{'speed': 2}, {'speed': 4}])
+    targets = [(target, f"out_{index}.mp4")
+               for index, target in enumerate(expand_variants(settings))]
+    cmd = build_variants_command('in.mp4', targets)
+    assert cmd.count('-i') == 1
+    assert option(cmd, '-filter_complex') == (
+        "[0:v]split=2[s0][s1];[0:a]asplit=2[t0][t1];"
+        "[s0]setpts=0.5*PTS[v0];[t0]atempo=2.0[a0];"
+        "[s1]fps=15,setpts=0.25*PTS[v1];[t1]atempo=2.0,atempo=2.0[a1]"
+    )
+    first, second = cmd.index('out_0.mp4'), cmd.index('out_1.mp4')
+    assert cmd[cmd.index('[v0]') - 1:cmd.index('[v0]') + 3] == ['-map', '[v0]', '-map', '[a0]']
+    assert first < cmd.index('[v1]') < second
@@ -0,0 +1,142 @@
+"""Parsing of ffmpeg -progress output and stopping processes; no ffmpeg needed"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from speedup.progress import (Cancelled, CancelToken, ProgressReader, format_eta,
+                              parse_timestamp, stop_process, wait_process)
+
+
+def lines(*text):
+    return [f"{line}\n".encode() for line in text]
+
+
+def block(**values):
+    return lines(*(f"{key}={value}" for key, value in values.items()))
+
+
+def test_key_value_blocks_become_updates():
+    updates = []
+    reader = ProgressReader(updates.append, expected_duration=100.0, interval=0)
+    reader.read_progress(block(frame=250, fps='49.5', out_time_us=25_000_000,
+                               out_time='00:00:25.000000', speed='2.5x', progress='continue')
+                         + lines('', 'not a pair'))
+    update = updates[-1]
+    assert update['frame'] == 250
+    assert update['fps'] == 49.5
+    assert update['position'] == 25.0
+    assert update['fraction'] == 0.25
+    assert update['speed'] == 2.5
+    # 75 seconds of output left at 2.5x
+    assert update['eta'] == 30.0
+    assert not update['done']
+
+
+def test_out_time_is_used_without_out_time_us():
+    reader = ProgressReader(expected_duration=60.0)
+    reader.read_progress(block(out_time_us='N/A', out_time='00:00:30.000000',
+                               progress='continue'))
+    assert reader.snapshot()['position'] == 30.0
+    assert reader.snapshot()['fraction'] == 0.5
+
+
+def test_na_out_time_leaves_position_unknown():
+    reader = ProgressReader(expected_duration=60.0)
+    reader.read_progress(block(frame=0, out_time_us='N/A', out_time='N/A', speed='N/A',
+                               progress='continue'))
+    update = reader.snapshot()
+    assert update['position'] is None
+    assert update['fraction'] is None
+    assert update['speed'] is None
+    assert update['eta'] is None
+    assert parse_timestamp('N/A') is None
+
+
+def test_end_forces_a_final_complete_update():
+    updates = []
+    # A long interval would swallow every update but the first without forcing
+    reader = ProgressReader(updates.append, expected_duration=100.0, interval=3600)
+    reader.read_progress(block(out_time_us=10_000_000, progress='continue')
+                         + block(out_time_us=97_000_000, progress='end'))
+    assert len(updates) == 2
+    assert updates[-1]['fraction'] == 1.0
+    assert updates[-1]['eta'] == 0.0
+    assert updates[-1]['done']
+    assert reader.ended is not None
+
+
+def test_end_completes_even_without_a_duration():
+    reader = ProgressReader()
+    reader.read_progress(block(out_time_us=5_000_000, progress='end'))
+    assert reader.snapshot()['fraction'] == 1.0
+
+
+def test_duration_comes_from_stderr_retimed_and_limited():
+    reader = ProgressReader(speed=2.0)
+    reader.read_stderr(lines("Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'in.mp4':",
+                             "  Duration: 00:02:00.00, start: 0.000000, bitrate: 800 kb/s"))
+    assert reader.output_duration == 60.0
+    reader.read_progress(block(out_time_us=15_000_000, progress='continue'))
+    assert reader.snapshot()['fraction'] == 0.25
+    assert ProgressReader(expected_duration=300.0, limit=20).output_duration == 20
+
+
+def test_stderr_tail_is_bounded():
+    reader = ProgressReader(tail_size=3)
+    reader.read_stderr(lines(*(f"line {i}" for i in range(100)), '', 'last'))
+    assert list(reader.stderr_tail) == ['line 98', 'line 99', 'last']
+    reader.read_stderr([b'bad \xff byte\n'])
+    assert reader.stderr_tail[-1] == 'bad � byte'
+
+
+def test_format_eta():
+    assert format_eta(None) == "--:--"
+    assert format_eta(75) == "01:15"
+    assert format_eta(3725) == "1:02:05"
+
+
+def spawn(code):
+    return subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE)
+
+
+def test_attach_after_cancel_stops_the_process():
+    token = CancelToken()
+    token.cancel(grace=1.0)
+    process = spawn("import time; time.sleep(30)")
+    started = time.monotonic()
+    token.attach(process)
+    returncode, _ = wait_process(process)
+    assert returncode != 0
+    assert time.monotonic() - started < 5
+    with pytest.raises(Cancelled):
+        token.check()
+
+
+def test_wait_process_reaps_once_and_keeps_usage():
+    process = spawn("import sys; sys.exit(3)")
+    returncode, usage = wait_process(process)
+    assert returncode == 3
+    assert process.returncode == 3
+    if hasattr(os, 'wait4') and hasattr(os, 'waitid'):
+        assert usage is not None
+    # Stopping a reaped process never signals its (possibly reused) PID
+    with mock.patch.object(process, 'send_signal') as send_signal:
+        stop_process(process, grace=0.1)
+    send_signal.assert_not_called()
+
+
+def test_stop_process_kills_a_child_ignoring_sigterm():
+    process = spawn("import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+                    "print('ready', flush=True); time.sleep(30)")
+    time.sleep(0.3)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(wait_process(process)))
+    waiter.start()
+    stop_process(process, grace=0.3)
+    waiter.join(5)
+    assert results and results[0][0] != 0
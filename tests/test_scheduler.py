@@ -0,0 +1,145 @@
+"""Worker pool, backend slots and job outcomes of the scheduler; no ffmpeg needed"""
+import threading
+import time
+
+from speedup.scheduler import Job, JobScheduler
+
+
+class Tracker:
+    """Runner that records start order and the peak number of jobs per backend"""
+
+    def __init__(self, seconds=0.03, fail=()):
+        self.seconds = seconds
+        self.fail = set(fail)
+        self.started = []
+        self.running = {}
+        self.peak = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, job):
+        with self._lock:
+            self.started.append(job.job_id)
+            self.running[job.backend] = self.running.get(job.backend, 0) + 1
+            self.peak[job.backend] = max(self.peak.get(job.backend, 0),
+                                         self.running[job.backend])
+        try:
+            time.sleep(self.seconds)
+            if job.job_id in self.fail:
+                raise RuntimeError(f"job {job.job_id} failed")
+            return job.job_id
+        finally:
+            with self._lock:
+                self.running[job.backend] -= 1
+
+
+def test_backend_slots_cap_concurrent_jobs():
+    runner = Tracker()
+    scheduler = JobScheduler(runner, max_workers=6, backend_slots={'nvenc': 2, 'qsv': 1})
+    jobs = ([Job(i, 'nvenc', {}) for i in range(5)] + [Job(10 + i, 'qsv', {}) for i in range(3)]
+            + [Job(20 + i, 'cpu', {}) for i in range(4)])
+    summary = scheduler.run(jobs)
+    assert summary['succeeded'] == 12
+    assert runner.peak['nvenc'] == 2
+    assert runner.peak['qsv'] == 1
+    # CPU jobs are only bounded by the pool
+    assert runner.peak['cpu'] > 1
+
+
+def test_full_backend_does_not_block_other_backends():
+    runner = Tracker()
+    scheduler = JobScheduler(runner, max_workers=2, backend_slots={'nvenc': 1})
+    summary = scheduler.run([Job(0, 'nvenc', {}), Job(1, 'nvenc', {}), Job(2, 'cpu', {})])
+    assert summary['succeeded'] == 3
+    # The CPU job starts beside the first GPU job instead of waiting behind the second
+    assert runner.started.index(2) < runner.started.index(1)
+
+
+def test_jobs_start_in_queue_order():
+    runner = Tracker(seconds=0.0)
+    scheduler = JobScheduler(runner, max_workers=1)
+    scheduler.run([Job(i, 'cpu', {}) for i in range(5)])
+    assert runner.started == [0, 1, 2, 3, 4]
+
+    runner = Tracker(seconds=0.0)
+    sizes = {0: 1, 1: 5, 2: 3, 3: 5}
+    scheduler = JobScheduler(runner, max_workers=1, order_key=lambda job: -sizes[job.job_id])
+    scheduler.run([Job(i, 'cpu', {}) for i in range(4)])
+    # Longest first, equal jobs in submission order
+    assert runner.started == [1, 3, 2, 0]
+
+
+def test_failed_job_does_not_stop_the_others():
+    runner = Tracker(fail={1, 3})
+    done = []
+    scheduler = JobScheduler(runner, max_workers=2, on_job_done=done.append)
+    jobs = [Job(i, 'cpu', {}) for i in range(5)]
+    summary = scheduler.run(jobs)
+    assert summary['succeeded'] == 3
+    assert summary['failed'] == 2
+    assert summary['failures'] == [(1, "job 1 failed"), (3, "job 3 failed")]
+    assert [job.status for job in jobs] == ['done', 'failed', 'done', 'failed', 'done']
+    assert [job.result for job in jobs if job.status == 'done'] == [0, 2, 4]
+    assert sorted(job.job_id for job in done) == [0, 1, 2, 3, 4]
+
+
+def sleeper(job):
+    """Runner that waits on the job's token, as an ffmpeg process would"""
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job.cancel_token.check()
+        time.sleep(0.01)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_stop_reports_dropped_and_running_jobs():
+    done = []
+    scheduler = JobScheduler(sleeper, max_workers=1, on_job_done=done.append)
+    jobs = [Job(i, 'cpu', {}) for i in range(4)]
+    scheduler.submit_many(jobs)
+    scheduler.start()
+    wait_for(lambda: jobs[0].status == 'running')
+    scheduler.stop(cancel_running=True)
+    scheduler.wait()
+    assert [job.status for job in jobs] == ['cancelled'] * 4
+    assert sorted(job.job_id for job in done) == [0, 1, 2, 3]
+    assert scheduler.summary()['cancelled'] == 4
+
+
+def test_cancel_queued_and_running_jobs():
+    done = []
+    scheduler = JobScheduler(sleeper, max_workers=1, on_job_done=done.append)
+    jobs = [Job(i, 'cpu', {}) for i in range(2)]
+    scheduler.submit_many(jobs)
+    scheduler.start()
+    wait_for(lambda: jobs[0].status == 'running')
+    assert scheduler.cancel(jobs[1])
+    assert [job.job_id for job in done] == [1]
+    assert scheduler.cancel(jobs[0])
+    scheduler.close()
+    scheduler.wait()
+    assert [job.status for job in jobs] == ['cancelled', 'cancelled']
+    assert [job.job_id for job in done] == [1, 0]
+    # Finished jobs cannot be cancelled
+    assert not scheduler.cancel(jobs[0])
+
+
+def test_pause_holds_queued_jobs_until_resume():
+    runner = Tracker(seconds=0.0)
+    scheduler = JobScheduler(runner, max_workers=2)
+    scheduler.pause()
+    assert scheduler.paused
+    scheduler.submit_many([Job(i, 'cpu', {}) for i in range(3)])
+    scheduler.start()
+    time.sleep(0.1)
+    assert runner.started == []
+    assert scheduler.pending_count == 3
+    scheduler.resume()
+    scheduler.close()
+    scheduler.wait()
+    assert sorted(runner.started) == [0, 1, 2]
@@ -0,0 +1,113 @@
+"""Speed maps built from synthetic loudness levels; no ffmpeg needed"""
+import array
+import math
+import sys
+
+import pytest
+
+from speedup import speedmap
+from speedup.speedmap import (_window_levels, build_speed_map, clip_speed_map, mapped_duration,
+                              merge_segments)
+
+SPEECH = -20.0
+SILENT = -60.0
+
+
+def levels(*runs):
+    """Window levels from (level, windows) runs; windows are 50 ms"""
+    result = []
+    for level, count in runs:
+        result.extend([level] * count)
+    return result
+
+
+def test_long_silence_speeds_up_with_padding():
+    # 1 s speech, 2 s silence, 1 s speech
+    segments = build_speed_map(levels((SPEECH, 20), (SILENT, 40), (SPEECH, 20)), 1.5, 4.0)
+    assert segments == [[0.0, 1.15, 1.5], [1.15, 2.85, 4.0], [2.85, 4.0, 1.5]]
+    assert mapped_duration(segments) == pytest.approx(2.3 / 1.5 + 1.7 / 4.0)
+
+
+def test_short_pauses_keep_speech_speed():
+    # 0.5 s pause, then 0.9 s that only leaves 0.6 s once padded
+    segments = build_speed_map(levels((SPEECH, 20), (SILENT, 10), (SPEECH, 20),
+                                      (SILENT, 18), (SPEECH, 20)), 1.5, 4.0)
+    assert segments == [[0.0, 4.4, 1.5]]
+    assert build_speed_map(levels((SPEECH, 20), (SILENT, 18), (SPEECH, 20)), 1.5, 4.0,
+                           min_silence=0.5)[1] == [1.15, 1.75, 4.0]
+
+
+def test_threshold_decides_what_is_silent():
+    quiet = levels((SPEECH, 20), (-30.0, 40), (SPEECH, 20))
+    assert build_speed_map(quiet, 1.0, 3.0) == [[0.0, 4.0, 1.0]]
+    assert build_speed_map(quiet, 1.0, 3.0, threshold=-25.0)[1] == [1.15, 2.85, 3.0]
+
+
+def test_silence_at_the_edges_needs_no_padding():
+    segments = build_speed_map(levels((SILENT, 30), (SPEECH, 20), (SILENT, 30)), 1.0, 5.0)
+    assert segments == [[0.0, 1.35, 5.0], [1.35, 2.65, 1.0], [2.65, 4.0, 5.0]]
+    assert build_speed_map(levels((SILENT, 40)), 1.0, 5.0) == [[0.0, 2.0, 5.0]]
+    assert build_speed_map([], 1.0, 5.0) == []
+
+
+def test_segment_count_is_capped_by_dropping_the_shortest_silences():
+    # Silences of 1.0, 2.0 and 1.5 s between speech
+    runs = [(SPEECH, 20), (SILENT, 20), (SPEECH, 20), (SILENT, 40), (SPEECH, 20),
+            (SILENT, 30), (SPEECH, 20)]
+    assert len(build_speed_map(levels(*runs), 1.0, 4.0, min_silence=0.5)) == 7
+    segments = build_speed_map(levels(*runs), 1.0, 4.0, min_silence=0.5, max_segments=3)
+    assert [speed for _, _, speed in segments] == [1.0, 4.0, 1.0]
+    # The longest silence survives
+    assert segments[1] == [3.15, 4.85, 4.0]
+    # Segments still cover the input without gaps
+    assert segments[0][0] == 0.0 and segments[-1][1] == 8.5
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+
+
+def test_merge_segments_joins_equal_speeds():
+    assert merge_segments([[0, 1, 1.0], [1, 2, 1.0], [2, 3, 4.0], [3, 4, 1.0]]) == [
+        [0, 2, 1.0], [2, 3, 4.0], [3, 4, 1.0]]
+
+
+def test_clip_to_input_window():
+    segments = [[0.0, 2.0, 1.0], [2.0, 5.0, 4.0], [5.0, 8.0, 1.0]]
+    # -ss 1 -t 5 keeps the map between 1 s and 6 s, shifted to zero
+    assert clip_speed_map(segments, start=1.0, duration=5.0) == [
+        [0.0, 1.0, 1.0], [1.0, 4.0, 4.0], [4.0, 5.0, 1.0]]
+    assert clip_speed_map(segments, duration=2.0) == [[0.0, 2.0, 1.0]]
+    assert clip_speed_map(segments, start=6.0) == [[0.0, 2.0, 1.0]]
+    assert clip_speed_map(segments) == segments
+    assert clip_speed_map(segments, start=9.0) == []
+
+
+def test_mapped_duration_extends_the_last_speed():
+    segments = [[0.0, 2.0, 1.0], [2.0, 6.0, 4.0]]
+    assert mapped_duration(segments) == 3.0
+    assert mapped_duration(segments, duration=10.0) == 4.0
+    assert mapped_duration([]) is None
+
+
+def pcm(*windows, window_samples=400):
+    """16-bit little-endian PCM with one constant-amplitude square wave per window"""
+    samples = array.array('h')
+    for amplitude in windows:
+        samples.extend(amplitude if i % 2 else -amplitude for i in range(window_samples))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def expected_level(amplitude):
+    if not amplitude:
+        return speedmap.FLOOR_DB
+    return round(20 * math.log10(amplitude / 32768.0), 1)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_window_levels(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(speedmap, 'numpy', None)
+    amplitudes = [0, 32767, 16384, 328, 1000]
+    assert _window_levels(pcm(*amplitudes), 400) == [expected_level(a) for a in amplitudes]
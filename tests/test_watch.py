@@ -0,0 +1,35 @@
+"""Folder watching and the watch command's folder checks; no ffmpeg needed"""
+import threading
+import time
+
+from speedup.cli import main
+from speedup.watch import FolderWatcher
+
+
+def watch(folders, exclude=()):
+    """Files handed over by a polling watcher within a short window"""
+    ready = []
+    watcher = FolderWatcher(folders, lambda path, defaults: ready.append(path), settle=0.05,
+                            poll_interval=0.05, polling=True, exclude=exclude)
+    thread = threading.Thread(target=watcher.run, daemon=True)
+    thread.start()
+    time.sleep(0.4)
+    watcher.stop()
+    thread.join()
+    return ready
+
+
+def test_output_folder_inside_watched_folder_is_skipped(tmp_path):
+    output = tmp_path / 'out'
+    output.mkdir()
+    (tmp_path / 'in.mp4').write_bytes(b'x')
+    (output / 'in_2x.mp4').write_bytes(b'x')
+    (tmp_path / 'output-notes.mp4').write_bytes(b'x')
+    ready = watch({str(tmp_path): {}}, exclude=[str(output)])
+    assert sorted(ready) == [str(tmp_path / 'in.mp4'), str(tmp_path / 'output-notes.mp4')]
+
+
+def test_watch_refuses_output_folder_over_watched_folder(tmp_path, capsys):
+    assert main(['watch', str(tmp_path), '-o', str(tmp_path)]) == 2
+    assert main(['watch', str(tmp_path / 'in'), '-o', str(tmp_path)]) == 2
+    assert "must not be or contain" in capsys.readouterr().err